@@ -0,0 +1,68 @@
+"""Startup time of the plot-free statistics mode.
+
+Compares, in fresh interpreters, the imports of the notebooks (pandas,
+matplotlib and seaborn up front) with importing the load, wrangle and
+aggregate modules of :mod:`prosper`, and checks that the latter does not
+load any plotting library::
+
+    python benchmarks/startup.py --runs 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STATISTICS_MODULES = ['prosper', 'prosper.cube', 'prosper.incremental', 'prosper.parallel', 'prosper.features',
+                      'prosper.outliers', 'prosper.sketches', 'prosper.colstore', 'prosper.apr_model',
+                      'prosper.server', 'prosper.ingest', 'prosper.compressed', 'prosper.schema', 'prosper.parse',
+                      'prosper.lazy', 'prosper.memo', 'prosper.validate', 'prosper.timeseries', 'prosper.cohort',
+                      'prosper.budget', 'prosper.export', 'prosper.watch', 'prosper.significance',
+                      'prosper.boxplot', 'prosper.plots']
+PLOTTING_MODULES = ['matplotlib', 'seaborn']
+
+CASES = {
+    'numpy + pandas': 'import numpy, pandas',
+    'notebook imports': 'import numpy, pandas, matplotlib.pyplot, seaborn',
+    'prosper (statistics only)': 'import ' + ', '.join(STATISTICS_MODULES),
+}
+
+
+def time_import(code, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd = ROOT, check = True, capture_output = True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def plotting_loaded():
+    # Plotting libraries present in sys.modules after the statistics imports
+    code = ('import sys; import {}; print(",".join(m for m in {!r} if m in sys.modules))'
+            .format(', '.join(STATISTICS_MODULES), PLOTTING_MODULES))
+    out = subprocess.run([sys.executable, '-c', code], cwd = ROOT, check = True,
+                         capture_output = True, text = True)
+    return [m for m in out.stdout.strip().split(',') if m]
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Startup time with and without plotting libraries')
+    parser.add_argument('--runs', type = int, default = 5)
+    args = parser.parse_args(argv)
+
+    for name, code in CASES.items():
+        try:
+            print('{:<28} {:8.1f} ms'.format(name, 1e3 * time_import(code, args.runs)))
+        except subprocess.CalledProcessError:
+            print('{:<28} {:>8}'.format(name, 'n/a'))
+    loaded = plotting_loaded()
+    print('plotting libraries loaded by the statistics imports: {}'.format(', '.join(loaded) or 'none'))
+    return 1 if loaded else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
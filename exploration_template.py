@@ -1335,8 +1335,8 @@ for i in np.arange(g.axes.shape[0]):
 # In[116]:
 
 
-from subprocess import call
-call(['python', '-m', 'nbconvert', 'exploration_template.ipynb'])
+from prosper.export import export
+export('exploration_template.ipynb')
 
 
 # In[ ]:
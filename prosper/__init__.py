@@ -0,0 +1,3 @@
+"""Reusable pieces of the Prosper loan data exploration."""
+from .wrangle import (FOCUS_COLUMNS, RATE_ORDER, LISTING_CATEGORY, load_loans, clean_focus,
+                      wrangle)
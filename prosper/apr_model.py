@@ -0,0 +1,145 @@
+"""Fitted BorrowerAPR estimator for what-if pricing simulations.
+
+The slide deck shows that BorrowerAPR is driven mainly by
+``ProsperRating (Alpha)``, then by Term, LoanOriginalAmount and
+StatedMonthlyIncome. :class:`APRModel` turns that into a model: for every
+rating x term cell, a least-squares fit
+
+    BorrowerAPR ~ b0 + b1 * log10(LoanOriginalAmount) + b2 * log10(StatedMonthlyIncome)
+
+computed for all cells at once from per-cell normal equations (``np.bincount``
+sums). Cells with too few loans fall back to the fit of their rating over all
+terms. Scoring gathers the coefficients of each row's cell and evaluates the
+linear form on whole arrays, so millions of hypothetical applications are
+scored per second::
+
+    model = APRModel.fit(clean_focus(load_loans()))
+    model.save('apr_model.npz')
+    apr = APRModel.load('apr_model.npz').predict(rating, term, amount, income)
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from .wrangle import RATE_ORDER
+
+TERMS = [12, 36, 60]
+
+# Incomes below this (zero incomes, mostly) are scored as this many USD per month
+MIN_INCOME = 1.0
+
+
+def _design(amount, income):
+    la = np.log10(np.maximum(np.asarray(amount, dtype = np.float64), 1.0))
+    li = np.log10(np.maximum(np.asarray(income, dtype = np.float64), MIN_INCOME))
+    return la, li
+
+
+def _solve(xtx, xty):
+    # Batched solve with a tiny ridge so that degenerate cells stay finite
+    ridge = 1e-9 * np.trace(xtx, axis1 = -2, axis2 = -1)[..., None, None] * np.eye(3)
+    return np.linalg.solve(xtx + ridge + 1e-12 * np.eye(3), xty[..., None])[..., 0]
+
+
+class APRModel:
+    """Per rating x term linear APR model on log amount and log income."""
+
+    def __init__(self, coef, ratings = RATE_ORDER, terms = TERMS, counts = None):
+        self.coef = np.asarray(coef, dtype = np.float64)       # (ratings, terms, 3)
+        self.ratings = list(ratings)
+        self.terms = np.asarray(terms)
+        self.counts = counts
+        self._flat = np.ascontiguousarray(self.coef.reshape(-1, 3).T)
+
+    @classmethod
+    def fit(cls, df, min_rows = 30, ratings = RATE_ORDER, terms = TERMS):
+        """Fit on a frame with the slide deck focus columns."""
+        rating = pd.Categorical(df['ProsperRating (Alpha)'], categories = ratings).codes
+        term = df['Term'].to_numpy()
+        t = np.searchsorted(terms, term)
+        t_ok = t < len(terms)
+        t_ok[t_ok] = np.asarray(terms)[t[t_ok]] == term[t_ok]
+        y = df['BorrowerAPR'].to_numpy(dtype = np.float64)
+        amount = df['LoanOriginalAmount'].to_numpy(dtype = np.float64, na_value = np.nan)
+        income = df['StatedMonthlyIncome'].to_numpy(dtype = np.float64, na_value = np.nan)
+        # A single missing input would make the sums, and so the whole cell's fit, NaN
+        valid = (rating >= 0) & t_ok & ~np.isnan(y) & np.isfinite(amount) & np.isfinite(income)
+        la, li = _design(amount[valid], income[valid])
+        y = y[valid]
+        shape = (len(ratings), len(terms))
+        cell = np.ravel_multi_index((rating[valid], t[valid]), shape)
+        size = shape[0] * shape[1]
+
+        # Normal equations X'X b = X'y for every cell, X = [1, la, li]
+        columns = [np.ones_like(la), la, li]
+        xtx = np.empty((size, 3, 3))
+        xty = np.empty((size, 3))
+        for i in range(3):
+            xty[:, i] = np.bincount(cell, weights = columns[i] * y, minlength = size)
+            for j in range(i, 3):
+                xtx[:, i, j] = xtx[:, j, i] = np.bincount(cell, weights = columns[i] * columns[j], minlength = size)
+        counts = xtx[:, 0, 0].reshape(shape)
+        xtx, xty = xtx.reshape(shape + (3, 3)), xty.reshape(shape + (3,))
+
+        coef = _solve(xtx, xty)
+        # Sparse cells borrow the fit of their rating over all terms, then the overall fit
+        pooled = _solve(xtx.sum(axis = 1), xty.sum(axis = 1))
+        overall = _solve(xtx.sum(axis = (0, 1)), xty.sum(axis = (0, 1)))
+        rating_counts = counts.sum(axis = 1)
+        pooled[rating_counts < min_rows] = overall
+        sparse = counts < min_rows
+        coef[sparse] = np.broadcast_to(pooled[:, None, :], coef.shape)[sparse]
+        return cls(coef, ratings, terms, counts)
+
+    def _cells(self, rating, term):
+        rating = np.asarray(rating)
+        if rating.dtype.kind in 'iu':
+            r = rating.astype(np.intp)
+        else:
+            r = pd.Categorical(rating, categories = self.ratings).codes.astype(np.intp)
+        term = np.asarray(term)
+        t = np.searchsorted(self.terms, term)
+        valid = (r >= 0) & (r < len(self.ratings)) & (t < len(self.terms))
+        valid[valid] = self.terms[t[valid]] == term[valid]
+        cell = np.where(valid, r * len(self.terms) + t, 0)
+        return cell, valid
+
+    def predict(self, rating, term, amount, income):
+        """Estimated BorrowerAPR for arrays of applications; NaN for unknown ratings or terms.
+
+        ``rating`` holds rating labels ('AA' ... 'HR') or their codes (0 = AA).
+        """
+        cell, valid = self._cells(rating, term)
+        la, li = _design(amount, income)
+        b0, b1, b2 = self._flat
+        apr = b0[cell] + b1[cell] * la + b2[cell] * li
+        if not valid.all():
+            apr[~valid] = np.nan
+        return apr
+
+    def score(self, df):
+        """R squared of the model on a frame with the focus columns."""
+        predicted = self.predict(df['ProsperRating (Alpha)'], df['Term'], df['LoanOriginalAmount'],
+                                 df['StatedMonthlyIncome'])
+        y = df['BorrowerAPR'].to_numpy(dtype = np.float64)
+        ok = ~np.isnan(predicted) & ~np.isnan(y)
+        residual = ((y[ok] - predicted[ok]) ** 2).sum()
+        return 1 - residual / ((y[ok] - y[ok].mean()) ** 2).sum()
+
+    def coefficients(self):
+        """Coefficients as a frame indexed by rating and term."""
+        index = pd.MultiIndex.from_product([self.ratings, self.terms], names = ['ProsperRating (Alpha)', 'Term'])
+        return pd.DataFrame(self.coef.reshape(-1, 3), index = index,
+                            columns = ['intercept', 'log10_amount', 'log10_income'])
+
+    def save(self, path):
+        meta = json.dumps({'ratings': self.ratings, 'terms': self.terms.tolist()})
+        np.savez(path, coef = self.coef, meta = np.array(meta),
+                 counts = self.counts if self.counts is not None else np.zeros(self.coef.shape[:2]))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            return cls(data['coef'], meta['ratings'], meta['terms'], data['counts'])
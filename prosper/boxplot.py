@@ -0,0 +1,128 @@
+"""Box plots drawn from per-category quantile sketches.
+
+``sb.boxplot(data = df_copy, y = 'ProsperRating (Alpha)', x = 'BorrowerAPR')``
+sorts the full column of every category to find its quartiles. Here every
+category keeps a :class:`~prosper.sketches.KLLSketch` instead, filled during
+ingest chunk by chunk and mergeable across monthly partitions, and the box
+statistics are read from a few KB of sketch state::
+
+    apr_by_rating = GroupedSketches('BorrowerAPR', 'ProsperRating (Alpha)')
+    for chunk in chunks:
+        apr_by_rating.update(chunk)
+    boxplot(apr_by_rating, orient = 'h')
+
+Error bounds: with ``k = 200`` each quartile and median is within about 1.3
+percentile points (rank error, 99% confidence) of the exact one. Whiskers
+follow the usual 1.5 IQR rule, ending at a value actually retained by the
+sketch (exact when the whisker reaches the minimum or maximum, which are
+tracked exactly). Fliers are not kept. Grouped by ProsperRating (Alpha),
+the boxes follow :data:`~prosper.wrangle.RATE_ORDER` as in the notebooks;
+other groupings use their category order unless ``categories`` is given.
+"""
+import numpy as np
+
+from .sketches import KLLSketch
+from .wrangle import RATE_ORDER
+
+# Category orders of the notebooks, used when none is given
+DEFAULT_ORDERS = {'ProsperRating (Alpha)': RATE_ORDER}
+
+
+class GroupedSketches:
+    """One quantile sketch of ``value`` per category of ``by``."""
+
+    def __init__(self, value, by, k = 200, categories = None):
+        self.value = value
+        self.by = by
+        self.k = k
+        self.sketches = {}
+        if categories is None:
+            categories = DEFAULT_ORDERS.get(by)
+        self.categories = list(categories) if categories is not None else None
+
+    def update(self, df):
+        """Add the rows of a frame (or chunk); rows with a missing category are skipped."""
+        groups = df[self.by]
+        if groups.dtype.name != 'category':
+            groups = groups.astype('category')
+        if self.categories is None:
+            self.categories = list(groups.cat.categories)
+        codes = groups.cat.codes.to_numpy()
+        values = df[self.value].to_numpy(dtype = np.float64)
+
+        # One sort by category, then a split into contiguous runs
+        order = np.argsort(codes, kind = 'stable')
+        codes, values = codes[order], values[order]
+        bounds = np.flatnonzero(np.diff(codes)) + 1
+        labels = groups.cat.categories
+        for run, x in zip(np.split(codes, bounds), np.split(values, bounds)):
+            if not len(run) or run[0] < 0:
+                continue
+            label = labels[run[0]]
+            if label not in self.categories:
+                self.categories.append(label)
+            if label not in self.sketches:
+                self.sketches[label] = KLLSketch(self.k)
+            self.sketches[label].update(x)
+        return self
+
+    def merge(self, other):
+        """Fold in the sketches of another partition."""
+        for label in other.categories or []:
+            if label not in self.categories:
+                self.categories.append(label)
+        for label, sketch in other.sketches.items():
+            if label in self.sketches:
+                self.sketches[label].merge(sketch)
+            else:
+                self.sketches[label] = KLLSketch(self.k).merge(sketch)
+        return self
+
+    @property
+    def nbytes(self):
+        return sum(s.nbytes for s in self.sketches.values())
+
+    def stats(self, whis = 1.5):
+        """Box statistics per category, in the order of ``categories`` (``Axes.bxp`` format)."""
+        return [box_stats(self.sketches[c], c, whis) for c in self.categories if c in self.sketches]
+
+
+def box_stats(sketch, label = None, whis = 1.5):
+    """Quartiles, median and whisker ends estimated from ``sketch``."""
+    q1, med, q3 = sketch.quantile([0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    items = np.concatenate(sketch.levels)
+    lo_limit, hi_limit = q1 - whis * iqr, q3 + whis * iqr
+    if sketch.min >= lo_limit:
+        whislo = sketch.min
+    else:
+        inside = items[items >= lo_limit]
+        whislo = inside.min() if len(inside) else q1
+    if sketch.max <= hi_limit:
+        whishi = sketch.max
+    else:
+        inside = items[items <= hi_limit]
+        whishi = inside.max() if len(inside) else q3
+    return {'label': label, 'n': sketch.n, 'q1': q1, 'med': med, 'q3': q3,
+            'whislo': min(whislo, q1), 'whishi': max(whishi, q3), 'fliers': []}
+
+
+def boxplot(grouped, ax = None, orient = 'h', color = None, whis = 1.5):
+    """Draw the box plot of ``grouped``; ``orient = 'h'`` puts the categories on the y axis."""
+    import matplotlib.pyplot as plt
+
+    if ax is None:
+        ax = plt.gca()
+    stats = grouped.stats(whis)
+    boxprops = {'facecolor': color} if color is not None else {}
+    ax.bxp(stats, vert = orient != 'h', patch_artist = color is not None, boxprops = boxprops,
+           showfliers = False)
+    if orient == 'h':
+        # First category on top, like seaborn
+        ax.invert_yaxis()
+        ax.set_xlabel(grouped.value)
+        ax.set_ylabel(grouped.by)
+    else:
+        ax.set_xlabel(grouped.by)
+        ax.set_ylabel(grouped.value)
+    return ax
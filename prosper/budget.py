@@ -0,0 +1,602 @@
+"""Wrangling within a memory budget, spilling cold columns to disk.
+
+On shared analysis nodes the notebook can be OOM-killed half-way through the
+wrangling: ``df``, ``df_copy`` and every intermediate filtered frame are
+alive at once. A :class:`Workspace` holds the working frames under names and
+keeps their resident size within ``budget``:
+
+- frames are measured per column buffer, so columns shared between frames
+  (pandas copy-on-write) are counted once;
+- :meth:`Workspace.append` adds rows chunk by chunk and
+  :meth:`Workspace.pipeline` runs steps on the columns they name only, so
+  no step needs the whole frame in memory;
+- when a frame would push the total over the budget, the columns used least
+  recently are written to files in the workspace directory and swapped for
+  read-only memory maps of those files. The frame keeps all its columns; the
+  operating system pages spilled columns in when they are read and can evict
+  them again, so the run gets slower instead of being killed::
+
+    ws, df_copy = wrangle_within('prosperLoanData.csv', budget = '300MB')
+
+:func:`wrangle_within` reads the export in chunks of ``chunksize`` rows,
+wrangles every chunk on its own (all steps but the Occupation fill are
+row-local) and appends it, enforcing the budget after each chunk; the
+Occupation fill is applied to that one column at the end.
+
+Numeric, datetime and categorical columns are spilled as their values or
+category codes. Text columns are spilled as UTF-8 bytes with row offsets
+and come back as :class:`SpilledStrings` (dtype ``spilled_str``), which
+keeps nothing of them in memory; ``.astype(str)`` reads one back. A chunk,
+or a step over the columns it names, still needs its own memory on top of
+the budget.
+"""
+import gc
+import os
+import re
+import shutil
+import tempfile
+from functools import partial
+
+import numpy as np
+import pandas as pd
+from pandas.api.extensions import ExtensionArray, ExtensionDtype
+
+from .compressed import read_csv
+from .dedup import DedupReport, dedup_chunks
+from .schema import read_dtypes
+from .wrangle import (OCCUPATION_FALLBACK, add_log_columns, concat_frames, convert_dates, convert_employment,
+                      convert_homeowner, convert_listing_category, convert_occupation, convert_ratings,
+                      drop_missing)
+
+UNITS = {'': 1, 'B': 1, 'KB': 1 << 10, 'MB': 1 << 20, 'GB': 1 << 30, 'TB': 1 << 40}
+
+# Rows per chunk read by wrangle_within (about 25 MB of raw columns for the export)
+CHUNK_ROWS = 10000
+
+
+def parse_size(size):
+    """Bytes of ``size``: a number or a string such as ``'512MB'`` or ``'2 GB'``."""
+    if isinstance(size, (int, float, np.integer)):
+        return int(size)
+    match = re.fullmatch(r'\s*([0-9.]+)\s*([KMGT]?)B?\s*', str(size).upper())
+    if not match:
+        raise ValueError('cannot parse memory size {!r}'.format(size))
+    return int(float(match.group(1)) * UNITS[match.group(2) + 'B' if match.group(2) else ''])
+
+
+def _mapped(array):
+    # Whether array is (a view of) a memory map
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = getattr(array, 'base', None)
+    return False
+
+
+class SpilledStringDtype(ExtensionDtype):
+    """Dtype of :class:`SpilledStrings`."""
+
+    name = 'spilled_str'
+    type = str
+    kind = 'O'
+    na_value = np.nan
+
+    @classmethod
+    def construct_array_type(cls):
+        return SpilledStrings
+
+
+class SpilledStrings(ExtensionArray):
+    """Read-only text column as UTF-8 bytes, row offsets into them and a missing flag per row.
+
+    Row ``i`` is ``data[offsets[i]:offsets[i + 1]]``. A spilled text column is
+    backed by memory maps of the three arrays.
+    """
+
+    def __init__(self, offsets, data, missing):
+        self._offsets = offsets
+        self._data = data
+        self._missing = missing
+
+    @classmethod
+    def from_values(cls, values):
+        objects = np.asarray(values, dtype = object)
+        missing = np.asarray(pd.isna(objects), dtype = bool)
+        encoded = [b'' if m else str(v).encode('utf-8') for v, m in zip(objects.tolist(), missing.tolist())]
+        offsets = np.zeros(len(encoded) + 1, dtype = np.int64)
+        offsets[1:] = np.cumsum(np.fromiter(map(len, encoded), dtype = np.int64, count = len(encoded)))
+        return cls(offsets, np.frombuffer(b''.join(encoded), dtype = np.uint8), missing)
+
+    @classmethod
+    def _from_sequence(cls, scalars, *, dtype = None, copy = False):
+        return cls.from_values(scalars)
+
+    @classmethod
+    def _from_factorized(cls, values, original):
+        return cls.from_values(values)
+
+    @classmethod
+    def _concat_same_type(cls, to_concat):
+        to_concat = list(to_concat)
+        shifts = np.cumsum([0] + [len(a._data) for a in to_concat])
+        offsets = [np.zeros(1, dtype = np.int64)]
+        offsets += [np.asarray(a._offsets[1:]) + s for a, s in zip(to_concat, shifts)]
+        data = np.concatenate([np.zeros(0, dtype = np.uint8)] + [np.asarray(a._data) for a in to_concat])
+        missing = np.concatenate([np.zeros(0, dtype = bool)] + [np.asarray(a._missing) for a in to_concat])
+        return cls(np.concatenate(offsets), data, missing)
+
+    @property
+    def dtype(self):
+        return SpilledStringDtype()
+
+    @property
+    def nbytes(self):
+        return self._offsets.nbytes + self._data.nbytes + self._missing.nbytes
+
+    def __len__(self):
+        return len(self._missing)
+
+    def __getitem__(self, item):
+        if pd.api.types.is_integer(item):
+            i = range(len(self))[item]
+            if self._missing[i]:
+                return np.nan
+            return bytes(self._data[self._offsets[i]:self._offsets[i + 1]]).decode('utf-8')
+        if isinstance(item, slice):
+            return self._gather(np.arange(len(self))[item])
+        item = pd.api.indexers.check_array_indexer(self, item)
+        return self._gather(np.flatnonzero(item) if item.dtype == bool else item)
+
+    def _gather(self, positions, fill = None):
+        # Rows at positions (and missing rows where fill), with their bytes copied next to each other
+        positions = np.asarray(positions, dtype = np.intp)
+        offsets = np.asarray(self._offsets)
+        starts = offsets[positions]
+        lengths = offsets[positions + 1] - starts
+        missing = np.asarray(self._missing)[positions]
+        if fill is not None:
+            lengths[fill] = 0
+            missing[fill] = True
+        new = np.zeros(len(positions) + 1, dtype = np.int64)
+        new[1:] = np.cumsum(lengths)
+        index = np.repeat(starts - new[:-1], lengths) + np.arange(new[-1])
+        return type(self)(new, np.asarray(self._data)[index], missing)
+
+    def take(self, indices, allow_fill = False, fill_value = None):
+        indices = np.asarray(indices, dtype = np.intp)
+        if allow_fill and fill_value is not None and not pd.isna(fill_value):
+            objects = pd.api.extensions.take(self._objects(), indices, allow_fill = True, fill_value = fill_value)
+            return type(self).from_values(objects)
+        if allow_fill:
+            if (indices < -1).any():
+                raise ValueError('take indices must be -1 (missing) or positions')
+            fill = indices == -1
+            if not len(self):
+                if not fill.all():
+                    raise IndexError('cannot take rows from an empty array')
+                return type(self).from_values([np.nan] * len(indices))
+            return self._gather(np.where(fill, 0, indices), fill)
+        indices = np.where(indices < 0, indices + len(self), indices)
+        if len(indices) and (indices.min() < 0 or indices.max() >= len(self)):
+            raise IndexError('take indices out of bounds for {} rows'.format(len(self)))
+        return self._gather(indices)
+
+    def isna(self):
+        return np.array(self._missing, dtype = bool)
+
+    def fillna(self, value, limit = None, copy = True):
+        missing = self.isna()
+        if limit is not None:
+            missing &= np.cumsum(missing) <= limit
+        objects = self._objects()
+        objects[missing] = value
+        return type(self).from_values(objects)
+
+    def copy(self):
+        # Read-only, so copies share the buffers
+        return type(self)(self._offsets, self._data, self._missing)
+
+    def _objects(self):
+        data = bytes(self._data)
+        offsets = np.asarray(self._offsets).tolist()
+        objects = np.empty(len(self), dtype = object)
+        objects[:] = [np.nan if m else data[a:b].decode('utf-8')
+                      for a, b, m in zip(offsets[:-1], offsets[1:], np.asarray(self._missing).tolist())]
+        return objects
+
+    def __array__(self, dtype = None, copy = None):
+        objects = self._objects()
+        return objects if dtype is None else objects.astype(dtype)
+
+    def astype(self, dtype, copy = True):
+        dtype = pd.api.types.pandas_dtype(dtype)
+        if isinstance(dtype, SpilledStringDtype):
+            return self.copy() if copy else self
+        if isinstance(dtype, np.dtype):
+            return self._objects().astype(dtype)
+        return pd.array(self._objects(), dtype = dtype)
+
+    def __eq__(self, other):
+        if isinstance(other, (pd.Series, pd.Index, pd.DataFrame)):
+            return NotImplemented
+        if isinstance(other, SpilledStrings):
+            other = other._objects()
+        return self._objects() == other
+
+
+def _is_text(series):
+    return pd.api.types.infer_dtype(series, skipna = True) in ('string', 'empty')
+
+
+def column_buffers(series):
+    """``(key, bytes, resident)`` of the buffers behind ``series``; equal keys mean shared memory."""
+    values = series.array
+    if isinstance(values, pd.Categorical):
+        codes = values.codes
+        yield (codes.__array_interface__['data'][0], codes.nbytes), codes.nbytes, not _mapped(codes)
+        categories = values.categories
+        yield ('categories', id(categories)), int(categories.memory_usage(deep = True)), True
+        return
+    if isinstance(values, SpilledStrings):
+        data = values._offsets
+        yield (data.__array_interface__['data'][0], data.nbytes), values.nbytes, not _mapped(data)
+        return
+    array = getattr(values, '_ndarray', None)
+    if isinstance(array, np.ndarray):
+        nbytes = int(series.memory_usage(deep = True, index = False)) if array.dtype == object else array.nbytes
+        yield (array.__array_interface__['data'][0], array.nbytes), nbytes, not _mapped(array)
+    else:
+        yield ('array', id(values)), int(series.memory_usage(deep = True, index = False)), True
+
+
+def _key(series):
+    return next(iter(column_buffers(series)))[0]
+
+
+def _open(path, dtype, rows):
+    if not rows:
+        return np.empty(0, dtype = dtype)
+    return np.memmap(path, dtype = dtype, mode = 'r', shape = (rows,))
+
+
+def _append(path, array):
+    with open(path, 'ab') as f:
+        np.ascontiguousarray(array).tofile(f)
+
+
+class _Spilled:
+    # Files of one spilled column: category codes, values (datetimes as int64) or text buffers
+
+    def __init__(self, base, values):
+        self.base = base
+        self.rows = 0
+        self.size = 0                         # bytes of text
+        array = values.array
+        if isinstance(array, pd.Categorical):
+            self.kind, self.dtype, self.stored = 'categorical', array.dtype, array.codes.dtype
+        elif isinstance(array, SpilledStrings) or not isinstance(values.dtype, np.dtype) or values.dtype == object:
+            self.kind, self.dtype, self.stored = 'text', None, None
+        else:
+            self.kind, self.dtype = 'values', values.dtype
+            self.stored = np.dtype(np.int64) if values.dtype.kind in 'mM' else values.dtype
+        for suffix in self._files():
+            open(self.base + suffix, 'wb').close()
+        self.extend(values)
+
+    def _files(self):
+        if self.kind == 'text':
+            return ['.offsets', '.data', '.missing']
+        return ['.codes' if self.kind == 'categorical' else '.values']
+
+    @property
+    def nbytes(self):
+        return sum(os.path.getsize(self.base + suffix) for suffix in self._files())
+
+    def accepts(self, values):
+        """Whether ``values`` can be appended to the files as they are."""
+        if self.kind == 'categorical':
+            return values.dtype == self.dtype
+        if self.kind == 'text':
+            return isinstance(values.array, SpilledStrings) or _is_text(values)
+        return values.dtype == self.dtype
+
+    def extend(self, values):
+        array = values.array
+        if self.kind == 'categorical':
+            _append(self.base + '.codes', array.codes)
+        elif self.kind == 'values':
+            _append(self.base + '.values', values.to_numpy().view(self.stored))
+        else:
+            text = array if isinstance(array, SpilledStrings) else SpilledStrings.from_values(values)
+            offsets = np.asarray(text._offsets)
+            if self.rows == 0:
+                _append(self.base + '.offsets', offsets[:1])
+            _append(self.base + '.offsets', offsets[1:] + self.size)
+            _append(self.base + '.data', text._data)
+            _append(self.base + '.missing', text._missing)
+            self.size += len(text._data)
+        self.rows += len(values)
+
+    def open(self):
+        """The column as read-only memory maps."""
+        if self.kind == 'categorical':
+            codes = _open(self.base + '.codes', self.stored, self.rows)
+            return pd.Categorical.from_codes(codes, dtype = self.dtype, validate = False)
+        if self.kind == 'values':
+            return _open(self.base + '.values', self.stored, self.rows).view(self.dtype)
+        return SpilledStrings(_open(self.base + '.offsets', np.int64, self.rows + 1 if self.rows else 0),
+                              _open(self.base + '.data', np.uint8, self.size),
+                              _open(self.base + '.missing', bool, self.rows))
+
+
+class Workspace:
+    """Named working frames kept within ``budget`` bytes of resident column data."""
+
+    def __init__(self, budget, directory = None):
+        self.budget = parse_size(budget)
+        self._own_directory = directory is None
+        self.directory = directory or tempfile.mkdtemp(prefix = 'prosper-spill-')
+        os.makedirs(self.directory, exist_ok = True)
+        self.frames = {}
+        self._clock = 0
+        self._used = {}                       # (name, column) -> last use
+        self._spilled = {}                    # (name, column) -> (buffer key, _Spilled)
+        self._files = 0
+        self.spills = 0
+        self.spilled_bytes = 0
+        self.peak = 0
+
+    def _touch(self, name, columns):
+        self._clock += 1
+        for c in columns:
+            self._used[(name, c)] = self._clock
+
+    def __contains__(self, name):
+        return name in self.frames
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def get(self, name, columns = None):
+        """Frame ``name`` (or its ``columns``), marking the columns as recently used."""
+        df = self.frames[name]
+        self._touch(name, df.columns if columns is None else columns)
+        return df if columns is None else df[list(columns)]
+
+    def __setitem__(self, name, df):
+        self.frames[name] = df
+        self._touch(name, df.columns)
+        self.enforce()
+
+    def release(self, name):
+        """Drop frame ``name`` and free what only it was using."""
+        df = self.frames.pop(name, None)
+        for key in [k for k in self._used if k[0] == name]:
+            del self._used[key]
+        for key in [k for k in self._spilled if k[0] == name]:
+            del self._spilled[key]
+        del df
+        gc.collect()
+
+    def _buffers(self):
+        # Unique buffers: key -> (bytes, resident, [(frame, column), ...])
+        buffers = {}
+        for name, df in self.frames.items():
+            for c in df.columns:
+                for key, nbytes, resident in column_buffers(df[c]):
+                    entry = buffers.setdefault(key, [nbytes, resident, []])
+                    entry[2].append((name, c))
+        return buffers
+
+    def resident(self, name = None):
+        """Resident bytes of the column data of frame ``name``, or of all frames (shared buffers once)."""
+        total = 0
+        for nbytes, resident, users in self._buffers().values():
+            if resident and (name is None or any(n == name for n, _ in users)):
+                total += nbytes
+        return total
+
+    def enforce(self):
+        """Spill the least recently used columns until the frames fit in the budget (or nothing is left to spill)."""
+        previous = None
+        while True:
+            buffers = self._buffers()
+            total = sum(b[0] for b in buffers.values() if b[1])
+            self.peak = max(self.peak, total)
+            # Stop when within budget, or when the last round of spills freed nothing
+            if total <= self.budget or total == previous:
+                return total
+            previous = total
+            # Resident size per (frame, column); category dictionaries stay in memory
+            sizes = {}
+            for key, (nbytes, resident, users) in buffers.items():
+                if resident and key[0] != 'categories':
+                    for user in users:
+                        sizes[user] = sizes.get(user, 0) + nbytes / len(users)
+            if not sizes:
+                return total
+            victims = {}
+            for user in sorted(sizes, key = lambda u: (self._used.get(u, 0), -sizes[u])):
+                if total <= self.budget:
+                    break
+                victims.setdefault(user[0], []).append(user[1])
+                total -= sizes[user]
+            for name, columns in victims.items():
+                self._spill(name, columns)
+            del buffers
+            gc.collect()
+
+    def _spilled_column(self, name, column, values):
+        # The files of a column, if the frame still holds the memory maps of them
+        entry = self._spilled.get((name, column))
+        return entry[1] if entry is not None and entry[0] == _key(values) else None
+
+    def _replace(self, name, data, index, written = ()):
+        # New frame from column arrays; written columns are memory maps of their _Spilled files
+        self.frames[name] = df = pd.DataFrame(data, index = index, copy = False)
+        for c, spilled in written:
+            self._spilled[(name, c)] = (_key(df[c]), spilled)
+
+    def _write(self, name, values):
+        base = os.path.join(self.directory, '{}-{:05d}'.format(re.sub(r'\W', '_', name), self._files))
+        self._files += 1
+        if not isinstance(values.array, (pd.Categorical, SpilledStrings)) and (
+                not isinstance(values.dtype, np.dtype) or values.dtype == object) and not _is_text(values):
+            # Mixed objects have no byte layout: keep them as category codes
+            values = values.astype('category')
+        spilled = _Spilled(base, values)
+        self.spilled_bytes += spilled.nbytes
+        return spilled
+
+    def _spill(self, name, columns):
+        df = self.frames[name]
+        self.spills += 1
+        data = {c: df[c].array for c in df.columns}
+        written = []
+        for c in columns:
+            spilled = self._write(name, df[c])
+            data[c] = spilled.open()
+            written.append((c, spilled))
+        del df
+        self._replace(name, data, self.frames[name].index, written)
+
+    def append(self, name, df):
+        """Add the rows of ``df`` to frame ``name`` column by column, then enforce the budget.
+
+        Spilled columns grow on disk; categories are unified as in
+        :func:`~prosper.wrangle.concat_frames`.
+        """
+        if name not in self.frames:
+            self[name] = df
+            return self.frames[name]
+        old = self.frames[name]
+        if list(old.columns) != list(df.columns):
+            raise ValueError('cannot append to {}: the columns differ'.format(name))
+        data, written = {}, []
+        for c in old.columns:
+            spilled = self._spilled_column(name, c, old[c])
+            if spilled is not None and spilled.accepts(df[c]):
+                spilled.extend(df[c])
+                data[c] = spilled.open()
+                written.append((c, spilled))
+            elif isinstance(old[c].array, SpilledStrings):
+                data[c] = SpilledStrings._concat_same_type([old[c].array, SpilledStrings.from_values(df[c])])
+            else:
+                data[c] = concat_frames([old[[c]], df[[c]]])[c].array
+        index = old.index.append(df.index)
+        del old
+        self._replace(name, data, index, written)
+        self._touch(name, df.columns)
+        self.enforce()
+        return self.frames[name]
+
+    def filter(self, name, keep):
+        """Keep the rows of frame ``name`` where ``keep`` is true, one column at a time.
+
+        Spilled columns are read, filtered and written to new files one by
+        one; resident ones are filtered in memory.
+        """
+        df = self.frames[name]
+        positions = np.flatnonzero(np.asarray(keep, dtype = bool))
+        data, written = {}, []
+        for c in df.columns:
+            spilled = self._spilled_column(name, c, df[c])
+            values = df[c].take(positions)
+            if spilled is not None:
+                spilled = self._write(name, values)
+                data[c] = spilled.open()
+                written.append((c, spilled))
+            else:
+                data[c] = values.array
+            del values
+        index = df.index[positions]
+        del df
+        self._replace(name, data, index, written)
+        self.enforce()
+        return self.frames[name]
+
+    def pipeline(self, name, steps):
+        """Run ``steps`` on frame ``name``, each on the columns it names only.
+
+        A step is ``(columns, func)``: ``func`` gets those columns of the frame
+        and returns either a DataFrame of columns to set (new or replacing
+        ones) or a boolean mask of the rows to keep (see :meth:`filter`).
+        Columns are set one at a time with the budget enforced after each, so
+        the spilled columns a step does not name stay on disk.
+        """
+        for columns, func in steps:
+            result = func(self.get(name, columns))
+            if isinstance(result, pd.DataFrame):
+                for c in result.columns:
+                    df = self.frames[name]
+                    data = {k: df[k].array for k in df.columns}
+                    data[c] = result[c].array
+                    del df
+                    self._replace(name, data, self.frames[name].index)
+                    self._touch(name, [c])
+                    self.enforce()
+            else:
+                self.filter(name, result)
+            del result
+            gc.collect()
+        return self.frames[name]
+
+    def close(self):
+        """Release all frames and, if the workspace created it, delete the spill directory."""
+        for name in list(self.frames):
+            self.release(name)
+        if self._own_directory:
+            shutil.rmtree(self.directory, ignore_errors = True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return 'Workspace(budget={}, resident={}, frames={}, spills={})'.format(
+            self.budget, self.resident(), list(self.frames), self.spills)
+
+
+def _wrangle_chunk(chunk):
+    # The row-local steps of wrangle(), everything but the Occupation fill
+    chunk = convert_employment(chunk)
+    chunk = convert_homeowner(chunk)
+    chunk['BorrowerState'] = chunk['BorrowerState'].astype('category')
+    chunk = convert_dates(chunk)
+    chunk = convert_listing_category(chunk)
+    chunk = drop_missing(chunk)
+    return add_log_columns(chunk)
+
+
+def wrangle_within(path = 'prosperLoanData.csv', budget = '1GB', directory = None, occupation_fill = None,
+                   dedup = 'first', chunksize = CHUNK_ROWS, **read_csv_kwargs):
+    """Load and wrangle the export like :func:`~prosper.wrangle.wrangle`, within ``budget``.
+
+    The file is read ``chunksize`` rows at a time (with the dtypes of
+    :mod:`prosper.schema`, and repeated ``ListingKey`` rows dropped per
+    ``dedup`` as in :func:`~prosper.wrangle.load_loans`). Returns the
+    :class:`Workspace` (close it to delete the spilled columns) and the
+    cleaned frame.
+    """
+    ws = Workspace(budget, directory)
+    read_csv_kwargs.setdefault('dtype', read_dtypes(categorical = False))
+    chunks = lambda: read_csv(path, chunksize = chunksize, **read_csv_kwargs)
+    if dedup is not None:
+        chunks = partial(dedup_chunks, chunks, keep = dedup, report = DedupReport(dedup))
+
+    # Most frequent Occupation of the rated loans, counted chunk by chunk as wrangle() takes it
+    counts = pd.Series(dtype = np.int64)
+    for chunk in chunks():
+        chunk = convert_ratings(chunk)
+        counts = counts.add(chunk['Occupation'].value_counts(), fill_value = 0)
+        ws.append('df_copy', _wrangle_chunk(chunk))
+        del chunk
+    if 'df_copy' not in ws:
+        raise ValueError('{} has no rows'.format(path))
+
+    if occupation_fill is None:
+        occupation_fill = counts.idxmax() if len(counts) else OCCUPATION_FALLBACK
+    step = (['Occupation'], partial(convert_occupation, fill_value = occupation_fill))
+    return ws, ws.pipeline('df_copy', [step])
@@ -0,0 +1,149 @@
+"""Vintage matrix: loan status by origination quarter and rating.
+
+The ``LoanStatus`` countplot only shows the overall status shares. A vintage
+(cohort) view breaks them down by the quarter the loans were originated in,
+so that e.g. the charge-off share of 2008 loans can be compared with that of
+2012 loans of the same rating. :func:`build_cohorts` maps every loan to a
+cohort (``LoanOriginationQuarter``), a status bucket and a rating, combines
+the three codes into one cell number and counts the loans (and sums their
+LoanOriginalAmount) of every cell with a single ``np.bincount``::
+
+    cohorts = build_cohorts(df)
+    cohorts.table(normalize = True)           # status shares per quarter
+    cohorts.table(ratings = ['E', 'HR'])
+    cohorts.heatmap(status = 'Chargedoff')
+
+Loans without a rating (before July 2009) are kept under ``UNRATED``.
+"""
+import numpy as np
+import pandas as pd
+
+from .wrangle import RATE_ORDER
+
+STATUS_BUCKETS = ['Current', 'Completed', 'Chargedoff', 'Defaulted', 'Past Due', 'Other']
+UNRATED = 'Unrated'
+
+
+def status_buckets(values):
+    """Status bucket codes (positions in :data:`STATUS_BUCKETS`): all ``Past Due (...)`` statuses together."""
+    codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel = True)
+    lookup = np.full(len(uniques) + 1, STATUS_BUCKETS.index('Other'), dtype = np.int64)
+    for i, status in enumerate(uniques):
+        status = str(status)
+        if status.startswith('Past Due'):
+            lookup[i] = STATUS_BUCKETS.index('Past Due')
+        elif status in STATUS_BUCKETS:
+            lookup[i] = STATUS_BUCKETS.index(status)
+    # The sentinel -1 (missing status) reads the last entry, 'Other'
+    return lookup[codes]
+
+
+def quarter_numbers(df):
+    """Origination quarter of every loan as ``4 * year + quarter - 1``; -1 when unknown."""
+    if 'LoanOriginationQuarter' in df:
+        # 'Q3 2007': parse the few distinct labels, not every row
+        codes, uniques = pd.factorize(df['LoanOriginationQuarter'])
+        lookup = np.full(len(uniques) + 1, -1, dtype = np.int64)
+        for i, label in enumerate(uniques):
+            quarter, year = str(label).split()
+            lookup[i] = 4 * int(year) + int(quarter[1]) - 1
+        return lookup[codes]
+    months = pd.to_datetime(df['LoanOriginationDate'], format = 'ISO8601').to_numpy().astype('datetime64[M]')
+    months = months.view(np.int64)
+    numbers = 4 * 1970 + months // 3
+    numbers[months == np.iinfo(np.int64).min] = -1
+    return numbers
+
+
+class CohortMatrix:
+    """Loan counts and amounts per origination quarter x status bucket x rating."""
+
+    def __init__(self, counts, amounts, first_quarter, ratings):
+        self.counts = counts                  # (quarters, statuses, ratings)
+        self.amounts = amounts
+        self.first_quarter = first_quarter
+        self.ratings = list(ratings)
+        self.statuses = list(STATUS_BUCKETS)
+
+    @property
+    def cohorts(self):
+        numbers = self.first_quarter + np.arange(self.counts.shape[0])
+        return ['{}Q{}'.format(n // 4, n % 4 + 1) for n in numbers]
+
+    def _select(self, array, ratings):
+        if ratings is None:
+            return array.sum(axis = 2)
+        ratings = [ratings] if isinstance(ratings, str) else list(ratings)
+        missing = [r for r in ratings if r not in self.ratings]
+        if missing:
+            raise KeyError('unknown ratings: {}'.format(', '.join(missing)))
+        return array[:, :, [self.ratings.index(r) for r in ratings]].sum(axis = 2)
+
+    def table(self, ratings = None, normalize = False, amount = False):
+        """Cohort x status counts (or amounts) over ``ratings``; the shares per cohort with ``normalize``."""
+        values = self._select(self.amounts if amount else self.counts, ratings)
+        if normalize:
+            totals = values.sum(axis = 1, keepdims = True)
+            with np.errstate(invalid = 'ignore'):
+                values = np.where(totals > 0, values / np.maximum(totals, 1e-300), np.nan)
+        return pd.DataFrame(values, index = pd.Index(self.cohorts, name = 'LoanOriginationQuarter'),
+                            columns = pd.Index(self.statuses, name = 'LoanStatus'))
+
+    def by_rating(self, status, normalize = True):
+        """Cohort x rating counts of one status bucket; with ``normalize`` as a share of the cell's loans."""
+        s = self.statuses.index(status)
+        values = self.counts[:, s, :].astype(np.float64)
+        if normalize:
+            totals = self.counts.sum(axis = 1)
+            with np.errstate(invalid = 'ignore'):
+                values = np.where(totals > 0, values / np.maximum(totals, 1), np.nan)
+        return pd.DataFrame(values, index = pd.Index(self.cohorts, name = 'LoanOriginationQuarter'),
+                            columns = pd.Index(self.ratings, name = 'ProsperRating (Alpha)'))
+
+    def to_frame(self):
+        """Long format: one row per non-empty (cohort, status, rating) cell."""
+        index = pd.MultiIndex.from_product([self.cohorts, self.statuses, self.ratings],
+                                           names = ['LoanOriginationQuarter', 'LoanStatus', 'ProsperRating (Alpha)'])
+        frame = pd.DataFrame({'loans': self.counts.ravel(), 'amount': self.amounts.ravel()}, index = index)
+        return frame[frame['loans'] > 0]
+
+    def heatmap(self, status = None, ratings = None, ax = None, cmap = 'viridis'):
+        """Heatmap of the status shares per cohort, or of one ``status`` per cohort and rating."""
+        import matplotlib.pyplot as plt
+
+        if ax is None:
+            ax = plt.gca()
+        table = self.table(ratings, normalize = True) if status is None else self.by_rating(status)
+        image = ax.imshow(table.to_numpy().T, aspect = 'auto', cmap = cmap, vmin = 0, vmax = 1,
+                          interpolation = 'nearest')
+        ax.set_yticks(np.arange(table.shape[1]))
+        ax.set_yticklabels(table.columns)
+        step = max(1, len(table) // 20)
+        ax.set_xticks(np.arange(0, len(table), step))
+        ax.set_xticklabels(table.index[::step], rotation = 90)
+        ax.set_xlabel('Origination quarter')
+        ax.set_title('Share of loans by status' if status is None else 'Share of {} loans'.format(status))
+        ax.figure.colorbar(image, ax = ax)
+        return ax
+
+
+def build_cohorts(df, ratings = RATE_ORDER, amount = 'LoanOriginalAmount'):
+    """Count the loans of ``df`` per origination quarter x status bucket x rating in one ``bincount``."""
+    quarter = quarter_numbers(df)
+    known = quarter >= 0
+    labels = list(ratings) + [UNRATED]
+    rating = pd.Categorical(df['ProsperRating (Alpha)'], categories = list(ratings)).codes.astype(np.int64)
+    rating[rating < 0] = len(labels) - 1
+    status = status_buckets(df['LoanStatus'])
+    if not known.any():
+        shape = (0, len(STATUS_BUCKETS), len(labels))
+        return CohortMatrix(np.zeros(shape, np.int64), np.zeros(shape), 0, labels)
+
+    first = int(quarter[known].min())
+    shape = (int(quarter[known].max()) - first + 1, len(STATUS_BUCKETS), len(labels))
+    cell = np.ravel_multi_index((quarter[known] - first, status[known], rating[known]), shape)
+    size = shape[0] * shape[1] * shape[2]
+    counts = np.bincount(cell, minlength = size).reshape(shape)
+    weights = df[amount].to_numpy(dtype = np.float64, na_value = np.nan)[known]
+    amounts = np.bincount(cell, weights = np.nan_to_num(weights), minlength = size).reshape(shape)
+    return CohortMatrix(counts, amounts, first, labels)
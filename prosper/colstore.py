@@ -0,0 +1,308 @@
+"""Memory-mapped column store for sharing the cleaned data between processes.
+
+:func:`write_store` writes each numeric, boolean, datetime and categorical
+column of a frame as a flat binary array (category codes for categoricals)
+next to a small ``schema.json`` header. :class:`ColumnStore` maps the arrays
+read-only and builds a DataFrame over them without copying, so N worker
+processes share the operating system's page cache and cost one dataset's
+worth of RAM rather than N::
+
+    write_store(df_copy, 'prosper_store')
+
+    def work(store):
+        df = store.frame(['BorrowerAPR', 'ProsperRating (Alpha)'])
+        ...
+
+    with ProcessPoolExecutor() as pool:
+        pool.map(work, [ColumnStore('prosper_store')] * 8)
+
+A :class:`ColumnStore` pickles as its directory name only. Text columns
+(``ListingKey``, ``LoanStatus`` before conversion, ...) are not stored; they
+are listed under ``skipped`` in the schema.
+
+Every column also gets a zone map: per block of ``block_rows`` rows the
+minimum, maximum and non-null count (numeric and datetime columns) or a
+bitmap of the categories present (categoricals). The rows are written in
+the order of ``sort_by`` (by default :data:`CLUSTER_COLUMN`,
+``ListingCreationDate``, when the frame has it), so a date window covers a
+few consecutive blocks. :meth:`ColumnStore.block_mask` tells which blocks may
+hold rows matching a comparison; :func:`~prosper.lazy.scan_store` uses it to
+read only those blocks::
+
+    write_store(df_copy, 'prosper_store')
+    lf = scan_store('prosper_store')
+    lf[lf.ListingCreationDate >= '2009-07-01'].collect()
+"""
+import math
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+SCHEMA_FILE = 'schema.json'
+ZONES_FILE = 'zones.npz'
+INDEX_COLUMN = '__index__'
+BLOCK_ROWS = 65536
+CLUSTER_COLUMN = 'ListingCreationDate'
+
+# Comparisons a zone map can answer
+ZONE_OPS = ('==', '!=', '<', '<=', '>', '>=', 'isin', 'between', 'isna', 'notna')
+
+
+def _column_entry(name, values, file):
+    # Array to write and its schema entry; None for unsupported dtypes
+    dtype = values.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        categories = dtype.categories
+        return values.cat.codes.to_numpy(), {
+            'name': name, 'file': file, 'kind': 'categorical', 'dtype': values.cat.codes.dtype.str,
+            'categories': categories.tolist(), 'categories_dtype': categories.dtype.str
+            if categories.dtype.kind in 'iufb' else 'str', 'ordered': bool(dtype.ordered)}
+    if dtype.kind == 'M':
+        return values.to_numpy().view(np.int64), {
+            'name': name, 'file': file, 'kind': 'datetime', 'dtype': '<i8', 'unit': np.datetime_data(dtype)[0]}
+    if isinstance(dtype, np.dtype) and dtype.kind in 'biuf':
+        return values.to_numpy(), {'name': name, 'file': file, 'kind': 'numeric', 'dtype': dtype.str}
+    return None, None
+
+
+def _zones(array, entry, block_rows):
+    # Zone map of one stored array: per-block min/max/non-null count, or category presence bits
+    block = np.arange(len(array)) // block_rows
+    blocks = -(-len(array) // block_rows)
+    if entry['kind'] == 'categorical':
+        # Slot 0 is the missing value (code -1)
+        width = len(entry['categories']) + 1
+        present = np.bincount(block * width + array.astype(np.int64) + 1, minlength = blocks * width)
+        return {'present': np.packbits(present.reshape(blocks, width) > 0, axis = 1)}
+    if array.dtype.kind == 'b':
+        array = array.view(np.uint8)
+    if entry['kind'] == 'datetime':
+        valid = array != np.iinfo(np.int64).min
+    elif array.dtype.kind == 'f':
+        valid = ~np.isnan(array)
+    else:
+        valid = np.ones(len(array), dtype = bool)
+    starts = np.arange(0, len(array), block_rows)
+    counts = np.add.reduceat(valid.astype(np.int64), starts) if len(array) else np.zeros(0, np.int64)
+    if not len(array):
+        return {'min': array[:0], 'max': array[:0], 'valid': counts}
+    info = np.finfo(array.dtype) if array.dtype.kind == 'f' else np.iinfo(array.dtype)
+    lo = np.minimum.reduceat(np.where(valid, array, info.max), starts)
+    hi = np.maximum.reduceat(np.where(valid, array, info.min), starts)
+    # Blocks without values never match; zero keeps their bounds harmless
+    lo[counts == 0] = 0
+    hi[counts == 0] = 0
+    return {'min': lo, 'max': hi, 'valid': counts}
+
+
+def write_store(df, directory, columns = None, sort_by = CLUSTER_COLUMN, block_rows = BLOCK_ROWS):
+    """Write the supported columns of ``df`` (or of ``columns``) to ``directory``; returns the store.
+
+    The rows are written ordered by ``sort_by`` if ``df`` has that column
+    (missing values last, ties in their original order); the index keeps
+    the labels. ``sort_by = None`` keeps the order of ``df``.
+    """
+    os.makedirs(directory, exist_ok = True)
+    columns = list(df.columns if columns is None else columns)
+    if sort_by not in df:
+        sort_by = None
+    if sort_by is not None:
+        order = df[sort_by].reset_index(drop = True).sort_values(kind = 'stable', na_position = 'last').index
+        df = df.take(np.asarray(order))
+    entries, skipped, zones = [], [], {}
+    for i, name in enumerate(columns):
+        array, entry = _column_entry(name, df[name], 'c{:03d}.bin'.format(i))
+        if entry is None:
+            skipped.append(name)
+            continue
+        array = np.ascontiguousarray(array)
+        array.tofile(os.path.join(directory, entry['file']))
+        for key, values in _zones(array, entry, block_rows).items():
+            zones['{}.{}'.format(entry['file'], key)] = values
+        entries.append(entry)
+    np.savez(os.path.join(directory, ZONES_FILE), **zones)
+
+    index = None
+    if not (isinstance(df.index, pd.RangeIndex) and df.index.start == 0 and df.index.step == 1):
+        array, index = _column_entry(INDEX_COLUMN, df.index.to_series(), 'index.bin')
+        if index is not None:
+            np.ascontiguousarray(array).tofile(os.path.join(directory, index['file']))
+
+    schema = {'rows': len(df), 'columns': entries, 'index': index, 'skipped': skipped,
+              'block_rows': block_rows, 'sorted_by': sort_by, 'zones': ZONES_FILE}
+    with open(os.path.join(directory, SCHEMA_FILE), 'w') as f:
+        json.dump(schema, f, indent = 1)
+    return ColumnStore(directory)
+
+
+class ColumnStore:
+    """Read-only, zero-copy view of a store written by :func:`write_store`."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, SCHEMA_FILE)) as f:
+            self.schema = json.load(f)
+        self.rows = self.schema['rows']
+        self._entries = {e['name']: e for e in self.schema['columns']}
+        self._arrays = {}
+        self._zones = None
+        # Stores written before zone maps existed have none: nothing is skipped
+        self.block_rows = self.schema.get('block_rows') or max(self.rows, 1)
+        self.sorted_by = self.schema.get('sorted_by')
+
+    def __getstate__(self):
+        return {'directory': self.directory}
+
+    def __setstate__(self, state):
+        self.__init__(state['directory'])
+
+    @property
+    def columns(self):
+        return [e['name'] for e in self.schema['columns']]
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def array(self, name):
+        """The stored array of ``name`` as a read-only memory map (category codes for categoricals)."""
+        if name not in self._arrays:
+            entry = self.schema['index'] if name == INDEX_COLUMN else self._entries[name]
+            if self.rows == 0:
+                array = np.empty(0, dtype = entry['dtype'])
+            else:
+                array = np.memmap(os.path.join(self.directory, entry['file']), dtype = entry['dtype'],
+                                  mode = 'r', shape = (self.rows,))
+            self._arrays[name] = array
+        return self._arrays[name]
+
+    def values(self, name, rows = None):
+        """Column ``name`` as array or Categorical, over all rows or the positions ``rows``."""
+        entry = self.schema['index'] if name == INDEX_COLUMN else self._entries[name]
+        array = self.array(name)
+        if rows is not None:
+            array = array[rows]
+        if entry['kind'] == 'categorical':
+            categories = entry['categories']
+            if entry['categories_dtype'] != 'str':
+                categories = np.array(categories, dtype = entry['categories_dtype'])
+            dtype = pd.CategoricalDtype(categories, ordered = entry['ordered'])
+            return pd.Categorical.from_codes(array, dtype = dtype)
+        if entry['kind'] == 'datetime':
+            return array.view('datetime64[{}]'.format(entry['unit']))
+        return array
+
+    def index(self, rows = None):
+        if self.schema['index'] is None:
+            return pd.RangeIndex(self.rows) if rows is None else pd.Index(np.arange(self.rows)[rows])
+        return pd.Index(self.values(INDEX_COLUMN, rows))
+
+    def frame(self, columns = None, rows = None):
+        """DataFrame over the stored columns; without ``rows`` no data is copied."""
+        columns = self.columns if columns is None else list(columns)
+        data = {c: self.values(c, rows) for c in columns}
+        return pd.DataFrame(data, index = self.index(rows), copy = False)
+
+    @property
+    def blocks(self):
+        return -(-self.rows // self.block_rows)
+
+    def zone_map(self, name):
+        """Zone map of ``name``: per-block ``min``, ``max`` and ``valid`` count, or ``present`` categories."""
+        if self.schema.get('zones') is None:
+            return None
+        if self._zones is None:
+            with np.load(os.path.join(self.directory, self.schema['zones'])) as f:
+                self._zones = {key: f[key] for key in f.files}
+        entry = self._entries[name]
+        if entry['kind'] == 'categorical':
+            present = self._zones[entry['file'] + '.present']
+            width = len(entry['categories']) + 1
+            return {'present': np.unpackbits(present, axis = 1, count = width).astype(bool)}
+        return {key: self._zones['{}.{}'.format(entry['file'], key)] for key in ('min', 'max', 'valid')}
+
+    def _bounds(self, entry, value):
+        # value as (floor, ceil) in the stored representation: equal unless it falls between two values
+        if entry['kind'] == 'datetime':
+            ns = pd.Timestamp(value).value
+            step = int(np.timedelta64(1, entry['unit']) // np.timedelta64(1, 'ns'))
+            return ns // step, -(-ns // step)
+        value = float(value)
+        if np.dtype(entry['dtype']).kind == 'f' or math.isnan(value) or math.isinf(value):
+            return value, value
+        return math.floor(value), math.ceil(value)
+
+    def _category_mask(self, entry, present, op, args):
+        categories = entry['categories']
+        if entry['categories_dtype'] != 'str':
+            categories = np.array(categories, dtype = entry['categories_dtype']).tolist()
+        slots = {c: i + 1 for i, c in enumerate(categories)}
+        if op in ('==', 'isin'):
+            values = args[0] if op == 'isin' else [args[0]]
+            wanted = [slots[v] for v in values if v in slots]
+            return present[:, wanted].any(axis = 1)
+        if op == '!=':
+            # Missing values are != anything too
+            return np.delete(present, slots[args[0]], axis = 1).any(axis = 1) if args[0] in slots \
+                else np.ones(len(present), dtype = bool)
+        if not entry['ordered'] or any(v not in slots for v in args):
+            return None
+        # Ordered categories compare by position; missing values never match
+        position = np.arange(present.shape[1])
+        cut = [slots[v] for v in args]
+        keep = {'<': position < cut[0], '<=': position <= cut[0], '>': position > cut[0],
+                '>=': position >= cut[0], 'between': (position >= cut[0]) & (position <= cut[-1])}[op]
+        keep[0] = False
+        return present[:, keep].any(axis = 1)
+
+    def block_mask(self, name, op, *args):
+        """Blocks that may hold rows where ``column op args`` holds, as a boolean array; None if unknown.
+
+        ``op`` is one of :data:`ZONE_OPS`; ``'isin'`` takes a list of values
+        and ``'between'`` the inclusive bounds, as their pandas counterparts.
+        """
+        if op not in ZONE_OPS:
+            raise ValueError('unknown zone map operation {!r}; use one of {}'.format(op, ', '.join(ZONE_OPS)))
+        if name not in self._entries:
+            return None
+        zones = self.zone_map(name)
+        if zones is None:
+            return None
+        entry = self._entries[name]
+        if 'present' in zones:
+            present = zones['present']
+            if op in ('isna', 'notna'):
+                return present[:, 0] if op == 'isna' else present[:, 1:].any(axis = 1)
+            return self._category_mask(entry, present, op, args)
+
+        lo, hi, valid = zones['min'], zones['max'], zones['valid']
+        lengths = np.minimum(self.block_rows, self.rows - np.arange(self.blocks) * self.block_rows)
+        if op == 'isna':
+            return valid < lengths
+        if op == 'notna':
+            return valid > 0
+        try:
+            if op == 'isin':
+                masks = [self.block_mask(name, '==', v) for v in args[0]]
+                return np.logical_or.reduce(masks) if masks else np.zeros(self.blocks, dtype = bool)
+            bounds = [self._bounds(entry, v) for v in args]
+        except (TypeError, ValueError, OverflowError):
+            return None
+        floor, ceil = bounds[0]
+        if op == '==':
+            return (valid > 0) & (floor == ceil) & (lo <= floor) & (hi >= floor)
+        if op == '!=':
+            return ~((valid == lengths) & (floor == ceil) & (lo == floor) & (hi == floor))
+        if op == 'between':
+            return (valid > 0) & (hi >= ceil) & (lo <= bounds[1][0])
+        test = {'<': lo < ceil, '<=': lo <= floor, '>': hi > floor, '>=': hi >= ceil}[op]
+        return (valid > 0) & test
+
+    def block_positions(self, mask):
+        """Row positions of the blocks selected by ``mask``, in order."""
+        starts = np.flatnonzero(mask) * self.block_rows
+        if not len(starts):
+            return np.zeros(0, dtype = np.int64)
+        ends = np.minimum(starts + self.block_rows, self.rows)
+        return np.concatenate([np.arange(a, b) for a, b in zip(starts, ends)])
@@ -0,0 +1,146 @@
+"""Streaming decompression of compressed loan exports.
+
+Archived extracts are kept gzip, bzip2, xz or zstd compressed and do not fit
+in memory once decompressed. :class:`ThreadedDecompressor` decompresses such
+a file block by block in a background thread into a small bounded queue and
+exposes the result as a read-only binary file, which ``pd.read_csv`` (chunked
+or not) parses while the next blocks are being decompressed. Nothing is ever
+written to disk uncompressed.
+
+The codecs release the GIL while decompressing, so decompression and parsing
+overlap. zstd needs the optional ``zstandard`` package.
+"""
+import bz2
+import gzip
+import io
+import lzma
+import os
+import queue
+import threading
+
+import pandas as pd
+
+# File signatures of the supported codecs
+MAGIC = [(b'\x1f\x8b', 'gzip'), (b'BZh', 'bz2'), (b'\xfd7zXZ\x00', 'xz'), (b'\x28\xb5\x2f\xfd', 'zstd')]
+EXTENSIONS = {'.gz': 'gzip', '.gzip': 'gzip', '.bz2': 'bz2', '.xz': 'xz', '.zst': 'zstd', '.zstd': 'zstd'}
+
+BLOCK_SIZE = 1 << 20
+
+
+def detect_compression(path):
+    """Codec of ``path`` from its extension or, failing that, its first bytes; None if plain.
+
+    Open files, buffers and URLs are left to pandas (None).
+    """
+    if not isinstance(path, (str, os.PathLike)) or not os.path.isfile(path):
+        return None
+    ext = os.path.splitext(str(path))[1].lower()
+    if ext in EXTENSIONS:
+        return EXTENSIONS[ext]
+    with open(path, 'rb') as f:
+        head = f.read(8)
+    for magic, codec in MAGIC:
+        if head.startswith(magic):
+            return codec
+    return None
+
+
+def _open_codec(path, codec):
+    if codec == 'gzip':
+        return gzip.open(path, 'rb')
+    if codec == 'bz2':
+        return bz2.open(path, 'rb')
+    if codec == 'xz':
+        return lzma.open(path, 'rb')
+    if codec == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError('reading .zst files requires the zstandard package (pip install zstandard)')
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd = True)
+    raise ValueError('unsupported compression: {!r}'.format(codec))
+
+
+class ThreadedDecompressor(io.RawIOBase):
+    """Binary file over the decompressed content of ``path``, filled by a background thread."""
+
+    def __init__(self, path, codec = None, block_size = BLOCK_SIZE, queue_blocks = 8):
+        super().__init__()
+        self.codec = codec or detect_compression(path)
+        self._source = _open_codec(path, self.codec)
+        self._queue = queue.Queue(maxsize = queue_blocks)
+        self._stop = threading.Event()
+        self._block = memoryview(b'')
+        self._eof = False
+        self._thread = threading.Thread(target = self._decompress, args = (block_size,), daemon = True)
+        self._thread.start()
+
+    def _decompress(self, block_size):
+        try:
+            while not self._stop.is_set():
+                block = self._source.read(block_size)
+                if not block:
+                    break
+                self._put(block)
+            self._put(None)
+        except BaseException as e:
+            self._put(e)
+        finally:
+            self._source.close()
+
+    def _put(self, item):
+        # Give up if the reader went away while the queue is full
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout = 0.1)
+                return
+            except queue.Full:
+                continue
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not len(self._block):
+            if self._eof:
+                return 0
+            item = self._queue.get()
+            if item is None:
+                self._eof = True
+                return 0
+            if isinstance(item, BaseException):
+                self._eof = True
+                raise item
+            self._block = memoryview(item)
+        n = min(len(buffer), len(self._block))
+        buffer[:n] = self._block[:n]
+        self._block = self._block[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            self._thread.join()
+        super().close()
+
+
+def _chunks(stream, reader):
+    # Yield the chunks of reader, closing the stream when done or abandoned
+    try:
+        with reader:
+            for chunk in reader:
+                yield chunk
+    finally:
+        stream.close()
+
+
+def read_csv(path, chunksize = None, **kwargs):
+    """``pd.read_csv`` that decompresses gzip/bz2/xz/zstd inputs in a background thread."""
+    codec = detect_compression(path)
+    if codec is None:
+        return pd.read_csv(path, chunksize = chunksize, **kwargs)
+    stream = io.BufferedReader(ThreadedDecompressor(path, codec), buffer_size = BLOCK_SIZE)
+    if chunksize is None:
+        with stream:
+            return pd.read_csv(stream, **kwargs)
+    return _chunks(stream, pd.read_csv(stream, chunksize = chunksize, **kwargs))
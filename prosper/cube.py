@@ -0,0 +1,193 @@
+"""Precomputed aggregate cube over the low-cardinality loan dimensions.
+
+Most charts of the exploration are group-bys over a handful of categorical
+columns: the pointplot of BorrowerAPR by Term and ProsperRating, the
+countplots by Term/LoanStatus/EmploymentStatus/BorrowerState and the yearly
+volume lines. :func:`build_cube` computes count, sum and sum of squares of
+the measures for every combination of those dimensions that occurs, in one
+``np.bincount`` pass over the combined category codes; means, variances,
+rollups and slices are then read from the (small) cube instead of the rows::
+
+    cube = build_cube(df_copy)
+    cube.rollup('Term', 'ProsperRating (Alpha)').mean('BorrowerAPR')
+    cube.slice({'Term': 60}).rollup('LoanStatus').counts()
+
+Only the observed cells are stored (a dense array over the six dimensions
+would have over a million cells, nearly all empty), as one row of codes
+per cell; a rollup groups the cells by the codes it keeps with another
+``np.bincount``. A missing dimension value has code -1, so a loan missing
+e.g. its ProsperRating still counts in the rollups and slices that do not
+use the rating. Like a pandas group-by (``observed = True``), the results
+leave out the cells with a missing value of the dimensions they are
+grouped or sliced by, and the combinations that have no loans.
+"""
+import numpy as np
+import pandas as pd
+
+DIMENSIONS = ['ProsperRating (Alpha)', 'Term', 'LoanStatus', 'EmploymentStatus', 'BorrowerState',
+              'LoanOriginationYear']
+MEASURES = ['BorrowerAPR', 'LoanOriginalAmount', 'StatedMonthlyIncome']
+
+
+def dimension_codes(df, column):
+    """Category codes and labels of ``column``; ``LoanOriginationYear`` is derived from the date."""
+    if column == 'LoanOriginationYear':
+        values = pd.to_datetime(df['LoanOriginationDate']).dt.year
+    else:
+        values = df[column]
+    if values.dtype.name != 'category':
+        values = values.astype('category')
+    return values.cat.codes.to_numpy(), list(values.cat.categories)
+
+
+class Cube:
+    """Count, sum and sum of squares per measure for the observed cells of ``dims``.
+
+    ``codes`` has one row per cell and one column per dimension, holding
+    the position of the cell's label in ``labels`` (-1 if missing); the
+    aggregates are arrays over the cells.
+    """
+
+    def __init__(self, dims, labels, codes, rows, n, sums, squares):
+        self.dims = list(dims)
+        self.labels = [list(l) for l in labels]
+        self.codes = codes        # dimension codes per cell
+        self.rows = rows          # loans per cell
+        self.n = n                # non-missing values per measure and cell
+        self.sums = sums
+        self.squares = squares
+
+    @property
+    def shape(self):
+        return tuple(len(l) for l in self.labels)
+
+    @property
+    def measures(self):
+        return list(self.sums)
+
+    def _axis(self, dim):
+        try:
+            return self.dims.index(dim)
+        except ValueError:
+            raise KeyError('{} is not a dimension of this cube'.format(dim))
+
+    def _map(self, func, dims, labels, codes):
+        return Cube(dims, labels, codes, func(self.rows),
+                    {m: func(a) for m, a in self.n.items()},
+                    {m: func(a) for m, a in self.sums.items()},
+                    {m: func(a) for m, a in self.squares.items()})
+
+    def rollup(self, *dims):
+        """Cube over ``dims`` only, summing out every other dimension."""
+        keep = [self._axis(d) for d in dims]
+        labels = [self.labels[i] for i in keep]
+        codes, inverse = _cells(self.codes[:, keep], labels)
+        size = len(codes)
+        return self._map(lambda a: np.bincount(inverse, weights = a, minlength = size).astype(a.dtype),
+                         dims, labels, codes)
+
+    def slice(self, where):
+        """Sub-cube restricted to ``{dim: label or [labels]}``; a single label drops the dimension."""
+        cube = self
+        for dim, wanted in where.items():
+            axis = cube._axis(dim)
+            labels = cube.labels[axis]
+            single = not isinstance(wanted, (list, tuple, set))
+            picks = [wanted] if single else list(wanted)
+            try:
+                index = [labels.index(v) for v in picks]
+            except ValueError:
+                raise KeyError('{} has no value among {}'.format(dim, picks))
+            # Position of every label among the picks (-1: not picked), the last entry for code -1
+            lookup = np.full(len(labels) + 1, -1, dtype = cube.codes.dtype)
+            lookup[index] = np.arange(len(index))
+            position = lookup[cube.codes[:, axis]]
+            selected = position >= 0
+            codes = cube.codes[selected]
+            if single:
+                codes = np.delete(codes, axis, axis = 1)
+                dims = cube.dims[:axis] + cube.dims[axis + 1:]
+                labels = cube.labels[:axis] + cube.labels[axis + 1:]
+            else:
+                codes[:, axis] = position[selected]
+                dims = cube.dims
+                labels = cube.labels[:axis] + [picks] + cube.labels[axis + 1:]
+            cube = cube._map(lambda a: a[selected], dims, labels, codes)
+        return cube
+
+    def counts(self):
+        """Number of loans per cell."""
+        return self._frame(self.rows, 'count')
+
+    def sum(self, measure):
+        return self._frame(self.sums[measure], measure)
+
+    def mean(self, measure):
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            return self._frame(self.sums[measure] / self.n[measure], measure, empty = np.nan)
+
+    def var(self, measure, ddof = 1):
+        n, s, q = self.n[measure], self.sums[measure], self.squares[measure]
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            var = (q - s * s / n) / (n - ddof)
+        # Guard against tiny negative values from cancellation
+        return self._frame(np.where(var < 0, 0.0, var), measure, empty = np.nan)
+
+    def std(self, measure, ddof = 1):
+        return np.sqrt(self.var(measure, ddof))
+
+    def _frame(self, values, name, empty = 0):
+        # Scalars for a fully rolled-up cube (at most one cell), otherwise a Series over the cells
+        if not self.dims:
+            return values[0].item() if len(values) else empty
+        # Leave out the cells missing a value of a remaining dimension
+        present = (self.codes >= 0).all(axis = 1)
+        codes = self.codes[present]
+        index = pd.MultiIndex(levels = self.labels, codes = list(codes.T), names = self.dims)
+        series = pd.Series(np.asarray(values)[present], index = index, name = name)
+        if len(self.dims) == 1:
+            series.index = series.index.get_level_values(0)
+        return series
+
+
+def _cells(codes, labels):
+    # Distinct rows of ``codes`` in label order (missing last) and the cell of every row
+    shape = tuple(len(l) + 1 for l in labels)
+    if not shape:
+        return np.zeros((1, 0), dtype = codes.dtype), np.zeros(len(codes), dtype = np.intp)
+    # Code -1 (missing) goes to the slot after the labels
+    flat = np.ravel_multi_index([np.where(c < 0, s - 1, c) for c, s in zip(codes.T, shape)], shape)
+    size = int(np.prod(shape))
+    if size <= 4 * len(flat):
+        # Few possible cells (most rollups): mark them in a dense array instead of sorting the keys
+        seen = np.zeros(size, dtype = bool)
+        seen[flat] = True
+        cells, inverse = np.flatnonzero(seen), (np.cumsum(seen) - 1)[flat]
+    else:
+        cells, inverse = np.unique(flat, return_inverse = True)
+    cells = np.column_stack(np.unravel_index(cells, shape)).astype(codes.dtype)
+    cells[cells == np.array(shape) - 1] = -1
+    return cells, inverse.ravel()
+
+
+def build_cube(df, dims = DIMENSIONS, measures = MEASURES):
+    """Aggregate ``df`` into a :class:`Cube` over the combinations of ``dims`` that occur."""
+    codes, labels = [], []
+    for d in dims:
+        c, l = dimension_codes(df, d)
+        codes.append(c.astype(np.int32))
+        labels.append(l)
+    codes = np.column_stack(codes) if dims else np.zeros((len(df), 0), dtype = np.int32)
+    cells, inverse = _cells(codes, labels)
+    size = len(cells)
+
+    rows = np.bincount(inverse, minlength = size)
+    n, sums, squares = {}, {}, {}
+    for m in measures:
+        x = df[m].to_numpy(dtype = np.float64, na_value = np.nan)
+        present = ~np.isnan(x)
+        x = np.where(present, x, 0.0)
+        n[m] = np.bincount(inverse, weights = present, minlength = size)
+        sums[m] = np.bincount(inverse, weights = x, minlength = size)
+        squares[m] = np.bincount(inverse, weights = x * x, minlength = size)
+    return Cube(dims, labels, cells, rows, n, sums, squares)
@@ -0,0 +1,148 @@
+"""Deduplication of repeated ``ListingKey`` records.
+
+Some listings appear more than once in the Prosper export with the same
+``ListingKey``. Keys are reduced to 64-bit hashes and duplicates are found with
+vectorized sorts over those hashes, never over the rows themselves, so the same
+code works on a whole frame and on a stream of chunks too large to hold:
+
+- ``keep='first'`` streams in one pass, remembering the hashes seen so far in
+  a :class:`KeySet` (8 bytes per distinct key);
+- ``keep='last'`` and ``keep='complete'`` (the row with the fewest missing
+  values, earliest on ties) need two passes: the first one only collects the
+  hash, score and position of every row to pick the winners.
+"""
+import numpy as np
+import pandas as pd
+
+KEY_COLUMN = 'ListingKey'
+KEEP_POLICIES = ('first', 'last', 'complete')
+
+
+def key_hashes(keys):
+    """64-bit hashes of the listing keys."""
+    return pd.util.hash_pandas_object(pd.Series(keys), index = False).to_numpy()
+
+
+class DedupReport:
+    """How many rows went in and out of the dedup stage."""
+
+    def __init__(self, keep, rows_in = 0, rows_out = 0):
+        self.keep = keep
+        self.rows_in = rows_in
+        self.rows_out = rows_out
+
+    @property
+    def dropped(self):
+        return self.rows_in - self.rows_out
+
+    def __repr__(self):
+        return 'DedupReport(keep={!r}, rows_in={}, rows_out={}, dropped={})'.format(
+            self.keep, self.rows_in, self.rows_out, self.dropped)
+
+
+class KeySet:
+    """Compact set of key hashes, kept as a few sorted runs that are merged as they pile up."""
+
+    def __init__(self, max_runs = 8):
+        self.max_runs = max_runs
+        self.runs = []
+
+    def __len__(self):
+        return sum(len(r) for r in self.runs)
+
+    def contains(self, hashes):
+        found = np.zeros(len(hashes), dtype = bool)
+        for run in self.runs:
+            position = np.searchsorted(run, hashes)
+            position[position == len(run)] = 0
+            found |= run[position] == hashes
+        return found
+
+    def add_new(self, hashes):
+        """Add ``hashes``; returns the mask of rows whose key had not been seen (first occurrence only)."""
+        _, first = np.unique(hashes, return_index = True)
+        new = np.zeros(len(hashes), dtype = bool)
+        new[first] = True
+        new &= ~self.contains(hashes)
+        if new.any():
+            self.runs.append(np.sort(hashes[new]))
+            if len(self.runs) > self.max_runs:
+                self.runs = [np.concatenate(self.runs)]
+                self.runs[0].sort()
+        return new
+
+
+def _scores(chunk, keep, positions):
+    # Higher score wins; ties go to the earliest row
+    if keep == 'last':
+        return positions
+    if keep == 'complete':
+        return chunk.notna().sum(axis = 1).to_numpy(dtype = np.int64)
+    return np.zeros(len(chunk), dtype = np.int64)
+
+
+def winners(hashes, scores, positions):
+    """Sorted positions of the row kept for each key."""
+    order = np.lexsort((positions, -scores, hashes))
+    h = hashes[order]
+    first = np.ones(len(h), dtype = bool)
+    first[1:] = h[1:] != h[:-1]
+    return np.sort(positions[order][first])
+
+
+def _check(keep):
+    if keep not in KEEP_POLICIES:
+        raise ValueError('keep must be one of {}, got {!r}'.format(KEEP_POLICIES, keep))
+
+
+def dedup_frame(df, keep = 'first', key = KEY_COLUMN):
+    """``df`` without repeated keys, and a :class:`DedupReport`."""
+    _check(keep)
+    positions = np.arange(len(df), dtype = np.int64)
+    kept = winners(key_hashes(df[key]), _scores(df, keep, positions), positions)
+    return df.iloc[kept], DedupReport(keep, len(df), len(kept))
+
+
+def dedup_chunks(open_chunks, keep = 'first', key = KEY_COLUMN, report = None):
+    """Yield the chunks of ``open_chunks()`` without repeated keys.
+
+    ``open_chunks`` is called once (twice for ``'last'``/``'complete'``) and must
+    return an iterable of DataFrames, e.g.
+    ``lambda: pd.read_csv(path, chunksize = 100000)``. Pass a :class:`DedupReport`
+    as ``report`` to get the row counts once the generator is exhausted.
+    """
+    _check(keep)
+    report = report if report is not None else DedupReport(keep)
+    report.keep = keep
+
+    if keep == 'first':
+        seen = KeySet()
+        for chunk in open_chunks():
+            new = seen.add_new(key_hashes(chunk[key]))
+            report.rows_in += len(chunk)
+            report.rows_out += int(new.sum())
+            yield chunk[new]
+        return
+
+    # First pass: hash, score and position of every row
+    hashes, scores, positions = [], [], []
+    offset = 0
+    for chunk in open_chunks():
+        position = np.arange(offset, offset + len(chunk), dtype = np.int64)
+        hashes.append(key_hashes(chunk[key]))
+        scores.append(_scores(chunk, keep, position))
+        positions.append(position)
+        offset += len(chunk)
+    if not hashes:
+        return
+    kept = winners(np.concatenate(hashes), np.concatenate(scores), np.concatenate(positions))
+    del hashes, scores, positions
+
+    # Second pass: keep the winning rows
+    offset = 0
+    for chunk in open_chunks():
+        lo, hi = np.searchsorted(kept, [offset, offset + len(chunk)])
+        report.rows_in += len(chunk)
+        report.rows_out += int(hi - lo)
+        yield chunk.iloc[kept[lo:hi] - offset]
+        offset += len(chunk)
@@ -0,0 +1,116 @@
+"""Notebook export to HTML and slides from inside the running process.
+
+Both notebooks end by starting ``jupyter nbconvert`` in a subprocess, which
+starts a fresh Python, imports nbconvert and its templates and writes the
+file. :func:`export` runs the nbconvert exporters in the current process
+instead, keeping one exporter per format and template so the templates are
+compiled once per session. It converts the notebook with the outputs stored
+in it: no cell is executed again and the data already loaded in the kernel is
+left alone. Save the notebook first so its latest outputs are on disk::
+
+    from prosper.export import export
+
+    export('exploration_template.ipynb')                       # exploration_template.html
+    export('slide_deck_template.ipynb', to = 'slides', template = 'output_toggle', serve = True)
+
+``serve = True`` replaces ``--post serve``: the folder is served over HTTP
+from a background thread (one server per port for the whole session) and
+the URL of the slides is returned. nbconvert is imported on the first export.
+
+``output_toggle.tpl`` is a template for nbconvert 5 (it extends
+``slides_reveal.tpl``, which later versions no longer ship). With nbconvert 6
+or later such ``.tpl`` templates are replaced by hiding the input cells
+(``exclude_input``), which is how ``output_toggle`` shows the slides until an
+output is clicked.
+"""
+import functools
+import os
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+FORMATS = {'html': ('HTMLExporter', '.html'), 'slides': ('SlidesExporter', '.slides.html')}
+
+# reveal.js is loaded from a CDN, as with ``--post serve``
+REVEAL_URL_PREFIX = 'https://cdnjs.cloudflare.com/ajax/libs/reveal.js/3.5.0'
+
+_exporters = {}
+_servers = {}
+
+
+def _template(template):
+    # Directory and file name of a template given as 'output_toggle' or a path to a .tpl/.j2 file
+    if not os.path.splitext(template)[1]:
+        template += '.tpl'
+    path = os.path.abspath(template)
+    return os.path.dirname(path), os.path.basename(path)
+
+
+def exporter(to = 'html', template = None):
+    """The nbconvert exporter for ``to`` (``'html'`` or ``'slides'``) and ``template``, created once."""
+    if to not in FORMATS:
+        raise ValueError('unknown export format {!r}; use one of {}'.format(to, ', '.join(FORMATS)))
+    key = (to, None if template is None else _template(template))
+    if key not in _exporters:
+        try:
+            import nbconvert
+        except ImportError:
+            raise ImportError('exporting notebooks requires nbconvert (pip install nbconvert)')
+        kwargs = {}
+        if template is not None:
+            directory, name = key[1]
+            if int(nbconvert.__version__.split('.')[0]) < 6:
+                kwargs.update(template_file = name, template_path = [directory])
+            elif name.endswith('.tpl'):
+                kwargs['exclude_input'] = True
+            else:
+                kwargs.update(template_file = name, extra_template_basedirs = [directory])
+        if to == 'slides':
+            kwargs['reveal_url_prefix'] = REVEAL_URL_PREFIX
+        _exporters[key] = getattr(nbconvert, FORMATS[to][0])(**kwargs)
+    return _exporters[key]
+
+
+def serve_directory(directory, port = 8000, host = '127.0.0.1'):
+    """Serve ``directory`` over HTTP from a daemon thread; returns the base URL. One server per port."""
+    directory = os.path.abspath(directory)
+    if port in _servers:
+        server, served = _servers[port]
+        if served == directory:
+            return 'http://{}:{}'.format(*server.server_address[:2])
+        server.shutdown()
+        server.server_close()
+    handler = functools.partial(SimpleHTTPRequestHandler, directory = directory)
+    server = ThreadingHTTPServer((host, port), handler)
+    Thread(target = server.serve_forever, daemon = True).start()
+    _servers[port] = (server, directory)
+    return 'http://{}:{}'.format(*server.server_address[:2])
+
+
+def export(notebook, to = 'html', template = None, output = None, serve = False, port = 8000):
+    """Convert ``notebook`` (a path or a ``NotebookNode``) with its stored outputs; returns the written path.
+
+    The file is written next to the notebook with nbconvert's name
+    (``name.html`` or ``name.slides.html``) unless ``output`` is given. With
+    ``serve`` its folder is served and the URL of the file returned.
+    """
+    import nbformat
+
+    if isinstance(notebook, (str, os.PathLike)):
+        path = os.path.abspath(notebook)
+        node = nbformat.read(path, as_version = 4)
+    else:
+        path, node = os.path.abspath(output or 'notebook.ipynb'), notebook
+    directory, name = os.path.split(path)
+    name = os.path.splitext(name)[0]
+
+    resources = {'metadata': {'name': name, 'path': directory}}
+    body, _ = exporter(to, template).from_notebook_node(node, resources = resources)
+    if output is None:
+        output = os.path.join(directory, name + FORMATS[to][1])
+    with open(output, 'w', encoding = 'utf-8') as f:
+        f.write(body)
+
+    if serve:
+        base = serve_directory(os.path.dirname(os.path.abspath(output)), port)
+        return '{}/{}'.format(base, os.path.basename(output))
+    return output
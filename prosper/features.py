@@ -0,0 +1,134 @@
+"""Registry of derived loan features (log transforms and friends).
+
+Each derived column is declared once with its inputs, a vectorized kernel and
+the domain its inputs must lie in. A :class:`FeatureStore` computes a feature
+only the first time it is requested, writing the kernel output into a
+preallocated buffer, and keeps it for as long as the dataset version does not
+change::
+
+    features = FeatureStore(df_copy, version = cache.version)
+    features['StatedMonthlyIncome_ln']      # computed now
+    features['StatedMonthlyIncome_ln']      # cached
+
+Rows outside the domain (zero incomes under a log, say) get NaN rather than
+the ``-inf`` that a bare ``np.log10`` produces.
+"""
+import numpy as np
+import pandas as pd
+
+# Predicates for the domain of the inputs
+DOMAINS = {
+    'positive': lambda x, out: np.greater(x, 0, out = out),
+    'nonnegative': lambda x, out: np.greater_equal(x, 0, out = out),
+    'finite': lambda x, out: np.isfinite(x, out = out),
+}
+
+
+class Feature:
+    """A derived column: ``kernel(out, *inputs, where = mask)`` fills ``out`` where ``mask`` holds."""
+
+    def __init__(self, name, inputs, kernel, domain = 'finite', doc = None):
+        if domain not in DOMAINS:
+            raise ValueError('domain must be one of {}, got {!r}'.format(sorted(DOMAINS), domain))
+        self.name = name
+        self.inputs = list(inputs)
+        self.kernel = kernel
+        self.domain = domain
+        self.doc = doc
+
+    def compute(self, df, out = None):
+        """Fill ``out`` (allocated if not given) with the feature over ``df``; NaN outside the domain."""
+        arrays = [df[c].to_numpy(dtype = np.float64) for c in self.inputs]
+        n = len(df)
+        if out is None:
+            out = np.empty(n, dtype = np.float64)
+        out.fill(np.nan)
+        where = np.empty(n, dtype = bool)
+        scratch = np.empty(n, dtype = bool)
+        DOMAINS[self.domain](arrays[0], where)
+        for x in arrays[1:]:
+            np.logical_and(where, DOMAINS[self.domain](x, scratch), out = where)
+        self.kernel(out, *arrays, where = where)
+        return out
+
+
+FEATURES = {}
+
+
+def register(name, inputs, domain = 'finite'):
+    """Decorator adding a kernel to ``FEATURES`` under ``name``."""
+    def decorator(kernel):
+        FEATURES[name] = Feature(name, inputs, kernel, domain, kernel.__doc__)
+        return kernel
+    return decorator
+
+
+@register('DebtToIncomeRatio_ln', ['DebtToIncomeRatio'], domain = 'positive')
+def _debt_to_income_ln(out, x, where):
+    """log10 of DebtToIncomeRatio."""
+    np.log10(x, out = out, where = where)
+
+
+@register('StatedMonthlyIncome_ln', ['StatedMonthlyIncome'], domain = 'positive')
+def _stated_monthly_income_ln(out, x, where):
+    """log10 of StatedMonthlyIncome; zero incomes are NaN."""
+    np.log10(x, out = out, where = where)
+
+
+@register('LoanOriginalAmount_ln', ['LoanOriginalAmount'], domain = 'positive')
+def _loan_original_amount_ln(out, x, where):
+    """log10 of LoanOriginalAmount."""
+    np.log10(x, out = out, where = where)
+
+
+@register('LoanToAnnualIncome', ['LoanOriginalAmount', 'StatedMonthlyIncome'], domain = 'positive')
+def _loan_to_annual_income(out, amount, income, where):
+    """LoanOriginalAmount over twelve times StatedMonthlyIncome."""
+    np.divide(amount, income, out = out, where = where)
+    np.divide(out, 12, out = out, where = where)
+
+
+@register('CreditScoreRangeMid', ['CreditScoreRangeLower', 'CreditScoreRangeUpper'])
+def _credit_score_range_mid(out, lower, upper, where):
+    """Midpoint of the credit score range."""
+    np.add(lower, upper, out = out, where = where)
+    np.multiply(out, 0.5, out = out, where = where)
+
+
+class FeatureStore:
+    """Lazily computed, cached derived features of one version of a dataset."""
+
+    def __init__(self, df, version = 0, registry = FEATURES):
+        self.registry = registry
+        self.df = df
+        self.version = version
+        self._cache = {}
+
+    def set_data(self, df, version):
+        """Point the store at another dataset version; cached features are dropped if it changed."""
+        if version != self.version or len(df) != len(self.df):
+            self._cache.clear()
+        self.df = df
+        self.version = version
+
+    def __contains__(self, name):
+        return name in self.registry
+
+    def __getitem__(self, name):
+        key = (name, self.version)
+        if key not in self._cache:
+            try:
+                feature = self.registry[name]
+            except KeyError:
+                raise KeyError('no derived feature named {!r}'.format(name))
+            values = feature.compute(self.df)
+            values.setflags(write = False)
+            self._cache[key] = values
+        return self._cache[key]
+
+    def series(self, name):
+        """The feature as a Series aligned with the dataset."""
+        return pd.Series(self[name], index = self.df.index, name = name)
+
+    def cached(self):
+        return sorted(name for name, version in self._cache if version == self.version)
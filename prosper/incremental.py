@@ -0,0 +1,198 @@
+"""Incremental refresh of the cleaned loan data.
+
+Instead of re-wrangling a fresh CSV every month, a :class:`LoanCache` keeps
+the cleaned data as a sequence of parts on disk, together with the running
+aggregates of the exploration (null counts, category frequencies, fixed-bin
+histograms and the correlation statistics of the numeric variables).
+:meth:`LoanCache.append` only wrangles the listings whose ``ListingKey`` has
+not been seen before, writes them as a new part and folds them into the
+aggregates, so a monthly refresh costs time proportional to the delta (plus
+merging its 8-byte key hashes into the sorted key set)::
+
+    cache = LoanCache('prosper_cache')
+    cache.rebuild(load_loans('prosperLoanData.csv'))
+    cache.append(load_loans('prosperLoanData_2014-04.csv'))
+    df_copy = cache.load()
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .dedup import KEY_COLUMN, key_hashes
+from .parallel import occupation_fill
+from .wrangle import OCCUPATION_FALLBACK, concat_frames, wrangle
+
+# Numeric variables of the correlation heat map
+CORRELATION_VARIABLES = ['BorrowerAPR', 'DebtToIncomeRatio_ln', 'StatedMonthlyIncome_ln', 'LoanOriginalAmount']
+
+FREQUENCY_COLUMNS = ['ProsperRating (Alpha)', 'Term', 'LoanStatus', 'Occupation', 'EmploymentStatus',
+                     'IsBorrowerHomeowner', 'BorrowerState', 'ListingCategory (Alpha)']
+
+# Fixed bin edges so that histograms of different deltas can simply be added; values outside them are
+# counted in the first or last bin
+HISTOGRAM_BINS = {
+    'BorrowerAPR': np.arange(0, 0.52, 0.01),
+    'DebtToIncomeRatio': np.arange(0, 10.01, 0.01),
+    'StatedMonthlyIncome': np.arange(0, 50000, 500),
+    'LoanOriginalAmount': np.arange(0, 36000, 1000),
+    'CreditScoreRangeLower': np.arange(0, 900, 10),
+}
+
+
+class RunningAggregates:
+    """Mergeable summaries of the raw and cleaned rows seen so far."""
+
+    def __init__(self):
+        self.raw_rows = 0
+        self.rows = 0
+        self.null_counts = pd.Series(dtype = np.int64)
+        self.frequencies = {c: pd.Series(dtype = np.int64) for c in FREQUENCY_COLUMNS}
+        self.histograms = {c: np.zeros(len(b) - 1, dtype = np.int64) for c, b in HISTOGRAM_BINS.items()}
+        # Count, means and co-moment matrix of the complete numeric rows
+        k = len(CORRELATION_VARIABLES)
+        self.n = 0
+        self.means = np.zeros(k)
+        self.comoments = np.zeros((k, k))
+
+    def update(self, raw, cleaned):
+        """Fold a delta (its raw rows and their cleaned version) into the aggregates."""
+        self.raw_rows += len(raw)
+        self.null_counts = self.null_counts.add(raw.isnull().sum(), fill_value = 0).astype(np.int64)
+
+        self.rows += len(cleaned)
+        for c in FREQUENCY_COLUMNS:
+            counts = cleaned[c].value_counts()
+            self.frequencies[c] = self.frequencies[c].add(counts, fill_value = 0).astype(np.int64)
+        for c, bins in HISTOGRAM_BINS.items():
+            values = np.clip(cleaned[c].dropna().to_numpy(dtype = np.float64), bins[0], bins[-1])
+            self.histograms[c] += np.histogram(values, bins = bins)[0]
+
+        x = cleaned[CORRELATION_VARIABLES].to_numpy(dtype = np.float64)
+        x = x[np.isfinite(x).all(axis = 1)]
+        if len(x):
+            means = x.mean(axis = 0)
+            centered = x - means
+            self._merge_moments(len(x), means, centered.T @ centered)
+        return self
+
+    def merge(self, other):
+        """Combine with the aggregates of another, disjoint set of rows."""
+        self.raw_rows += other.raw_rows
+        self.rows += other.rows
+        self.null_counts = self.null_counts.add(other.null_counts, fill_value = 0).astype(np.int64)
+        for c in FREQUENCY_COLUMNS:
+            self.frequencies[c] = self.frequencies[c].add(other.frequencies[c], fill_value = 0).astype(np.int64)
+        for c in HISTOGRAM_BINS:
+            self.histograms[c] += other.histograms[c]
+        if other.n:
+            self._merge_moments(other.n, other.means, other.comoments)
+        return self
+
+    def _merge_moments(self, n, means, comoments):
+        # Pairwise update of Chan et al., stable for large and small deltas alike
+        total = self.n + n
+        delta = means - self.means
+        self.comoments = self.comoments + comoments + np.outer(delta, delta) * self.n * n / total
+        self.means = self.means + delta * n / total
+        self.n = total
+
+    def mode(self, column):
+        counts = self.frequencies[column]
+        return counts.idxmax() if len(counts) else None
+
+    def histogram(self, column):
+        """``(counts, bin_edges)`` of a numeric column; the end bins also count the values beyond the edges."""
+        return self.histograms[column], HISTOGRAM_BINS[column]
+
+    def correlation(self):
+        """Pearson correlation matrix of ``CORRELATION_VARIABLES``."""
+        scale = np.sqrt(np.diag(self.comoments))
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            corr = self.comoments / np.outer(scale, scale)
+        return pd.DataFrame(corr, index = CORRELATION_VARIABLES, columns = CORRELATION_VARIABLES)
+
+
+class LoanCache:
+    """On-disk, append-only store of the cleaned loans and their running aggregates."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        manifest = os.path.join(directory, 'manifest.json')
+        if os.path.exists(manifest):
+            with open(manifest) as f:
+                self.manifest = json.load(f)
+            self.aggregates = pd.read_pickle(self._path('aggregates.pkl'))
+            self.keys = np.load(self._path('keys.npy'))
+        else:
+            self.manifest = {'version': 0, 'parts': [], 'occupation_fill': None, 'occupation_counts': {}}
+            self.aggregates = RunningAggregates()
+            self.keys = np.empty(0, dtype = np.uint64)
+
+    @property
+    def version(self):
+        """Incremented by every rebuild and append."""
+        return self.manifest['version']
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def rebuild(self, raw):
+        """Start over from a full export."""
+        for part in self.manifest['parts']:
+            os.remove(self._path(part))
+        version = self.manifest['version']
+        self.manifest = {'version': version, 'parts': [], 'occupation_fill': None, 'occupation_counts': {}}
+        self.aggregates = RunningAggregates()
+        self.keys = np.empty(0, dtype = np.uint64)
+        return self.append(raw)
+
+    def append(self, raw):
+        """Wrangle and store the listings of ``raw`` not yet in the cache; returns how many were new."""
+        hashes = key_hashes(raw[KEY_COLUMN])
+        # New keys only, and each of them once
+        position = np.searchsorted(self.keys, hashes)
+        position[position == len(self.keys)] = 0
+        known = self.keys[position] == hashes if len(self.keys) else np.zeros(len(hashes), dtype = bool)
+        _, first = np.unique(hashes, return_index = True)
+        fresh = np.zeros(len(hashes), dtype = bool)
+        fresh[first] = True
+        fresh &= ~known
+        delta = raw[fresh]
+        if not len(delta):
+            return 0
+
+        # Same rule as the notebook (most frequent Occupation of the rated loans), over the raw rows of the
+        # whole history: the cleaned parts hold the filled values and would favour the earlier fills
+        history = pd.Series(self.manifest.get('occupation_counts') or {}, dtype = np.int64)
+        rated = delta.loc[delta['ProsperRating (Alpha)'].notna(), 'Occupation'].value_counts()
+        counts = history.add(rated, fill_value = 0).astype(np.int64)
+        if not len(history) and len(rated):
+            fill = occupation_fill(delta)
+        else:
+            fill = counts.idxmax() if len(counts) else OCCUPATION_FALLBACK
+        cleaned = wrangle(delta, occupation_fill = fill)
+
+        os.makedirs(self.directory, exist_ok = True)
+        part = 'part-{:05d}.pkl'.format(len(self.manifest['parts']))
+        cleaned.to_pickle(self._path(part))
+        self.aggregates.update(delta, cleaned)
+        self.keys = np.union1d(self.keys, hashes[fresh])
+
+        self.manifest['parts'].append(part)
+        self.manifest['occupation_fill'] = fill
+        self.manifest['occupation_counts'] = {str(k): int(v) for k, v in counts.items()}
+        self.manifest['version'] += 1
+        self._save()
+        return len(delta)
+
+    def _save(self):
+        pd.to_pickle(self.aggregates, self._path('aggregates.pkl'))
+        np.save(self._path('keys.npy'), self.keys)
+        with open(self._path('manifest.json'), 'w') as f:
+            json.dump(self.manifest, f, indent = 1)
+
+    def load(self):
+        """The cleaned ``df_copy`` over all parts."""
+        return concat_frames([pd.read_pickle(self._path(p)) for p in self.manifest['parts']])
@@ -0,0 +1,180 @@
+"""Concurrent ingestion of many monthly Prosper export files.
+
+:func:`read_many` discovers the monthly CSV drops by glob and reads them
+concurrently: an asyncio loop schedules the file reads on a bounded I/O
+thread pool and hands the bytes to a parser pool (threads, or processes that
+read and parse the file themselves), with at most ``max_inflight`` files
+being read or parsed at once. The low-cardinality text columns are parsed as categoricals,
+their dictionaries are unified across files by remapping the codes, and the
+columns are written into preallocated arrays file by file, releasing each
+parsed file as soon as it has been copied, so the concatenation never holds
+two full copies of the data::
+
+    df = read_many('drops/prosperLoanData_*.csv', max_workers = 8)
+"""
+import asyncio
+import glob
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .dedup import dedup_frame
+from .schema import CATEGORICAL_COLUMNS
+
+
+def discover(pattern):
+    """Files matching ``pattern`` (or the given list of paths), in sorted order."""
+    if isinstance(pattern, (list, tuple)):
+        return list(pattern)
+    return sorted(glob.glob(pattern))
+
+
+def _read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _parse(source, read_csv_kwargs):
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    return pd.read_csv(source, **read_csv_kwargs)
+
+
+async def _read_all(paths, max_workers, max_inflight, processes, read_csv_kwargs):
+    loop = asyncio.get_running_loop()
+    inflight = asyncio.Semaphore(max_inflight)
+    parse_pool = (ProcessPoolExecutor if processes else ThreadPoolExecutor)(max_workers)
+    io_pool = ThreadPoolExecutor(min(max_workers, 8))
+
+    async def read_one(path):
+        async with inflight:
+            if processes:
+                # The worker reads the file itself; no bytes cross the process boundary
+                return await loop.run_in_executor(parse_pool, _parse, path, read_csv_kwargs)
+            data = await loop.run_in_executor(io_pool, _read_bytes, path)
+            return await loop.run_in_executor(parse_pool, _parse, data, read_csv_kwargs)
+
+    try:
+        return await asyncio.gather(*(read_one(p) for p in paths))
+    finally:
+        io_pool.shutdown()
+        parse_pool.shutdown()
+
+
+def _run(coroutine):
+    # asyncio.run, also from inside a running loop (a Jupyter kernel has one)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(1) as runner:
+        return runner.submit(asyncio.run, coroutine).result()
+
+
+def _union_categories(dtypes):
+    categories = dtypes[0].categories
+    for d in dtypes[1:]:
+        categories = categories.append(d.categories[~d.categories.isin(categories)])
+    return categories.sort_values() if not dtypes[0].ordered else categories
+
+
+def check_columns(frames, names = None):
+    """Raise a ValueError naming the frame (``names``, e.g. the files) whose columns differ from the first's."""
+    names = names or ['frame {}'.format(i) for i in range(len(frames))]
+    expected = list(frames[0].columns)
+    for frame, name in zip(frames[1:], names[1:]):
+        missing = [c for c in expected if c not in frame.columns]
+        extra = [c for c in frame.columns if c not in expected]
+        if missing or extra:
+            raise ValueError('{} does not have the columns of {}: missing {}, extra {}'.format(
+                name, names[0], ', '.join(map(str, missing)) or 'none', ', '.join(map(str, extra)) or 'none'))
+
+
+def concat_into(frames, names = None):
+    """Concatenate ``frames`` column by column into preallocated arrays, emptying the list as it goes.
+
+    Categorical columns get the union of the files' categories; numeric and
+    datetime columns the common NumPy dtype of the files. All frames need the
+    same columns (in any order); ``names`` labels them in the error otherwise.
+    """
+    check_columns(frames, names)
+    lengths = [len(f) for f in frames]
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    total = int(offsets[-1])
+    columns = list(frames[0].columns)
+
+    # Output buffers, decided from the per-file dtypes
+    out, plan = {}, {}
+    for c in columns:
+        dtypes = [f[c].dtype for f in frames]
+        if all(isinstance(d, pd.CategoricalDtype) for d in dtypes):
+            categories = _union_categories(dtypes)
+            plan[c] = ('categorical', pd.CategoricalDtype(categories, ordered = dtypes[0].ordered))
+            out[c] = np.empty(total, dtype = np.min_scalar_type(-max(len(categories), 1)))
+        elif all(isinstance(d, np.dtype) for d in dtypes):
+            dtype = np.result_type(*dtypes)
+            plan[c] = ('numpy', dtype)
+            out[c] = np.empty(total, dtype = dtype)
+        else:
+            plan[c] = ('extension', None)
+            out[c] = []
+
+    for i in range(len(frames)):
+        frame, lo, hi = frames[i], offsets[i], offsets[i + 1]
+        for c in columns:
+            kind, dtype = plan[c]
+            if kind == 'categorical':
+                values = frame[c].array
+                # Old code -> union code, with -1 (missing) kept as -1
+                mapping = np.append(dtype.categories.get_indexer(values.categories), -1)
+                out[c][lo:hi] = mapping[values.codes]
+            elif kind == 'numpy':
+                out[c][lo:hi] = frame[c].to_numpy()
+            else:
+                out[c].append(frame[c].array)
+        # Release the parsed file once it has been copied
+        frames[i] = None
+
+    data = {}
+    for c in columns:
+        kind, dtype = plan[c]
+        if kind == 'categorical':
+            data[c] = pd.Categorical.from_codes(out[c], dtype = dtype)
+        elif kind == 'numpy':
+            data[c] = out[c]
+        else:
+            data[c] = pd.concat([pd.Series(a) for a in out[c]], ignore_index = True).array
+        out[c] = None
+    return pd.DataFrame(data, copy = False)
+
+
+def read_many(pattern, max_workers = None, max_inflight = None, processes = False, dedup = 'first',
+              **read_csv_kwargs):
+    """Read all files matching ``pattern`` concurrently into one DataFrame.
+
+    Rows repeating a ``ListingKey`` (across or within files) are dropped
+    according to ``dedup``, as in :func:`~prosper.wrangle.load_loans`.
+    """
+    paths = discover(pattern)
+    if not paths:
+        raise FileNotFoundError('no files match {!r}'.format(pattern))
+    max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+    max_inflight = max_inflight or 2 * max_workers
+    dtype = dict(read_csv_kwargs.pop('dtype', None) or {})
+    for c in CATEGORICAL_COLUMNS:
+        dtype.setdefault(c, 'category')
+    usecols = read_csv_kwargs.get('usecols')
+    if usecols is not None:
+        dtype = {c: d for c, d in dtype.items() if c in usecols}
+    read_csv_kwargs['dtype'] = dtype
+
+    frames = _run(_read_all(paths, max_workers, max_inflight, processes, read_csv_kwargs))
+    df = concat_into(frames, paths)
+    if dedup is not None:
+        df, report = dedup_frame(df, keep = dedup)
+        df.attrs['dedup'] = report
+    df.attrs['files'] = paths
+    return df
@@ -0,0 +1,267 @@
+"""Lazy frames: column projection and predicate pushdown into the readers.
+
+The slide deck loads all 81 columns of every row and then keeps five columns
+of the rows with a BorrowerAPR and an income up to 30k. A :class:`LazyFrame`
+accepts the same pandas code but only records it: selecting columns narrows
+the projection and boolean indexing adds a predicate. :meth:`LazyFrame.collect`
+hands both to the source, which reads only the needed columns
+(``usecols`` for CSV, the needed memory maps for a
+:class:`~prosper.colstore.ColumnStore`) and drops rejected rows chunk by chunk
+before they are concatenated::
+
+    df_copy = scan_csv('prosperLoanData.csv')
+    df_copy = df_copy[FOCUS_COLUMNS]
+    df_copy = df_copy[~df_copy.BorrowerAPR.isna()]
+    df_copy = df_copy[df_copy.StatedMonthlyIncome <= 30000]
+    df_copy = df_copy.collect()
+
+Predicates are built from column references with comparisons, ``isna``,
+``notna``, ``isin`` and ``between``, combined with ``&``, ``|`` and ``~``.
+Over a column store they first consult its zone maps, so only the blocks
+that may hold matching rows are read.
+"""
+import operator
+
+import numpy as np
+import pandas as pd
+
+from .colstore import ColumnStore
+from .compressed import read_csv
+from .dedup import KEY_COLUMN, DedupReport, dedup_chunks
+
+CHUNKSIZE = 100000
+
+
+class Predicate:
+    """Row filter over named columns; ``evaluate`` maps a column getter to a boolean array.
+
+    ``blocks`` maps a :class:`~prosper.colstore.ColumnStore` to the blocks
+    that may hold matching rows (None when every block may).
+    """
+
+    def __init__(self, columns, function, text, blocks = None):
+        self.columns = tuple(dict.fromkeys(columns))
+        self.function = function
+        self.text = text
+        self.blocks = blocks
+
+    def evaluate(self, get):
+        return np.asarray(self.function(get), dtype = bool)
+
+    def block_mask(self, store):
+        """Blocks of ``store`` that may hold matching rows, or None if the zone maps cannot tell."""
+        return None if self.blocks is None else self.blocks(store)
+
+    def __and__(self, other):
+        def blocks(store):
+            left, right = self.block_mask(store), other.block_mask(store)
+            return left if right is None else right if left is None else left & right
+
+        return Predicate(self.columns + other.columns, lambda get: self.evaluate(get) & other.evaluate(get),
+                         '({} & {})'.format(self.text, other.text), blocks)
+
+    def __or__(self, other):
+        def blocks(store):
+            left, right = self.block_mask(store), other.block_mask(store)
+            return None if left is None or right is None else left | right
+
+        return Predicate(self.columns + other.columns, lambda get: self.evaluate(get) | other.evaluate(get),
+                         '({} | {})'.format(self.text, other.text), blocks)
+
+    def __invert__(self):
+        return Predicate(self.columns, lambda get: ~self.evaluate(get), '~{}'.format(self.text))
+
+    def __bool__(self):
+        raise TypeError('the truth value of a lazy predicate is unknown until collect(); use &, | and ~')
+
+    def __repr__(self):
+        return 'Predicate({})'.format(self.text)
+
+
+class Column:
+    """Reference to a column of a :class:`LazyFrame`, for building predicates."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def _predicate(self, function, text, zone = None):
+        # zone: (operation, arguments) for ColumnStore.block_mask
+        name = self.name
+        blocks = None if zone is None else lambda store: store.block_mask(name, zone[0], *zone[1])
+        return Predicate([name], lambda get: function(get(name)), text.format('[{!r}]'.format(name)), blocks)
+
+    def _compare(op, symbol):
+        def compare(self, other):
+            return self._predicate(lambda s: op(s, other), '{} ' + symbol + ' ' + repr(other), (symbol, [other]))
+        return compare
+
+    __eq__ = _compare(operator.eq, '==')
+    __ne__ = _compare(operator.ne, '!=')
+    __lt__ = _compare(operator.lt, '<')
+    __le__ = _compare(operator.le, '<=')
+    __gt__ = _compare(operator.gt, '>')
+    __ge__ = _compare(operator.ge, '>=')
+    del _compare
+
+    __hash__ = object.__hash__
+
+    def isna(self):
+        return self._predicate(lambda s: s.isna(), '{}.isna()', ('isna', []))
+
+    def notna(self):
+        return self._predicate(lambda s: s.notna(), '{}.notna()', ('notna', []))
+
+    isnull, notnull = isna, notna
+
+    def isin(self, values):
+        values = list(values)
+        return self._predicate(lambda s: s.isin(values), '{}.isin(' + repr(values) + ')', ('isin', [values]))
+
+    def between(self, left, right):
+        return self._predicate(lambda s: s.between(left, right), '{}.between(' + '{!r}, {!r})'.format(left, right),
+                               ('between', [left, right]))
+
+    def __repr__(self):
+        return 'Column({!r})'.format(self.name)
+
+
+class LazyFrame:
+    """Columns and row predicates to read from a source, recorded until :meth:`collect`."""
+
+    def __init__(self, source, columns = None, predicate = None):
+        self.source = source
+        self.columns = list(source.columns if columns is None else columns)
+        self.predicate = predicate
+
+    def _check(self, columns):
+        missing = [c for c in columns if c not in self.columns]
+        if missing:
+            raise KeyError('columns not in the lazy frame: {}'.format(', '.join(map(str, missing))))
+
+    def __getitem__(self, key):
+        if isinstance(key, Predicate):
+            return self.filter(key)
+        if isinstance(key, str):
+            self._check([key])
+            return Column(key)
+        return self.select(key)
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name not in self.__dict__.get('columns', ()):
+            raise AttributeError(name)
+        return Column(name)
+
+    def select(self, columns):
+        """Lazy frame with only ``columns`` (in that order)."""
+        columns = list(columns)
+        self._check(columns)
+        return LazyFrame(self.source, columns, self.predicate)
+
+    def filter(self, predicate):
+        """Lazy frame with only the rows where ``predicate`` holds."""
+        self._check(predicate.columns)
+        if self.predicate is not None:
+            predicate = self.predicate & predicate
+        return LazyFrame(self.source, self.columns, predicate)
+
+    def needed(self):
+        """Columns the source has to read: the projection, then the predicate-only columns."""
+        extra = [] if self.predicate is None else [c for c in self.predicate.columns if c not in self.columns]
+        return self.columns + extra
+
+    def explain(self):
+        return '{}\n  columns: {}\n  filter: {}'.format(
+            self.source, ', '.join(self.needed()), 'none' if self.predicate is None else self.predicate.text)
+
+    def collect(self):
+        """Read the projected columns of the matching rows into a DataFrame."""
+        df = self.source.read(self.needed(), self.predicate)
+        if list(df.columns) != self.columns:
+            df = df[self.columns]
+        return df
+
+    def __repr__(self):
+        return 'LazyFrame({} columns, filter: {})'.format(
+            len(self.columns), 'none' if self.predicate is None else self.predicate.text)
+
+
+class CSVSource:
+    """A CSV export read in chunks with ``usecols``, deduplicated like :func:`~prosper.wrangle.load_loans`."""
+
+    def __init__(self, path, chunksize = CHUNKSIZE, dedup = 'first', **read_csv_kwargs):
+        self.path = path
+        self.chunksize = chunksize
+        self.dedup = dedup
+        self.read_csv_kwargs = read_csv_kwargs
+        self.columns = read_csv(path, nrows = 0, **read_csv_kwargs).columns.tolist()
+
+    def read(self, columns, predicate):
+        usecols = list(columns)
+        if self.dedup is not None and KEY_COLUMN not in usecols:
+            usecols.append(KEY_COLUMN)
+        # Which row of a repeated key wins depends on every column
+        if self.dedup == 'complete':
+            usecols = None
+
+        def open_chunks():
+            return read_csv(self.path, usecols = usecols, chunksize = self.chunksize, **self.read_csv_kwargs)
+
+        report = None
+        if self.dedup is None:
+            chunks = open_chunks()
+        else:
+            report = DedupReport(self.dedup)
+            chunks = dedup_chunks(open_chunks, keep = self.dedup, report = report)
+        kept = []
+        for chunk in chunks:
+            if predicate is not None:
+                chunk = chunk[predicate.evaluate(chunk.__getitem__)]
+            kept.append(chunk[columns])
+        if kept:
+            df = pd.concat(kept)
+        else:
+            df = read_csv(self.path, usecols = columns, nrows = 0, **self.read_csv_kwargs)[columns]
+        if report is not None:
+            df.attrs['dedup'] = report
+        return df
+
+    def __repr__(self):
+        return 'CSVSource({!r}, chunksize={})'.format(self.path, self.chunksize)
+
+
+class StoreSource:
+    """A :class:`~prosper.colstore.ColumnStore`; predicates read only their own memory maps.
+
+    The zone maps rule out blocks first; ``blocks_read`` holds the blocks
+    the last :meth:`read` looked at, out of ``store.blocks``.
+    """
+
+    def __init__(self, store):
+        self.store = store if isinstance(store, ColumnStore) else ColumnStore(store)
+        self.columns = self.store.columns
+        self.blocks_read = None
+
+    def read(self, columns, predicate):
+        rows = None
+        self.blocks_read = self.store.blocks
+        if predicate is not None:
+            mask = predicate.block_mask(self.store)
+            candidates = None if mask is None else self.store.block_positions(mask)
+            if mask is not None:
+                self.blocks_read = int(mask.sum())
+            matches = predicate.evaluate(lambda name: pd.Series(self.store.values(name, candidates), copy = False))
+            rows = np.flatnonzero(matches) if candidates is None else candidates[matches]
+        return self.store.frame(columns, rows)
+
+    def __repr__(self):
+        return 'StoreSource({!r})'.format(self.store.directory)
+
+
+def scan_csv(path = 'prosperLoanData.csv', chunksize = CHUNKSIZE, dedup = 'first', **read_csv_kwargs):
+    """Lazy frame over a CSV export (plain or compressed)."""
+    return LazyFrame(CSVSource(path, chunksize, dedup, **read_csv_kwargs))
+
+
+def scan_store(store):
+    """Lazy frame over a column store (a :class:`~prosper.colstore.ColumnStore` or its directory)."""
+    return LazyFrame(StoreSource(store))
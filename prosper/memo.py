@@ -0,0 +1,124 @@
+"""Memoized per-column statistics of a working frame.
+
+The exploration recomputes the same aggregates over and over:
+``Occupation.value_counts()`` four times, ``EmploymentStatus.value_counts()``
+for the ``order=`` of every countplot, ``describe()`` and ``isna().sum()``
+before and after each filter. Importing this module adds a ``stats`` accessor
+to every DataFrame that caches value counts, null counts, min/max, quantiles
+and ``describe`` per column, so repeated calls are dictionary lookups::
+
+    import prosper.memo
+
+    order = df.stats.value_counts('EmploymentStatus').index
+    df.stats.isna_sum()
+    df.stats.describe()
+
+The memo lives on the frame object (in its ``__dict__``, which pandas does
+not copy to derived frames), so a filtered frame starts empty. Each entry is
+stamped with the address of the column's data buffer and the row index, and
+keeps a reference to the column: with copy-on-write (always on from pandas 3)
+that reference makes any in-place write to the column copy it first, so
+assigning, converting or editing a column, or changing the rows in place,
+gives a new stamp and the stale entries are recomputed on the next call. On
+older pandas without copy-on-write, call ``df.stats.clear()`` after editing
+values in place.
+"""
+import numpy as np
+import pandas as pd
+
+
+def _buffer(series):
+    # Address, shape and strides of the array holding the column's values
+    values = series.array
+    if isinstance(values, pd.Categorical):
+        array, extra = values.codes, id(values.categories)
+    else:
+        array, extra = getattr(values, '_ndarray', None), None
+    if not isinstance(array, np.ndarray):
+        return id(values), len(values), extra
+    return array.__array_interface__['data'][0], array.shape, array.strides, extra
+
+
+class StatsMemo:
+    """Per-column statistics of a DataFrame, cached until the column or the rows change."""
+
+    def __init__(self, df):
+        self._df = df
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _stamp(self, series):
+        index = self._df.index
+        return (_buffer(series), str(series.dtype), id(index), len(index))
+
+    def _get(self, column, key, compute):
+        series = self._df[column]
+        stamp = self._stamp(series)
+        entry = self._entries.get(column)
+        if entry is None or entry[0] != stamp:
+            # Keep a reference to the column so that in-place writes copy it (and change the stamp)
+            entry = self._entries[column] = (stamp, series, {})
+        cache = entry[2]
+        if key in cache:
+            self.hits += 1
+        else:
+            self.misses += 1
+            cache[key] = compute(series)
+        return cache[key]
+
+    def value_counts(self, column, normalize = False, dropna = True):
+        """``df[column].value_counts(normalize, dropna = dropna)``."""
+        return self._get(column, ('value_counts', normalize, dropna),
+                         lambda s: s.value_counts(normalize = normalize, dropna = dropna)).copy()
+
+    def null_count(self, column):
+        """Number of missing values in ``column``."""
+        return self._get(column, ('null_count',), lambda s: int(s.isna().sum()))
+
+    def isna_sum(self):
+        """``df.isna().sum()``."""
+        return pd.Series([self.null_count(c) for c in self._df.columns], index = self._df.columns, dtype = np.int64)
+
+    def min(self, column):
+        return self._get(column, ('min',), lambda s: s.min())
+
+    def max(self, column):
+        return self._get(column, ('max',), lambda s: s.max())
+
+    def quantile(self, column, q = 0.5, interpolation = 'linear'):
+        """``df[column].quantile(q, interpolation)``; ``q`` a number or a list."""
+        key = ('quantile', tuple(q) if np.ndim(q) else q, interpolation)
+        result = self._get(column, key, lambda s: s.quantile(q, interpolation = interpolation))
+        return result.copy() if isinstance(result, pd.Series) else result
+
+    def describe(self, columns = None):
+        """``df.describe()`` (numeric columns), or ``df[columns].describe()``, built from per-column entries."""
+        if columns is None:
+            columns = self._df.select_dtypes(include = 'number').columns
+            if not len(columns):
+                columns = self._df.columns
+        parts = [self._get(c, ('describe',), lambda s: s.describe()) for c in columns]
+        return pd.concat(parts, axis = 1, keys = list(columns))
+
+    def clear(self, column = None):
+        """Forget the entries of ``column``, or all of them."""
+        if column is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(column, None)
+
+    def __repr__(self):
+        return 'StatsMemo({} columns cached, hits={}, misses={})'.format(len(self._entries), self.hits, self.misses)
+
+
+def _memo(df):
+    # One memo per frame object; pandas 3 builds a new accessor on every attribute access
+    memo = df.__dict__.get('_stats_memo')
+    if memo is None:
+        memo = StatsMemo(df)
+        object.__setattr__(df, '_stats_memo', memo)
+    return memo
+
+
+pd.api.extensions.register_dataframe_accessor('stats')(_memo)
@@ -0,0 +1,252 @@
+"""Configurable outlier filtering over many columns at once.
+
+The slide deck drops ``StatedMonthlyIncome > 30000`` and the exploration
+clips histograms by hand. An :class:`OutlierFilter` maps columns to rules,
+works out each rule's ``[lo, hi]`` thresholds from the data, then checks all
+rules in one vectorized comparison of the stacked columns against the
+threshold vectors, reporting how many rows each rule removed::
+
+    outliers = OutlierFilter({'StatedMonthlyIncome': [Bounds(hi = 30000), MADScore(5)],
+                              'LoanOriginalAmount': IQRFence(3)})
+    df_copy = outliers.fit(df_copy).apply(df_copy)
+    outliers.report
+
+Thresholds can also be fitted chunk by chunk with :meth:`OutlierFilter.fit_chunks`,
+which estimates quantiles with :class:`~prosper.sketches.KLLSketch`es. Missing
+values pass every rule except a :class:`Bounds` with ``keep_missing = False``,
+such as the slide deck's income cut (``StatedMonthlyIncome <= 30000`` drops
+missing incomes too).
+"""
+import numpy as np
+import pandas as pd
+
+from .sketches import KLLSketch
+
+# Scale factor turning a median absolute deviation into a normal standard deviation
+MAD_SCALE = 1.4826
+
+
+class ExactSummary:
+    """Quantiles and moments of an in-memory column."""
+
+    def __init__(self, values):
+        x = np.asarray(values, dtype = np.float64)
+        self.sorted = np.sort(x[~np.isnan(x)])
+        self.n = len(self.sorted)
+        self.mean = self.sorted.mean() if self.n else np.nan
+        self.std = self.sorted.std(ddof = 1) if self.n > 1 else np.nan
+
+    def quantile(self, q):
+        return np.quantile(self.sorted, q) if self.n else np.nan
+
+    def rank(self, x):
+        return np.searchsorted(self.sorted, x, side = 'right') / self.n
+
+    def mad(self):
+        median = self.quantile(0.5)
+        return float(np.median(np.abs(self.sorted - median)))
+
+
+class StreamingSummary:
+    """Quantile sketch and running moments of a column seen chunk by chunk."""
+
+    def __init__(self, k = 200):
+        self.sketch = KLLSketch(k)
+        self.n = 0
+        self.mean = np.nan
+        self._m2 = 0.0
+
+    @property
+    def std(self):
+        return np.sqrt(self._m2 / (self.n - 1)) if self.n > 1 else np.nan
+
+    def update(self, values):
+        x = np.asarray(values, dtype = np.float64)
+        x = x[~np.isnan(x)]
+        if not len(x):
+            return self
+        self.sketch.update(x)
+        n, mean = len(x), x.mean()
+        m2 = ((x - mean) ** 2).sum()
+        if self.n == 0:
+            self.n, self.mean, self._m2 = n, mean, m2
+        else:
+            total = self.n + n
+            delta = mean - self.mean
+            self._m2 += m2 + delta * delta * self.n * n / total
+            self.mean += delta * n / total
+            self.n = total
+        return self
+
+    def quantile(self, q):
+        return self.sketch.quantile(q)
+
+    def rank(self, x):
+        return self.sketch.rank(x)
+
+    def mad(self):
+        # Smallest d with rank(median + d) - rank(median - d) >= 1/2, by bisection on the sketch
+        median = self.quantile(0.5)
+        lo, hi = 0.0, max(self.sketch.max - median, median - self.sketch.min)
+        for _ in range(60):
+            d = (lo + hi) / 2
+            if self.rank(median + d) - self.rank(median - d) >= 0.5:
+                hi = d
+            else:
+                lo = d
+        return hi
+
+
+class Rule:
+    """Keeps values within ``thresholds(summary)``, bounds included."""
+
+    keep_missing = True
+
+    def thresholds(self, summary):
+        raise NotImplementedError
+
+    def __repr__(self):
+        args = ', '.join('{}={!r}'.format(k, v) for k, v in vars(self).items())
+        return '{}({})'.format(type(self).__name__, args)
+
+
+class Bounds(Rule):
+    """Fixed bounds, e.g. ``Bounds(hi = 30000, keep_missing = False)`` for the slide deck income cut."""
+
+    def __init__(self, lo = None, hi = None, keep_missing = True):
+        self.lo = lo
+        self.hi = hi
+        self.keep_missing = keep_missing
+
+    def thresholds(self, summary):
+        return (-np.inf if self.lo is None else self.lo), (np.inf if self.hi is None else self.hi)
+
+
+class IQRFence(Rule):
+    """Tukey fences: ``k`` interquartile ranges beyond the quartiles."""
+
+    def __init__(self, k = 1.5):
+        self.k = k
+
+    def thresholds(self, summary):
+        q1, q3 = summary.quantile([0.25, 0.75])
+        return q1 - self.k * (q3 - q1), q3 + self.k * (q3 - q1)
+
+
+class MADScore(Rule):
+    """Robust z-score: ``threshold`` scaled median absolute deviations from the median."""
+
+    def __init__(self, threshold = 3.5):
+        self.threshold = threshold
+
+    def thresholds(self, summary):
+        median = summary.quantile(0.5)
+        spread = self.threshold * MAD_SCALE * summary.mad()
+        return median - spread, median + spread
+
+
+class ZScore(Rule):
+    """``threshold`` standard deviations from the mean."""
+
+    def __init__(self, threshold = 3.0):
+        self.threshold = threshold
+
+    def thresholds(self, summary):
+        return summary.mean - self.threshold * summary.std, summary.mean + self.threshold * summary.std
+
+
+class QuantileTrim(Rule):
+    """Keep the values between the ``lower`` and ``upper`` quantiles."""
+
+    def __init__(self, lower = 0.01, upper = 0.99):
+        self.lower = lower
+        self.upper = upper
+
+    def thresholds(self, summary):
+        lo, hi = summary.quantile([self.lower, self.upper])
+        return lo, hi
+
+
+class OutlierFilter:
+    """Per-column outlier rules applied in one pass."""
+
+    def __init__(self, rules):
+        # Flatten {column: rule or [rules]} into parallel lists
+        self.columns, self.rules = [], []
+        for column, rule in rules.items():
+            for r in (rule if isinstance(rule, (list, tuple)) else [rule]):
+                self.columns.append(column)
+                self.rules.append(r)
+        self.lo = self.hi = None
+        self.report = None
+
+    def _summarized(self):
+        # Fixed bounds need no statistics of their column
+        return {c for c, r in zip(self.columns, self.rules) if not isinstance(r, Bounds)}
+
+    def _fit(self, summaries):
+        bounds = [r.thresholds(summaries.get(c)) for c, r in zip(self.columns, self.rules)]
+        self.lo = np.array([b[0] for b in bounds], dtype = np.float64)
+        self.hi = np.array([b[1] for b in bounds], dtype = np.float64)
+        return self
+
+    def fit(self, df):
+        """Compute the thresholds from an in-memory frame."""
+        summaries = {c: ExactSummary(df[c]) for c in self._summarized()}
+        return self._fit(summaries)
+
+    def fit_chunks(self, chunks, k = 200):
+        """Compute the thresholds from an iterable of frames with streaming quantile estimates."""
+        summaries = {c: StreamingSummary(k) for c in self._summarized()}
+        for chunk in chunks:
+            for c, summary in summaries.items():
+                summary.update(chunk[c])
+        return self._fit(summaries)
+
+    def mask(self, df):
+        """Boolean mask of the rows passing every rule; also sets :attr:`report`."""
+        if self.lo is None:
+            raise RuntimeError('call fit() or fit_chunks() before filtering')
+        x = np.column_stack([df[c].to_numpy(dtype = np.float64) for c in self.columns]) if self.columns \
+            else np.empty((len(df), 0))
+        # NaN comparisons are False, so missing values pass unless the rule drops them
+        failed = (x < self.lo) | (x > self.hi)
+        drop_missing = np.array([not r.keep_missing for r in self.rules], dtype = bool)
+        if drop_missing.any():
+            failed |= np.isnan(x) & drop_missing
+        fails = failed.sum(axis = 1)
+        keep = fails == 0
+        self.report = pd.DataFrame({
+            'column': self.columns,
+            'rule': [repr(r) for r in self.rules],
+            'lo': self.lo,
+            'hi': self.hi,
+            'removed': failed.sum(axis = 0),
+            'removed_only_by_rule': (failed & (fails == 1)[:, None]).sum(axis = 0),
+        })
+        self.report.attrs['rows_in'] = len(df)
+        self.report.attrs['rows_out'] = int(keep.sum())
+        return keep
+
+    def apply(self, df):
+        """Rows of ``df`` passing every rule."""
+        return df[self.mask(df)]
+
+    def apply_chunks(self, chunks):
+        """Filter an iterable of frames, accumulating the report over the chunks."""
+        total = None
+        for chunk in chunks:
+            kept = self.apply(chunk)
+            if total is None:
+                total = self.report.copy()
+            else:
+                for c in ('removed', 'removed_only_by_rule'):
+                    total[c] += self.report[c]
+                for a in ('rows_in', 'rows_out'):
+                    total.attrs[a] += self.report.attrs[a]
+            yield kept
+        self.report = total
+
+
+# The slide deck's cut on StatedMonthlyIncome; like ``<= 30000`` it drops missing incomes
+SLIDE_DECK_RULES = {'StatedMonthlyIncome': Bounds(hi = 30000, keep_missing = False)}
@@ -0,0 +1,95 @@
+"""Multi-core wrangling of the exploration data.
+
+Every stage of :func:`~prosper.wrangle.wrangle` is row-local except the
+Occupation fill value (the most frequent Occupation), so the raw frame is
+partitioned by ``LoanOriginationDate`` year, with large years split further
+until there is enough work for every core, and the partitions are wrangled in
+a process pool. The fill value is computed once up front.
+
+The raw frame is not sent to the workers: they are forked with it (where
+the platform can fork; elsewhere it is pickled once per worker) and slice
+their partitions themselves. They send back only the row positions they keep
+and the ``WRANGLED_COLUMNS``; the other columns are taken from the raw frame
+in one pass, and :func:`~prosper.wrangle.concat_frames` gives the partitions
+the same categorical dictionaries::
+
+    df_copy = wrangle_parallel(load_loans(), workers = 32)
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .wrangle import OCCUPATION_FALLBACK, WRANGLED_COLUMNS, concat_frames, wrangle
+
+PARTITION_COLUMN = 'LoanOriginationDate'
+
+
+def occupation_fill(df):
+    """Most frequent Occupation among the rated (post July 2009) loans, as in the notebook.
+
+    ``OCCUPATION_FALLBACK`` if no rated loan has an Occupation.
+    """
+    rated = df['ProsperRating (Alpha)'].notna()
+    counts = df.loc[rated, 'Occupation'].value_counts()
+    return counts.index[0] if len(counts) else OCCUPATION_FALLBACK
+
+
+def partition_by_year(df, partitions, column = PARTITION_COLUMN):
+    """Row positions of ``df`` grouped by year of ``column``, each year split into roughly equal slices."""
+    # The dates are 'YYYY-MM-DD ...' strings in the export; parsing is left to the workers
+    # Rows without a date share one partition (NaN never equals itself, so they are keyed -1 / '')
+    dates = df[column]
+    if dates.dtype.kind == 'M':
+        years = dates.dt.year.to_numpy(dtype = np.float64, na_value = np.nan)
+        years = np.where(np.isnan(years), -1, years).astype(np.int64)
+    else:
+        years = dates.astype(str).str.slice(0, 4).fillna('').to_numpy(dtype = object)
+    target = max(1, int(np.ceil(len(df) / max(1, partitions))))
+    pieces = []
+    order = np.argsort(years, kind = 'stable')
+    bounds = np.flatnonzero(years[order][1:] != years[order][:-1]) + 1
+    for group in np.split(order, bounds):
+        if len(group):
+            pieces.extend(np.array_split(group, int(np.ceil(len(group) / target))))
+    return pieces
+
+
+_raw = {}
+
+
+def _set_raw(df, fill):
+    # Pool initializer: forked workers inherit the raw frame instead of receiving partitions
+    _raw['df'], _raw['fill'] = df, fill
+
+
+def _wrangle_part(positions):
+    part = _raw['df'].iloc[positions].set_axis(positions)
+    cleaned = wrangle(part, occupation_fill = _raw['fill'])
+    return cleaned.index.to_numpy(), cleaned[WRANGLED_COLUMNS], list(cleaned.columns)
+
+
+def wrangle_parallel(df, workers = None, partitions = None):
+    """Same result as ``wrangle(df)``, computed over year partitions in ``workers`` processes."""
+    workers = workers or os.cpu_count() or 1
+    fill = occupation_fill(df)
+    if workers == 1:
+        return wrangle(df, occupation_fill = fill)
+
+    pieces = partition_by_year(df, partitions or 2 * workers)
+    context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+    with ProcessPoolExecutor(workers, mp_context = context, initializer = _set_raw, initargs = (df, fill)) as pool:
+        parts = list(pool.map(_wrangle_part, pieces))
+    if not parts:
+        return wrangle(df, occupation_fill = fill)
+
+    # Back to the original row order: raw columns of the kept rows, wrangled ones from the workers
+    kept = np.concatenate([positions for positions, _, _ in parts])
+    order = np.argsort(kept, kind = 'stable')
+    cleaned = df.iloc[kept[order]]
+    wrangled = concat_frames([part for _, part, _ in parts]).iloc[order].set_axis(cleaned.index)
+    raw = cleaned.drop(columns = [c for c in WRANGLED_COLUMNS if c in cleaned])
+    cleaned = pd.concat([raw, wrangled], axis = 1)
+    return cleaned[parts[0][2]]
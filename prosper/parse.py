@@ -0,0 +1,124 @@
+"""Parallel parsing of one large CSV export by byte ranges.
+
+``pd.read_csv`` parses on a single core. :func:`read_parallel` cuts the file
+into byte ranges that end on record boundaries, parses every range in a
+worker process with the shared dtypes of :mod:`prosper.schema`, and writes
+the parsed ranges into preallocated columns in file order
+(:func:`~prosper.ingest.concat_into`)::
+
+    df = read_parallel('prosperLoanData.csv', workers = 8)
+
+A newline only ends a record outside of a quoted field: ``Occupation`` and
+the other text columns may hold quoted commas and line breaks. A position is
+outside quotes when the number of ``"`` before it is even (an escaped quote
+``""`` adds two), so the quotes are counted block by block up to each nominal
+cut, and the cut is moved forward to the first newline with even parity.
+Workers receive only the path and their offsets and read their range
+themselves.
+"""
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .dedup import dedup_frame
+from .ingest import concat_into
+from .schema import read_dtypes
+
+QUOTE, NEWLINE = ord('"'), ord('\n')
+
+# Ranges smaller than this are not worth a worker
+MIN_RANGE = 4 << 20
+BLOCK = 16 << 20
+
+
+def _first_boundary(data, start, parity):
+    # First record boundary at or after start, given the quote parity before start
+    size, window = len(data), 1 << 16
+    while start < size:
+        chunk = np.asarray(data[start:start + window])
+        quotes = np.cumsum(chunk == QUOTE)
+        newlines = np.flatnonzero(chunk == NEWLINE)
+        outside = newlines[(parity + quotes[newlines]) % 2 == 0]
+        if len(outside):
+            return start + int(outside[0]) + 1
+        parity = (parity + int(quotes[-1])) % 2
+        start += window
+        window *= 2
+    return size
+
+
+def record_boundaries(path, ranges):
+    """Offsets ``[header_end, ..., file_size]`` cutting the records of ``path`` into up to ``ranges`` pieces."""
+    data = np.memmap(path, dtype = np.uint8, mode = 'r') if os.path.getsize(path) else np.empty(0, np.uint8)
+    size = len(data)
+    header_end = _first_boundary(data, 0, 0)
+    step = max((size - header_end) // max(ranges, 1), 1)
+    bounds = [header_end]
+    position, parity = 0, 0
+    for nominal in range(header_end + step, size, step):
+        if nominal <= bounds[-1]:
+            continue
+        # Quote parity of everything before the nominal cut, counted block by block
+        while position < nominal:
+            end = min(position + BLOCK, nominal)
+            parity = (parity + int(np.count_nonzero(data[position:end] == QUOTE))) % 2
+            position = end
+        cut = _first_boundary(data, nominal, parity)
+        if cut < size:
+            bounds.append(cut)
+    bounds.append(size)
+    del data
+    return bounds
+
+
+def _header(path):
+    with open(path, 'rb') as f:
+        return pd.read_csv(f, nrows = 0).columns.tolist()
+
+
+def _parse_range(path, start, end, names, read_csv_kwargs):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return pd.read_csv(io.BytesIO(data), header = None, names = names, **read_csv_kwargs)
+
+
+def read_parallel(path = 'prosperLoanData.csv', workers = None, ranges = None, dedup = 'first',
+                  usecols = None, **read_csv_kwargs):
+    """Parse ``path`` in byte ranges across ``workers`` processes into one DataFrame.
+
+    Columns are typed with :func:`~prosper.schema.read_dtypes` (the
+    low-cardinality text columns as categoricals) and rows repeating a
+    ``ListingKey`` are dropped according to ``dedup``, as in
+    :func:`~prosper.wrangle.load_loans`.
+    """
+    workers = workers or os.cpu_count() or 1
+    if ranges is None:
+        ranges = max(1, min(2 * workers, os.path.getsize(path) // MIN_RANGE))
+    names = _header(path)
+    if usecols is not None:
+        missing = [c for c in usecols if c not in names]
+        if missing:
+            raise KeyError('columns not in {}: {}'.format(path, ', '.join(missing)))
+        read_csv_kwargs['usecols'] = usecols
+    dtype = read_dtypes(usecols if usecols is not None else names)
+    dtype.update(read_csv_kwargs.pop('dtype', None) or {})
+    read_csv_kwargs['dtype'] = dtype
+
+    bounds = record_boundaries(path, ranges)
+    pieces = [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+    if len(pieces) <= 1 or workers == 1:
+        frames = [_parse_range(path, a, b, names, read_csv_kwargs) for a, b in pieces]
+    else:
+        with ProcessPoolExecutor(min(workers, len(pieces))) as pool:
+            frames = list(pool.map(_parse_range, *zip(*[(path, a, b, names, read_csv_kwargs) for a, b in pieces])))
+    if not frames:
+        frames = [pd.read_csv(path, **read_csv_kwargs)]
+    df = concat_into(frames)
+    if dedup is not None:
+        df, report = dedup_frame(df, keep = dedup)
+        df.attrs['dedup'] = report
+    return df
@@ -0,0 +1,65 @@
+"""Slide deck figures.
+
+matplotlib and seaborn are imported the first time a figure is drawn, not
+when this module (or the rest of :mod:`prosper`) is imported, so jobs that
+only need the cleaned data or summary tables never pay for them.
+"""
+import numpy as np
+
+_modules = {}
+
+
+def _pyplot():
+    # matplotlib.pyplot and seaborn, imported on first use
+    if not _modules:
+        import matplotlib.pyplot as plt
+        import seaborn as sb
+        _modules['plt'], _modules['sb'] = plt, sb
+    return _modules['plt'], _modules['sb']
+
+
+def apr_by_term_and_rating(df_copy):
+    """BorrowerAPR vs Term and ProsperRating (Alpha)."""
+    plt, sb = _pyplot()
+    plt.figure(figsize = [14.70, 8.27])
+    ax = sb.pointplot(data = df_copy, x = 'Term', y = 'BorrowerAPR', hue = 'ProsperRating (Alpha)',
+                      palette = 'Blues')
+    plt.legend(loc = 2, title = 'ProsperRating')
+    plt.xlabel('Term (months)')
+    plt.title('BorrowerAPR vs Term and ProsperRating', color = 'black')
+    return ax
+
+
+def apr_by_term_and(df_copy, column, unit = 'USD'):
+    """BorrowerAPR vs Term and ``column`` (LoanOriginalAmount or StatedMonthlyIncome)."""
+    plt, sb = _pyplot()
+    g = sb.FacetGrid(data = df_copy, height = 3, aspect = 1.7, col = 'Term')
+    g.map(plt.scatter, column, 'BorrowerAPR').set_axis_labels('{} ({})'.format(column, unit), 'BorrowerAPR')
+    g.fig.suptitle('BorrowerAPR vs Term and {}'.format(column), color = 'black')
+    g.fig.subplots_adjust(top = 0.7)
+    g.add_legend()
+    return g
+
+
+def rating_violins(df_copy, sample = 7000):
+    """ProsperRating vs. (LoanOriginalAmount, StatedMonthlyIncome and BorrowerAPR) on a sample."""
+    plt, sb = _pyplot()
+    base_color = sb.color_palette()[0]
+
+    # Sample so that plots are clearer and they render faster
+    samples = np.random.choice(df_copy.shape[0], min(sample, df_copy.shape[0]), replace = False)
+    pairplot_sample = df_copy.iloc[samples, :]
+
+    g = sb.PairGrid(data = pairplot_sample,
+                    x_vars = ['LoanOriginalAmount', 'StatedMonthlyIncome', 'BorrowerAPR'],
+                    y_vars = ['ProsperRating (Alpha)'],
+                    height = 3, aspect = 1.7, dropna = True)
+    g.map(sb.violinplot, color = base_color, saturation = 2)
+    g.axes[0, 0].set_xlim(-1000, 20000)
+    g.axes[0, 1].set_xlim(-0.2, 1)
+    g.fig.suptitle('ProsperRating vs. LoanOriginalAmount, StatedMonthlyIncome and BorrowerAPR',
+                   fontsize = 18, color = 'black')
+    g.fig.subplots_adjust(top = 0.7)
+    for ax in g.axes.flat:
+        ax.grid(False)
+    return g
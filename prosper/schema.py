@@ -0,0 +1,70 @@
+"""Column types of the Prosper export.
+
+The 81 columns of ``prosperLoanData.csv`` and the NumPy dtypes pandas infers
+for them on the full file (``df.info()`` in ``exploration_template``: 50
+float64, 11 int64, 3 bool and 17 text columns). Readers that parse the file
+in pieces pass these dtypes to every piece, so that a piece without missing
+values, or one where a column happens to be all empty, is parsed exactly like
+the whole file would be.
+"""
+# Column name and dtype, in file order
+COLUMNS = [('ListingKey', 'object'), ('ListingNumber', 'int64'), ('ListingCreationDate', 'object'),
+           ('CreditGrade', 'object'), ('Term', 'int64'), ('LoanStatus', 'object'), ('ClosedDate', 'object'),
+           ('BorrowerAPR', 'float64'), ('BorrowerRate', 'float64'), ('LenderYield', 'float64'),
+           ('EstimatedEffectiveYield', 'float64'), ('EstimatedLoss', 'float64'),
+           ('EstimatedReturn', 'float64'), ('ProsperRating (numeric)', 'float64'),
+           ('ProsperRating (Alpha)', 'object'), ('ProsperScore', 'float64'),
+           ('ListingCategory (numeric)', 'int64'), ('BorrowerState', 'object'), ('Occupation', 'object'),
+           ('EmploymentStatus', 'object'), ('EmploymentStatusDuration', 'float64'),
+           ('IsBorrowerHomeowner', 'bool'), ('CurrentlyInGroup', 'bool'), ('GroupKey', 'object'),
+           ('DateCreditPulled', 'object'), ('CreditScoreRangeLower', 'float64'),
+           ('CreditScoreRangeUpper', 'float64'), ('FirstRecordedCreditLine', 'object'),
+           ('CurrentCreditLines', 'float64'), ('OpenCreditLines', 'float64'),
+           ('TotalCreditLinespast7years', 'float64'), ('OpenRevolvingAccounts', 'int64'),
+           ('OpenRevolvingMonthlyPayment', 'float64'), ('InquiriesLast6Months', 'float64'),
+           ('TotalInquiries', 'float64'), ('CurrentDelinquencies', 'float64'), ('AmountDelinquent', 'float64'),
+           ('DelinquenciesLast7Years', 'float64'), ('PublicRecordsLast10Years', 'float64'),
+           ('PublicRecordsLast12Months', 'float64'), ('RevolvingCreditBalance', 'float64'),
+           ('BankcardUtilization', 'float64'), ('AvailableBankcardCredit', 'float64'),
+           ('TotalTrades', 'float64'), ('TradesNeverDelinquent (percentage)', 'float64'),
+           ('TradesOpenedLast6Months', 'float64'), ('DebtToIncomeRatio', 'float64'), ('IncomeRange', 'object'),
+           ('IncomeVerifiable', 'bool'), ('StatedMonthlyIncome', 'float64'), ('LoanKey', 'object'),
+           ('TotalProsperLoans', 'float64'), ('TotalProsperPaymentsBilled', 'float64'),
+           ('OnTimeProsperPayments', 'float64'), ('ProsperPaymentsLessThanOneMonthLate', 'float64'),
+           ('ProsperPaymentsOneMonthPlusLate', 'float64'), ('ProsperPrincipalBorrowed', 'float64'),
+           ('ProsperPrincipalOutstanding', 'float64'), ('ScorexChangeAtTimeOfListing', 'float64'),
+           ('LoanCurrentDaysDelinquent', 'int64'), ('LoanFirstDefaultedCycleNumber', 'float64'),
+           ('LoanMonthsSinceOrigination', 'int64'), ('LoanNumber', 'int64'), ('LoanOriginalAmount', 'int64'),
+           ('LoanOriginationDate', 'object'), ('LoanOriginationQuarter', 'object'), ('MemberKey', 'object'),
+           ('MonthlyLoanPayment', 'float64'), ('LP_CustomerPayments', 'float64'),
+           ('LP_CustomerPrincipalPayments', 'float64'), ('LP_InterestandFees', 'float64'),
+           ('LP_ServiceFees', 'float64'), ('LP_CollectionFees', 'float64'),
+           ('LP_GrossPrincipalLoss', 'float64'), ('LP_NetPrincipalLoss', 'float64'),
+           ('LP_NonPrincipalRecoverypayments', 'float64'), ('PercentFunded', 'float64'),
+           ('Recommendations', 'int64'), ('InvestmentFromFriendsCount', 'int64'),
+           ('InvestmentFromFriendsAmount', 'float64'), ('Investors', 'int64')]
+
+DTYPES = dict(COLUMNS)
+
+# Text columns with few distinct values, parsed straight into categoricals
+CATEGORICAL_COLUMNS = ['CreditGrade', 'LoanStatus', 'ProsperRating (Alpha)', 'BorrowerState', 'Occupation',
+                       'EmploymentStatus', 'IncomeRange', 'LoanOriginationQuarter']
+
+
+def read_dtypes(columns = None, categorical = True):
+    """``dtype`` argument of ``pd.read_csv`` for ``columns`` (default: all known columns).
+
+    Columns missing from the schema are left for pandas to infer. Text
+    columns are read as ``str`` (what pandas infers for them), or with
+    ``categorical`` as categoricals if they are :data:`CATEGORICAL_COLUMNS`.
+    """
+    columns = DTYPES if columns is None else [c for c in columns if c in DTYPES]
+    dtype = {}
+    for c in columns:
+        if categorical and c in CATEGORICAL_COLUMNS:
+            dtype[c] = 'category'
+        elif DTYPES[c] == 'object':
+            dtype[c] = str
+        else:
+            dtype[c] = DTYPES[c]
+    return dtype
@@ -0,0 +1,293 @@
+"""Local HTTP aggregation service over the cleaned slide deck data.
+
+The cleaned ``df_copy`` is loaded once into a :class:`ColumnIndex`, a set of
+flat NumPy arrays (category codes for the discrete columns), and every query
+is answered with vectorized masks and ``np.bincount``. Results are kept in an
+LRU cache keyed on the normalized query, so repeated slide questions are
+served without touching the arrays again.
+
+Run it from the folder holding ``prosperLoanData.csv``::
+
+    python -m prosper.server --port 8050
+
+and query it, e.g. APR by rating for 60-month loans only::
+
+    /groupby?by=ProsperRating (Alpha)&value=BorrowerAPR&agg=mean&Term=60
+
+Filters are passed as extra parameters: ``Column=v1,v2`` for discrete
+columns and ``Column=lo:hi`` (either end optional) for numeric ones. A
+discrete filter given twice (``Term=36&Term=60``) matches either value; any
+other repeated parameter is rejected.
+"""
+import argparse
+import json
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+import numpy as np
+
+from .wrangle import clean_focus, load_loans
+
+# Columns served as category codes; everything else in the index is numeric
+DISCRETE_COLUMNS = ['Term', 'ProsperRating (Alpha)']
+NUMERIC_COLUMNS = ['BorrowerAPR', 'LoanOriginalAmount', 'StatedMonthlyIncome']
+AGGREGATIONS = ['count', 'sum', 'mean', 'std']
+ENDPOINTS = ['groupby', 'filter', 'histogram']
+
+# Query parameters that are not filters
+_RESERVED = {'by', 'value', 'agg', 'column', 'bins', 'range', 'limit'}
+
+# Largest histogram the service computes
+MAX_BINS = 10_000
+
+
+class QueryError(ValueError):
+    """Raised for malformed queries; reported to the client as HTTP 400."""
+
+
+class ColumnIndex:
+    """Columnar, read-only copy of the focus columns of ``df_copy``."""
+
+    def __init__(self, df, cache_size = 1024):
+        self.length = len(df)
+        self.numeric = {c: df[c].to_numpy(dtype = np.float64) for c in NUMERIC_COLUMNS}
+        self.codes = {}
+        self.labels = {}
+        for c in DISCRETE_COLUMNS:
+            values = df[c]
+            if values.dtype.name != 'category':
+                values = values.astype('category')
+            self.codes[c] = values.cat.codes.to_numpy()
+            self.labels[c] = [_plain(v) for v in values.cat.categories]
+        for a in list(self.numeric.values()) + list(self.codes.values()):
+            a.setflags(write = False)
+        self._cached = lru_cache(maxsize = cache_size)(self._run)
+
+    def describe(self):
+        return {'rows': self.length,
+                'numeric': NUMERIC_COLUMNS,
+                'discrete': {c: self.labels[c] for c in DISCRETE_COLUMNS},
+                'aggregations': AGGREGATIONS}
+
+    def query(self, endpoint, params):
+        """Answer ``endpoint`` for the ``(name, value)`` query ``params``, using the LRU cache."""
+        return self._cached(endpoint, _normalize(params, self.codes))
+
+    def cache_info(self):
+        return self._cached.cache_info()
+
+    def _run(self, endpoint, params):
+        params = dict(params)
+        mask = self.mask({k: v for k, v in params.items() if k not in _RESERVED})
+        if endpoint == 'groupby':
+            return self.groupby(params.get('by', ''), params.get('value', 'BorrowerAPR'),
+                                params.get('agg', 'mean'), mask)
+        if endpoint == 'filter':
+            return self.filter(mask, int(params.get('limit', 0)))
+        if endpoint == 'histogram':
+            return self.histogram(params.get('column', ''), int(params.get('bins', 50)),
+                                  params.get('range'), mask)
+        raise QueryError('unknown endpoint: {}'.format(endpoint))
+
+    def mask(self, filters):
+        """Boolean row mask for ``{column: 'v1,v2'}`` and ``{column: 'lo:hi'}`` filters."""
+        mask = np.ones(self.length, dtype = bool)
+        for column, spec in filters.items():
+            if column in self.codes:
+                wanted = [self._code(column, v) for v in spec.split(',')]
+                mask &= np.isin(self.codes[column], wanted)
+            elif column in self.numeric:
+                lo, hi = _parse_range(spec)
+                values = self.numeric[column]
+                if lo is not None:
+                    mask &= values >= lo
+                if hi is not None:
+                    mask &= values <= hi
+            else:
+                raise QueryError('unknown column: {}'.format(column))
+        return mask
+
+    def groupby(self, by, value, agg, mask):
+        """``agg`` of ``value`` over the discrete columns ``by`` (comma separated)."""
+        by = [c for c in by.split(',') if c]
+        for c in by:
+            if c not in self.codes:
+                raise QueryError('cannot group by {}'.format(c))
+        if value not in self.numeric:
+            raise QueryError('unknown value column: {}'.format(value))
+        if agg not in AGGREGATIONS:
+            raise QueryError('unknown aggregation: {}'.format(agg))
+
+        values = self.numeric[value]
+        mask = mask & ~np.isnan(values)
+        shape = tuple(len(self.labels[c]) for c in by)
+        if by:
+            codes = [self.codes[c][mask] for c in by]
+            # Rows with a missing category (code -1) are left out of the groups
+            valid = np.logical_and.reduce([c >= 0 for c in codes])
+            flat = np.ravel_multi_index([c[valid] for c in codes], shape)
+        else:
+            valid = slice(None)
+            flat = np.zeros(int(mask.sum()), dtype = np.intp)
+        size = int(np.prod(shape))
+        x = values[mask][valid]
+        count = np.bincount(flat, minlength = size)
+        total = np.bincount(flat, weights = x, minlength = size)
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            if agg == 'count':
+                result = count.astype(np.float64)
+            elif agg == 'sum':
+                result = total
+            elif agg == 'mean':
+                result = total / count
+            else:
+                squares = np.bincount(flat, weights = x * x, minlength = size)
+                result = np.sqrt((squares - total * total / count) / (count - 1))
+
+        groups = []
+        for i in np.flatnonzero(count):
+            key = np.unravel_index(i, shape) if by else ()
+            groups.append({'key': [self.labels[c][k] for c, k in zip(by, key)],
+                           'count': int(count[i]), agg: _plain(result[i])})
+        return {'by': by, 'value': value, 'agg': agg, 'groups': groups}
+
+    def filter(self, mask, limit = 0):
+        """Row count and summary of the matching rows, plus the first ``limit`` rows."""
+        n = int(mask.sum())
+        summary = {}
+        for c, values in self.numeric.items():
+            x = values[mask]
+            x = x[~np.isnan(x)]
+            summary[c] = {'mean': _plain(x.mean()) if len(x) else None,
+                          'min': _plain(x.min()) if len(x) else None,
+                          'max': _plain(x.max()) if len(x) else None}
+        rows = []
+        if limit > 0:
+            index = np.flatnonzero(mask)[:limit]
+            for i in index:
+                row = {c: _plain(v[i]) for c, v in self.numeric.items()}
+                for c, codes in self.codes.items():
+                    row[c] = self.labels[c][codes[i]] if codes[i] >= 0 else None
+                rows.append(row)
+        return {'count': n, 'summary': summary, 'rows': rows}
+
+    def histogram(self, column, bins, value_range, mask):
+        """Histogram of a numeric column over the matching rows."""
+        if column not in self.numeric:
+            raise QueryError('unknown numeric column: {}'.format(column))
+        if not 1 <= bins <= MAX_BINS:
+            raise QueryError('bins must be between 1 and {}'.format(MAX_BINS))
+        x = self.numeric[column][mask]
+        x = x[~np.isnan(x)]
+        if value_range:
+            lo, hi = _parse_range(value_range)
+        else:
+            lo = hi = None
+        lo = x.min() if lo is None and len(x) else (0.0 if lo is None else lo)
+        hi = x.max() if hi is None and len(x) else (1.0 if hi is None else hi)
+        counts, edges = np.histogram(x, bins = bins, range = (lo, hi))
+        return {'column': column, 'counts': counts.tolist(), 'edges': edges.tolist()}
+
+    def _code(self, column, value):
+        labels = self.labels[column]
+        for i, label in enumerate(labels):
+            if str(label) == value:
+                return i
+        raise QueryError('{} has no value {}'.format(column, value))
+
+
+def _plain(value):
+    # NumPy scalars -> JSON-friendly Python values
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def _parse_range(spec):
+    lo, sep, hi = spec.partition(':')
+    if not sep:
+        raise QueryError('expected lo:hi, got {}'.format(spec))
+    try:
+        return (float(lo) if lo else None), (float(hi) if hi else None)
+    except ValueError:
+        raise QueryError('expected numbers in {}'.format(spec))
+
+
+def _normalize(params, discrete = ()):
+    # Order-independent, hashable query key for the LRU cache; repeated discrete filters are merged
+    merged = {}
+    for name, value in params:
+        if name not in merged:
+            merged[name] = value
+        elif name in discrete:
+            merged[name] += ',' + value
+        else:
+            raise QueryError('parameter {} given more than once'.format(name))
+    return tuple(sorted(merged.items()))
+
+
+def make_handler(index):
+    """Request handler class bound to ``index``."""
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            endpoint = url.path.strip('/')
+            start = time.perf_counter()
+            try:
+                if endpoint in ('', 'columns'):
+                    body, status = index.describe(), 200
+                elif endpoint in ENDPOINTS:
+                    body, status = index.query(endpoint, parse_qsl(url.query)), 200
+                else:
+                    body, status = {'error': 'not found: /{}'.format(endpoint)}, 404
+            except ValueError as e:
+                body, status = {'error': str(e)}, 400
+            except Exception as e:
+                body, status = {'error': '{}: {}'.format(type(e).__name__, e)}, 500
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.send_header('X-Elapsed-ms', '{:.3f}'.format(1e3 * (time.perf_counter() - start)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(index, host = '127.0.0.1', port = 8050):
+    """Serve ``index`` until interrupted; one thread per request."""
+    server = ThreadingHTTPServer((host, port), make_handler(index))
+    server.daemon_threads = True
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--csv', default = 'prosperLoanData.csv')
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 8050)
+    parser.add_argument('--cache-size', type = int, default = 1024)
+    args = parser.parse_args(argv)
+
+    index = ColumnIndex(clean_focus(load_loans(args.csv)), cache_size = args.cache_size)
+    print('Serving {} loans on http://{}:{}/'.format(index.length, args.host, args.port))
+    serve(index, args.host, args.port)
+
+
+if __name__ == '__main__':
+    main()
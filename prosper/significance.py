@@ -0,0 +1,223 @@
+"""Permutation tests and bootstrap intervals for the correlations in the findings.
+
+The summary reads two conclusions off the plots: DebtToIncomeRatio has no
+meaningful correlation with BorrowerAPR, and a higher StatedMonthlyIncome
+goes with a lower BorrowerAPR. :func:`correlation_test` puts a p-value and a
+confidence interval on such a correlation:
+
+- the p-value comes from a permutation test: the standardized ``x`` is
+  shuffled independently in every row of a ``(batch, n)`` matrix and the
+  correlations of the whole batch are one matrix-vector product with ``y``;
+- the interval is a percentile bootstrap: a batch of resamples is turned
+  into a ``(batch, n)`` matrix of draw counts, and one matrix product with
+  the columns ``x, y, x², y², xy`` gives the moments of every resample.
+
+The batch size is chosen so that a batch needs about ``chunk_bytes`` of
+memory, and the batches are spread over ``workers`` processes, each holding
+one copy of the data. Every batch has its own seed from ``seed``, so for a
+given ``seed`` and ``chunk_bytes`` the results do not depend on ``workers``.
+
+Batching pays off while a batch holds at least ``MIN_BATCH`` resamples: a
+bootstrap resample costs about half as much in a batch of 8 as alone, and
+dispatching thousands of one-resample batches to the pool adds up. With the
+default 64 MB that holds up to about 260,000 rows for the bootstrap and
+520,000 for the permutations (the export has 114,000). Above that, every
+resample would be a full pass over all rows; instead the resamples are
+drawn from a random subsample of that many rows and their spread is scaled
+to the full size: the permutation correlations by ``sqrt((m - 1) / (n - 1))``
+(their exact standard deviations) and the bootstrap deviations from the
+subsample correlation by ``sqrt(m / n)`` around the full-sample one::
+
+    findings(df_copy)                                   # both claims, as a table
+    correlation_test(df_copy['StatedMonthlyIncome'], df_copy['BorrowerAPR'],
+                     method = 'spearman', alternative = 'less')
+
+``method = 'spearman'`` correlates the ranks (ties get their average rank).
+The bootstrap keeps the ranks of the full sample instead of ranking every
+resample again, which differs from re-ranking by far less than the interval
+width at the size of the export.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+METHODS = ('pearson', 'spearman')
+ALTERNATIVES = ('two-sided', 'less', 'greater')
+
+# Memory per (resample, row) cell of a batch: shuffled copy / draws, flat keys and counts
+_CELL_BYTES = {'permutation': 16, 'bootstrap': 32}
+
+# Smallest batch worth running; larger samples are subsampled to keep batches this size
+MIN_BATCH = 8
+
+# Claims of the summary: (x, y, alternative)
+FINDINGS = {'DebtToIncomeRatio vs BorrowerAPR': ('DebtToIncomeRatio', 'BorrowerAPR', 'two-sided'),
+            'StatedMonthlyIncome vs BorrowerAPR': ('StatedMonthlyIncome', 'BorrowerAPR', 'less')}
+
+_data = {}
+
+
+def _standardize(values):
+    values = values - values.mean()
+    scale = np.sqrt((values * values).mean())
+    return values / scale if scale > 0 else values
+
+
+def prepare(x, y, method = 'pearson'):
+    """Standardized ``x`` and ``y`` (ranked for ``'spearman'``) over the rows where both are present."""
+    if method not in METHODS:
+        raise ValueError('unknown method {!r}; use one of {}'.format(method, ', '.join(METHODS)))
+    x = pd.Series(x).to_numpy(dtype = np.float64, na_value = np.nan)
+    y = pd.Series(y).to_numpy(dtype = np.float64, na_value = np.nan)
+    if len(x) != len(y):
+        raise ValueError('x and y have different lengths ({} and {})'.format(len(x), len(y)))
+    keep = np.isfinite(x) & np.isfinite(y)
+    x, y = x[keep], y[keep]
+    if method == 'spearman':
+        x = pd.Series(x).rank().to_numpy()
+        y = pd.Series(y).rank().to_numpy()
+    return _standardize(x), _standardize(y)
+
+
+def batch_size(n, kind, chunk_bytes = 64 << 20):
+    """Resamples per batch so that a batch of ``kind`` over ``n`` rows needs about ``chunk_bytes``."""
+    return max(1, int(chunk_bytes // (max(n, 1) * _CELL_BYTES[kind])))
+
+
+def _set_data(x, y):
+    # Pool initializer: the data is sent once per worker, not once per batch
+    _data['x'], _data['y'] = x, y
+
+
+def _permutations(seed, size):
+    x, y = _data['x'], _data['y']
+    shuffled = np.random.default_rng(seed).permuted(np.broadcast_to(x, (size, len(x))), axis = 1)
+    return shuffled @ y / len(x)
+
+
+def _bootstraps(seed, size):
+    x, y = _data['x'], _data['y']
+    n = len(x)
+    draws = np.random.default_rng(seed).integers(0, n, (size, n))
+    draws += np.arange(size)[:, None] * n
+    counts = np.bincount(draws.ravel(), minlength = size * n).reshape(size, n).astype(np.float64)
+    del draws
+    moments = counts @ np.column_stack([x, y, x * x, y * y, x * y]) / n
+    mx, my, mxx, myy, mxy = moments.T
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        return (mxy - mx * my) / np.sqrt((mxx - mx * mx) * (myy - my * my))
+
+
+def resample(x, y, kind, resamples, seed = 0, workers = None, chunk_bytes = 64 << 20):
+    """Correlations of ``resamples`` permutations or bootstrap resamples of prepared ``x`` and ``y``.
+
+    Samples too large for batches of ``MIN_BATCH`` are resampled through a
+    random subsample, with the spread scaled to the full size (see above).
+    """
+    if kind not in _CELL_BYTES:
+        raise ValueError('unknown resampling {!r}; use one of {}'.format(kind, ', '.join(_CELL_BYTES)))
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    n = len(x)
+    rows = max(3, chunk_bytes // (MIN_BATCH * _CELL_BYTES[kind]))
+    if n > rows:
+        seed, sample_seed = seed.spawn(2)
+        keep = np.sort(np.random.default_rng(sample_seed).choice(n, rows, replace = False))
+        xs, ys = _standardize(x[keep]), _standardize(y[keep])
+        sample = resample(xs, ys, kind, resamples, seed, workers, chunk_bytes)
+        if kind == 'permutation':
+            return sample * np.sqrt((rows - 1) / (n - 1))
+        return float(x @ y / n) + (sample - float(xs @ ys / rows)) * np.sqrt(rows / n)
+
+    batch = batch_size(n, kind, chunk_bytes)
+    sizes = [min(batch, resamples - start) for start in range(0, resamples, batch)]
+    seeds = seed.spawn(len(sizes))
+    function = _permutations if kind == 'permutation' else _bootstraps
+    workers = min(workers or os.cpu_count() or 1, len(sizes))
+    if workers <= 1:
+        _set_data(x, y)
+        try:
+            parts = [function(s, size) for s, size in zip(seeds, sizes)]
+        finally:
+            _data.clear()
+    else:
+        with ProcessPoolExecutor(workers, initializer = _set_data, initargs = (x, y)) as pool:
+            parts = list(pool.map(function, seeds, sizes))
+    return np.concatenate(parts) if parts else np.zeros(0)
+
+
+def permutation_p_value(statistic, null, alternative = 'two-sided'):
+    """P-value of ``statistic`` against a permutation distribution centred on zero, counting the observed one."""
+    if alternative == 'two-sided':
+        extreme = np.abs(null) >= abs(statistic)
+    elif alternative == 'less':
+        extreme = null <= statistic
+    elif alternative == 'greater':
+        extreme = null >= statistic
+    else:
+        raise ValueError('unknown alternative {!r}; use one of {}'.format(alternative, ', '.join(ALTERNATIVES)))
+    return (1 + int(extreme.sum())) / (1 + len(null))
+
+
+class CorrelationTest:
+    """Correlation of two columns with its permutation p-value and bootstrap interval."""
+
+    def __init__(self, statistic, n, method, alternative, p_value, ci, level, permutations, bootstraps):
+        self.statistic = statistic
+        self.n = n
+        self.method = method
+        self.alternative = alternative
+        self.p_value = p_value
+        self.ci = ci
+        self.level = level
+        self.permutations = permutations
+        self.bootstraps = bootstraps
+
+    def negligible(self, threshold = 0.1):
+        """Whether the whole interval lies within ``±threshold`` (0.1 is a small correlation)."""
+        return bool(-threshold < self.ci[0] and self.ci[1] < threshold)
+
+    def to_dict(self):
+        return {'method': self.method, 'n': self.n, 'r': self.statistic, 'alternative': self.alternative,
+                'p_value': self.p_value, 'ci_low': self.ci[0], 'ci_high': self.ci[1], 'level': self.level}
+
+    def __repr__(self):
+        return 'CorrelationTest({} r={:.4f}, n={}, p={:.4g} ({}), {:.0%} CI [{:.4f}, {:.4f}])'.format(
+            self.method, self.statistic, self.n, self.p_value, self.alternative, self.level, *self.ci)
+
+
+def correlation_test(x, y, method = 'pearson', alternative = 'two-sided', permutations = 9999,
+                     bootstraps = 9999, level = 0.95, seed = 0, workers = None, chunk_bytes = 64 << 20):
+    """Permutation test and percentile bootstrap interval for the correlation of ``x`` and ``y``."""
+    if alternative not in ALTERNATIVES:
+        raise ValueError('unknown alternative {!r}; use one of {}'.format(alternative, ', '.join(ALTERNATIVES)))
+    x, y = prepare(x, y, method)
+    if len(x) < 3:
+        raise ValueError('need at least 3 rows with both values, got {}'.format(len(x)))
+    statistic = float(x @ y / len(x))
+    # Separate seed streams for the two resamplings
+    seeds = np.random.SeedSequence(seed).spawn(2)
+    p_value = np.nan
+    if permutations:
+        null = resample(x, y, 'permutation', permutations, seeds[0], workers, chunk_bytes)
+        p_value = permutation_p_value(statistic, null, alternative)
+    ci = (np.nan, np.nan)
+    if bootstraps:
+        boot = resample(x, y, 'bootstrap', bootstraps, seeds[1], workers, chunk_bytes)
+        ci = tuple(float(v) for v in np.nanquantile(boot, [(1 - level) / 2, (1 + level) / 2]))
+    return CorrelationTest(statistic, len(x), method, alternative, p_value, ci, level, permutations, bootstraps)
+
+
+def findings(df, method = 'spearman', threshold = 0.1, **kwargs):
+    """The correlation claims of the summary tested over ``df``, one row per claim.
+
+    ``negligible`` tells whether the interval lies within ``±threshold``.
+    Other keyword arguments go to :func:`correlation_test`.
+    """
+    rows = {}
+    for claim, (x, y, alternative) in FINDINGS.items():
+        test = correlation_test(df[x], df[y], method = method, alternative = alternative, **kwargs)
+        rows[claim] = dict(test.to_dict(), negligible = test.negligible(threshold))
+    return pd.DataFrame.from_dict(rows, orient = 'index')
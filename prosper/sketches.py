@@ -0,0 +1,251 @@
+"""Mergeable summaries for streaming and partitioned data.
+
+Each summary takes bounded memory whatever the number of rows, and summaries
+built over different chunks or partitions are combined with ``merge``:
+
+- :class:`KLLSketch` estimates quantiles of a numeric column. With the
+  default ``k = 200`` the rank error of a quantile is about 1.3% of the
+  number of rows (99% confidence), following Karnin, Lang and Liberty,
+  "Optimal Quantile Approximation in Streams" (2016); minimum and maximum are
+  kept exactly.
+- :class:`HeavyHitters` keeps the most frequent values of a categorical
+  column with mergeable Misra-Gries counters (Agarwal et al., "Mergeable
+  Summaries", 2012); a reported count is at most :attr:`HeavyHitters.error`
+  below the true one, and that error never exceeds ``n / (capacity + 1)``.
+  Every value occurring more often than that is kept.
+- :class:`HyperLogLog` counts distinct values, with a relative standard
+  error of ``1.04 / sqrt(2 ** precision)`` (0.8% at the default precision).
+
+:class:`CategoricalSummary` bundles the last two for columns such as
+``Occupation`` and ``BorrowerState``.
+"""
+import numpy as np
+import pandas as pd
+
+
+class KLLSketch:
+    """KLL quantile sketch; items at level ``h`` stand for ``2**h`` values."""
+
+    def __init__(self, k = 200, seed = None):
+        self.k = k
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, h):
+        depth = len(self.levels) - h - 1
+        return max(2, int(np.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    def update(self, values):
+        """Add a batch of values; NaNs are ignored."""
+        x = np.asarray(values, dtype = np.float64).ravel()
+        x = x[~np.isnan(x)]
+        if not len(x):
+            return self
+        self.n += len(x)
+        self.min = min(self.min, x.min())
+        self.max = max(self.max, x.max())
+        self.levels[0] = np.concatenate([self.levels[0], x])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Fold another sketch into this one."""
+        if other.n == 0:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, level in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], level])
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _compress(self):
+        # Halve every level over capacity, promoting every other sorted item
+        compacted = True
+        while compacted:
+            compacted = False
+            for h in range(len(self.levels)):
+                level = self.levels[h]
+                if len(level) <= self._capacity(h):
+                    continue
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                level = np.sort(level)
+                keep = level[:len(level) % 2]
+                level = level[len(keep):]
+                promoted = level[self._rng.integers(2)::2]
+                self.levels[h] = keep
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+                compacted = True
+
+    def _weighted(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(l), 2.0 ** h) for h, l in enumerate(self.levels)])
+        order = np.argsort(items, kind = 'stable')
+        return items[order], np.cumsum(weights[order])
+
+    def quantile(self, q):
+        """Estimated ``q``-quantile(s), ``0 <= q <= 1``."""
+        q = np.asarray(q, dtype = np.float64)
+        if self.n == 0:
+            return np.full(q.shape, np.nan) if q.ndim else np.nan
+        items, cumulative = self._weighted()
+        index = np.searchsorted(cumulative, q * cumulative[-1], side = 'left')
+        result = items[np.clip(index, 0, len(items) - 1)]
+        result = np.where(q <= 0, self.min, np.where(q >= 1, self.max, result))
+        return result if q.ndim else float(result)
+
+    def rank(self, x):
+        """Estimated fraction of values ``<= x``."""
+        x = np.asarray(x, dtype = np.float64)
+        if self.n == 0:
+            return np.full(x.shape, np.nan) if x.ndim else np.nan
+        items, cumulative = self._weighted()
+        index = np.searchsorted(items, x, side = 'right')
+        below = np.where(index > 0, cumulative[np.maximum(index - 1, 0)], 0.0)
+        result = below / cumulative[-1]
+        return result if x.ndim else float(result)
+
+    @property
+    def nbytes(self):
+        return sum(l.nbytes for l in self.levels)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_rng'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._rng = np.random.default_rng()
+
+
+class HeavyHitters:
+    """Misra-Gries summary: at most ``capacity`` counters, each a lower bound.
+
+    A true count lies between the reported count and the reported count
+    plus :attr:`error`, which is at most ``n / (capacity + 1)``.
+    """
+
+    def __init__(self, capacity = 64):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype = np.int64)
+        self.error = 0
+        self.n = 0
+
+    def update(self, values):
+        """Add a batch of values (a Series); missing values are ignored."""
+        counts = pd.Series(values).value_counts(dropna = True)
+        self.n += int(counts.sum())
+        return self._combine(counts, 0)
+
+    def merge(self, other):
+        self.n += other.n
+        return self._combine(other.counts, other.error)
+
+    def _combine(self, counts, error):
+        combined = self.counts.add(counts, fill_value = 0).astype(np.int64)
+        self.error += error
+        if len(combined) > self.capacity:
+            combined = combined.sort_values(ascending = False, kind = 'stable')
+            # Misra-Gries decrement: every counter loses the (capacity + 1)-th largest count. Each unit
+            # taken removes capacity + 1 counted values, so the total taken stays within n / (capacity + 1)
+            cut = int(combined.iloc[self.capacity])
+            combined = combined.iloc[:self.capacity] - cut
+            combined = combined[combined > 0]
+            self.error += cut
+        self.counts = combined
+        return self
+
+    def top(self, n = None):
+        """Most frequent values and their lower-bound counts (true counts are at most ``error`` higher)."""
+        counts = self.counts.sort_values(ascending = False, kind = 'stable')
+        return counts if n is None else counts.iloc[:n]
+
+
+class HyperLogLog:
+    """Distinct-count estimator over 64-bit value hashes."""
+
+    def __init__(self, precision = 14):
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype = np.uint8)
+
+    def update(self, values):
+        """Add a batch of values (a Series); missing values are ignored."""
+        values = pd.Series(values).dropna()
+        if not len(values):
+            return self
+        h = pd.util.hash_pandas_object(values, index = False).to_numpy()
+        p = np.uint64(self.precision)
+        index = (h >> (np.uint64(64) - p)).astype(np.intp)
+        rest = h & ((np.uint64(1) << (np.uint64(64) - p)) - np.uint64(1))
+        # Bit length of the remaining bits, from exact float conversions of the 32-bit halves
+        high = (rest >> np.uint64(32)).astype(np.float64)
+        low = (rest & np.uint64(0xFFFFFFFF)).astype(np.float64)
+        length = np.where(high > 0, np.frexp(high)[1] + 32, np.frexp(low)[1])
+        rho = (64 - self.precision - length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rho)
+        return self
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError('cannot merge HyperLogLogs of different precision')
+        np.maximum(self.registers, other.registers, out = self.registers)
+        return self
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Small range correction (linear counting)
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+
+class CategoricalSummary:
+    """Heavy hitters, distinct count and missing count of one categorical column."""
+
+    def __init__(self, capacity = 64, precision = 14):
+        self.heavy = HeavyHitters(capacity)
+        self.distinct = HyperLogLog(precision)
+        self.missing = 0
+
+    def update(self, values):
+        values = pd.Series(values)
+        self.missing += int(values.isna().sum())
+        self.heavy.update(values)
+        self.distinct.update(values)
+        return self
+
+    def merge(self, other):
+        self.heavy.merge(other.heavy)
+        self.distinct.merge(other.distinct)
+        self.missing += other.missing
+        return self
+
+    def top(self, n = None):
+        return self.heavy.top(n)
+
+    def mode(self):
+        top = self.heavy.top(1)
+        return top.index[0] if len(top) else None
+
+    def nunique(self):
+        return self.distinct.count()
+
+
+def summarize_categoricals(chunks, columns, capacity = 64, precision = 14):
+    """:class:`CategoricalSummary` per column over an iterable of frames."""
+    summaries = {c: CategoricalSummary(capacity, precision) for c in columns}
+    for chunk in chunks:
+        for c, summary in summaries.items():
+            summary.update(chunk[c])
+    return summaries
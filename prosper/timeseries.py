@@ -0,0 +1,208 @@
+"""Loan volume, APR and amount over time, by rating, in day to year buckets.
+
+The yearly volume charts group ``LoanOriginationDate.dt.year`` again for
+every chart. :class:`TimeAggregates` converts the timestamps of a chunk once
+to int64 day numbers, derives the week, month and year numbers from them
+with integer arithmetic and casts, and accumulates, for every bucket and
+``ProsperRating (Alpha)``, the loan count, the BorrowerAPR sum and count and
+the LoanOriginalAmount total with one ``np.bincount`` per measure and
+frequency. The per-bucket arrays are dense over time, so rolling and
+cumulative windows are differences of cumulative sums, and new months are
+folded in with :meth:`~TimeAggregates.update` without touching the old data::
+
+    ts = TimeAggregates()
+    ts.update(load_loans())
+    ts.frame('year', 'volume')                  # loans per year and rating
+    ts.rolling('month', 3, 'mean_apr')          # 3-month rolling mean APR
+    ts.cumulative('month', 'amount')
+
+Weeks start on Monday; every bucket is labelled with its first day. Loans
+without a rating count only in the ``All`` column.
+"""
+import numpy as np
+import pandas as pd
+
+from .wrangle import RATE_ORDER
+
+FREQUENCIES = ('day', 'week', 'month', 'year')
+MEASURES = ('volume', 'mean_apr', 'amount')
+
+# 1970-01-01 was a Thursday: shifting by 3 days makes weeks start on Monday
+_WEEK_SHIFT = 3
+
+
+def day_numbers(values):
+    """Days since 1970-01-01 of datetimes or ISO date strings; NaT as the int64 minimum."""
+    values = pd.Series(values)
+    if values.dtype.kind != 'M':
+        values = pd.to_datetime(values, errors = 'coerce', format = 'ISO8601')
+    return values.to_numpy().astype('datetime64[D]').view(np.int64)
+
+
+def bucket_numbers(days, freq):
+    """Bucket number of day numbers for ``freq`` (days, weeks, months or years since 1970)."""
+    if freq == 'day':
+        return days
+    if freq == 'week':
+        return (days + _WEEK_SHIFT) // 7
+    if freq == 'month':
+        return days.view('datetime64[D]').astype('datetime64[M]').view(np.int64)
+    if freq == 'year':
+        return days.view('datetime64[D]').astype('datetime64[Y]').view(np.int64)
+    raise ValueError('unknown frequency {!r}; use one of {}'.format(freq, ', '.join(FREQUENCIES)))
+
+
+def bucket_starts(numbers, freq):
+    """First day of the buckets ``numbers`` of ``freq``, as datetimes."""
+    numbers = np.asarray(numbers, dtype = np.int64)
+    if freq == 'day':
+        days = numbers.view('datetime64[D]')
+    elif freq == 'week':
+        days = (numbers * 7 - _WEEK_SHIFT).view('datetime64[D]')
+    elif freq == 'month':
+        days = numbers.view('datetime64[M]').astype('datetime64[D]')
+    elif freq == 'year':
+        days = numbers.view('datetime64[Y]').astype('datetime64[D]')
+    else:
+        raise ValueError('unknown frequency {!r}; use one of {}'.format(freq, ', '.join(FREQUENCIES)))
+    return pd.DatetimeIndex(days.astype('datetime64[ns]'))
+
+
+class TimeAggregates:
+    """Per-bucket, per-rating count, APR sum/count and amount total for several frequencies."""
+
+    def __init__(self, freqs = FREQUENCIES, time_column = 'LoanOriginationDate',
+                 by = 'ProsperRating (Alpha)', categories = RATE_ORDER):
+        for freq in freqs:
+            bucket_numbers(np.zeros(0, dtype = np.int64), freq)
+        self.freqs = list(freqs)
+        self.time_column = time_column
+        self.by = by
+        self.categories = list(categories)
+        # One slot per category plus one for missing or unknown ones
+        self.slots = len(self.categories) + 1
+        self.rows = 0
+        self.skipped = 0
+        self.origin = {f: None for f in self.freqs}
+        self.sums = {f: None for f in self.freqs}
+
+    def _empty(self, buckets):
+        return {m: np.zeros((buckets, self.slots), dtype = np.int64 if m in ('count', 'apr_n') else np.float64)
+                for m in ('count', 'apr_sum', 'apr_n', 'amount')}
+
+    def _cover(self, freq, lo, hi):
+        # Grow the dense arrays of freq to cover buckets lo..hi
+        origin, sums = self.origin[freq], self.sums[freq]
+        if sums is None:
+            self.origin[freq], self.sums[freq] = lo, self._empty(hi - lo + 1)
+            return
+        end = origin + len(sums['count']) - 1
+        if lo >= origin and hi <= end:
+            return
+        new_origin, new_end = min(lo, origin), max(hi, end)
+        grown = self._empty(new_end - new_origin + 1)
+        for m, array in sums.items():
+            grown[m][origin - new_origin:origin - new_origin + len(array)] = array
+        self.origin[freq], self.sums[freq] = new_origin, grown
+
+    def update(self, df):
+        """Add the loans of ``df`` (raw or cleaned); returns self."""
+        days = day_numbers(df[self.time_column])
+        valid = days != np.iinfo(np.int64).min
+        self.skipped += int((~valid).sum())
+        self.rows += int(valid.sum())
+        if not valid.any():
+            return self
+        days = days[valid]
+        slot = pd.Categorical(df[self.by].to_numpy()[valid], categories = self.categories).codes.astype(np.int64)
+        slot[slot < 0] = self.slots - 1
+        apr = df['BorrowerAPR'].to_numpy(dtype = np.float64, na_value = np.nan)[valid] \
+            if 'BorrowerAPR' in df else np.full(len(days), np.nan)
+        amount = df['LoanOriginalAmount'].to_numpy(dtype = np.float64, na_value = np.nan)[valid]
+        has_apr = ~np.isnan(apr)
+        apr = np.where(has_apr, apr, 0.0)
+        amount = np.where(np.isnan(amount), 0.0, amount)
+
+        for freq in self.freqs:
+            numbers = bucket_numbers(days, freq)
+            lo, hi = int(numbers.min()), int(numbers.max())
+            self._cover(freq, lo, hi)
+            cell = (numbers - lo) * self.slots + slot
+            size = (hi - lo + 1) * self.slots
+            at = slice(lo - self.origin[freq], hi - self.origin[freq] + 1)
+            sums = self.sums[freq]
+            sums['count'][at] += np.bincount(cell, minlength = size).reshape(-1, self.slots)
+            sums['apr_n'][at] += np.bincount(cell, weights = has_apr, minlength = size).reshape(-1, self.slots) \
+                .astype(np.int64)
+            sums['apr_sum'][at] += np.bincount(cell, weights = apr, minlength = size).reshape(-1, self.slots)
+            sums['amount'][at] += np.bincount(cell, weights = amount, minlength = size).reshape(-1, self.slots)
+        return self
+
+    def merge(self, other):
+        """Add the aggregates of another :class:`TimeAggregates` with the same settings."""
+        if (other.freqs, other.by, other.categories) != (self.freqs, self.by, self.categories):
+            raise ValueError('cannot merge TimeAggregates with different frequencies or groups')
+        self.rows += other.rows
+        self.skipped += other.skipped
+        for freq in self.freqs:
+            if other.sums[freq] is None:
+                continue
+            lo = other.origin[freq]
+            hi = lo + len(other.sums[freq]['count']) - 1
+            self._cover(freq, lo, hi)
+            at = slice(lo - self.origin[freq], hi - self.origin[freq] + 1)
+            for m, array in other.sums[freq].items():
+                self.sums[freq][m][at] += array
+        return self
+
+    def _sums(self, freq):
+        if freq not in self.sums:
+            raise KeyError('frequency {!r} is not tracked; tracked: {}'.format(freq, ', '.join(self.freqs)))
+        sums = self.sums[freq]
+        if sums is None:
+            return self._empty(0), pd.DatetimeIndex([])
+        index = bucket_starts(self.origin[freq] + np.arange(len(sums['count'])), freq)
+        return sums, index
+
+    def _measure(self, sums, measure, index):
+        # measure from (possibly windowed) sums, with an 'All' column over every slot
+        def with_total(array):
+            return np.column_stack([array[:, :-1], array.sum(axis = 1)])
+
+        if measure == 'volume':
+            values = with_total(sums['count'])
+        elif measure == 'amount':
+            values = with_total(sums['amount'])
+        elif measure == 'mean_apr':
+            n = with_total(sums['apr_n'])
+            with np.errstate(invalid = 'ignore', divide = 'ignore'):
+                values = np.where(n > 0, with_total(sums['apr_sum']) / np.maximum(n, 1), np.nan)
+        else:
+            raise ValueError('unknown measure {!r}; use one of {}'.format(measure, ', '.join(MEASURES)))
+        columns = pd.Index(self.categories + ['All'], name = self.by)
+        return pd.DataFrame(values, index = pd.Index(index, name = self.time_column), columns = columns)
+
+    def frame(self, freq, measure = 'volume'):
+        """``measure`` per bucket of ``freq`` (rows) and rating (columns, plus ``All``)."""
+        sums, index = self._sums(freq)
+        return self._measure(sums, measure, index)
+
+    def cumulative(self, freq, measure = 'volume'):
+        """``measure`` over all buckets up to each bucket of ``freq``."""
+        sums, index = self._sums(freq)
+        return self._measure({m: np.cumsum(a, axis = 0) for m, a in sums.items()}, measure, index)
+
+    def rolling(self, freq, window, measure = 'volume'):
+        """``measure`` over the last ``window`` buckets of ``freq`` (fewer at the start), empty buckets included."""
+        if window < 1:
+            raise ValueError('window must be at least 1, not {}'.format(window))
+        sums, index = self._sums(freq)
+        windowed = {}
+        for m, a in sums.items():
+            total = np.cumsum(a, axis = 0)
+            windowed[m] = total.copy()
+            windowed[m][window:] -= total[:-window]
+        return self._measure(windowed, measure, index)
+
+    def __repr__(self):
+        return 'TimeAggregates({} rows, {} skipped, freqs={})'.format(self.rows, self.skipped, self.freqs)
@@ -0,0 +1,302 @@
+"""Declarative data-quality checks of the Prosper export in one pass.
+
+Bad values only surfaced as odd plots: zero ``DebtToIncomeRatio``, zero or
+huge ``StatedMonthlyIncome``, missing ``CreditScoreRange*``, ``BorrowerAPR``
+outside 0-1. A :class:`Validator` takes a list of rules (ranges, allowed
+values, cross-column comparisons) plus per-column null-rate budgets and
+checks them together, block by block: each column a rule needs is converted
+once per block and every rule is evaluated on it while it is in cache, and
+the null counts of all columns come from the same pass. The result is a
+:class:`ValidationReport` with the violation counts per rule and one packed
+bitmap per rule marking the offending row positions::
+
+    report = Validator(PROSPER_RULES, NULL_BUDGETS).validate(df)
+    report.summary()
+    df.iloc[report.rows()]              # rows breaking any rule
+
+:meth:`Validator.validate_chunks` checks a stream of chunks the same way.
+Missing values never break a row rule; they are covered by the budgets.
+"""
+import operator
+
+import numpy as np
+import pandas as pd
+
+from .wrangle import CREDIT_GRADE_ORDER, LISTING_CATEGORY, RATE_ORDER
+
+BLOCK_ROWS = 1 << 16
+
+LOAN_STATUSES = ['Current', 'Completed', 'Chargedoff', 'Defaulted', 'Cancelled', 'FinalPaymentInProgress',
+                 'Past Due (1-15 days)', 'Past Due (16-30 days)', 'Past Due (31-60 days)',
+                 'Past Due (61-90 days)', 'Past Due (91-120 days)', 'Past Due (>120 days)']
+EMPLOYMENT_STATUSES = ['Employed', 'Full-time', 'Self-employed', 'Part-time', 'Retired', 'Not employed',
+                       'Not available', 'Other']
+INCOME_RANGES = ['$0', '$1-24,999', '$25,000-49,999', '$50,000-74,999', '$75,000-99,999', '$100,000+',
+                 'Not employed', 'Not displayed']
+US_STATES = ['AK', 'AL', 'AR', 'AZ', 'CA', 'CO', 'CT', 'DC', 'DE', 'FL', 'GA', 'HI', 'IA', 'ID', 'IL', 'IN',
+             'KS', 'KY', 'LA', 'MA', 'MD', 'ME', 'MI', 'MN', 'MO', 'MS', 'MT', 'NC', 'ND', 'NE', 'NH', 'NJ',
+             'NM', 'NV', 'NY', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VA', 'VT', 'WA',
+             'WI', 'WV', 'WY']
+
+COMPARISONS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge, '==': operator.eq,
+               '!=': operator.ne}
+
+
+class Block:
+    """Columns of one block of rows, each converted at most once however many rules use it."""
+
+    def __init__(self, frame):
+        self.frame = frame
+        self._numbers = {}
+        self._dates = {}
+
+    def numbers(self, column):
+        if column not in self._numbers:
+            self._numbers[column] = pd.to_numeric(self.frame[column], errors = 'coerce').to_numpy(
+                dtype = np.float64, na_value = np.nan)
+        return self._numbers[column]
+
+    def dates(self, column, unit):
+        # int64 timestamps truncated to unit, NaT as the int64 minimum
+        key = (column, unit)
+        if key not in self._dates:
+            values = self.frame[column]
+            if values.dtype.kind != 'M':
+                values = pd.to_datetime(values, errors = 'coerce', format = 'ISO8601')
+            self._dates[key] = values.to_numpy().astype('datetime64[{}]'.format(unit)).view(np.int64)
+        return self._dates[key]
+
+
+class Rule:
+    """Row rule; ``violations(block)`` marks the rows breaking it."""
+
+    columns = ()
+
+    def violations(self, block):
+        raise NotImplementedError
+
+    def __repr__(self):
+        args = ', '.join('{}={!r}'.format(k, v) for k, v in vars(self).items())
+        return '{}({})'.format(type(self).__name__, args)
+
+
+class Range(Rule):
+    """Values of ``column`` within ``[lo, hi]``; ``inclusive`` as in ``Series.between``."""
+
+    def __init__(self, column, lo = None, hi = None, inclusive = 'both'):
+        if inclusive not in ('both', 'neither', 'left', 'right'):
+            raise ValueError('inclusive must be both, neither, left or right, not {!r}'.format(inclusive))
+        self.column = column
+        self.lo = lo
+        self.hi = hi
+        self.inclusive = inclusive
+
+    @property
+    def columns(self):
+        return (self.column,)
+
+    def violations(self, block):
+        x = block.numbers(self.column)
+        bad = np.zeros(len(x), dtype = bool)
+        if self.lo is not None:
+            bad |= (x < self.lo) if self.inclusive in ('both', 'left') else (x <= self.lo)
+        if self.hi is not None:
+            bad |= (x > self.hi) if self.inclusive in ('both', 'right') else (x >= self.hi)
+        return bad
+
+
+class AllowedValues(Rule):
+    """Values of ``column`` among ``values``."""
+
+    def __init__(self, column, values):
+        self.column = column
+        self.values = list(values)
+
+    @property
+    def columns(self):
+        return (self.column,)
+
+    def violations(self, block):
+        values = block.frame[self.column]
+        return (values.notna() & ~values.isin(self.values)).to_numpy(dtype = bool)
+
+
+class Compare(Rule):
+    """``left op right`` for two columns of each row, e.g. lower <= upper credit score.
+
+    With ``unit`` (e.g. ``'D'``) both columns are parsed as dates and compared
+    at that resolution.
+    """
+
+    def __init__(self, left, op, right, unit = None):
+        if op not in COMPARISONS:
+            raise ValueError('unknown comparison {!r}; use one of {}'.format(op, ', '.join(COMPARISONS)))
+        self.left = left
+        self.op = op
+        self.right = right
+        self.unit = unit
+
+    @property
+    def columns(self):
+        return (self.left, self.right)
+
+    def violations(self, block):
+        if self.unit is None:
+            a, b = block.numbers(self.left), block.numbers(self.right)
+            present = ~np.isnan(a) & ~np.isnan(b)
+        else:
+            a, b = block.dates(self.left, self.unit), block.dates(self.right, self.unit)
+            nat = np.iinfo(np.int64).min
+            present = (a != nat) & (b != nat)
+        return present & ~COMPARISONS[self.op](a, b)
+
+
+class ValidationReport:
+    """Violation counts, null rates and per-rule row bitmaps of a validation pass."""
+
+    def __init__(self, rules, rows, violations, bitmaps, nulls, budgets):
+        self.rules = rules
+        self.rows_checked = rows
+        self.violations = violations
+        self.bitmaps = bitmaps                      # (rules, ceil(rows / 8)) packed bits
+        self.nulls = nulls
+        self.budgets = budgets
+
+    @property
+    def null_rates(self):
+        return self.nulls / max(self.rows_checked, 1)
+
+    def table(self):
+        """One row per rule and per null budget, with the number of offending rows (or nulls)."""
+        rules = pd.DataFrame({
+            'check': [repr(r) for r in self.rules],
+            'columns': [', '.join(r.columns) for r in self.rules],
+            'violations': self.violations,
+            'rate': self.violations / max(self.rows_checked, 1),
+            'budget': 0.0,
+        })
+        columns = [c for c in self.budgets if c in self.nulls.index]
+        budgets = pd.DataFrame({
+            'check': ['NullBudget({!r}, {})'.format(c, self.budgets[c]) for c in columns],
+            'columns': columns,
+            'violations': self.nulls.reindex(columns).to_numpy(dtype = np.int64),
+            'rate': self.null_rates.reindex(columns).to_numpy(),
+            'budget': [self.budgets[c] for c in columns],
+        })
+        table = pd.concat([rules, budgets], ignore_index = True)
+        table['passed'] = table['rate'] <= table['budget']
+        return table
+
+    def summary(self):
+        """The failed checks only."""
+        table = self.table()
+        return table[~table['passed']].reset_index(drop = True)
+
+    @property
+    def ok(self):
+        return bool(self.table()['passed'].all())
+
+    def mask(self, rule = None):
+        """Boolean array of the rows breaking ``rule`` (its position or the rule), or any rule."""
+        if rule is None:
+            packed = np.bitwise_or.reduce(self.bitmaps, axis = 0) if len(self.rules) \
+                else np.zeros(self.bitmaps.shape[1], dtype = np.uint8)
+        else:
+            packed = self.bitmaps[rule if isinstance(rule, (int, np.integer)) else self.rules.index(rule)]
+        return np.unpackbits(packed, count = self.rows_checked).astype(bool)
+
+    def rows(self, rule = None):
+        """Positions of the rows breaking ``rule``, or any rule."""
+        return np.flatnonzero(self.mask(rule))
+
+    def __repr__(self):
+        failed = self.summary()
+        return 'ValidationReport({} rows, {} checks, {} failed, {} rows flagged)'.format(
+            self.rows_checked, len(self.rules) + len(self.budgets), len(failed), len(self.rows()))
+
+
+class Validator:
+    """Row rules and null-rate budgets ``{column: max rate}`` checked in one pass."""
+
+    def __init__(self, rules, null_budgets = None, block_rows = BLOCK_ROWS):
+        self.rules = list(rules)
+        self.null_budgets = dict(null_budgets or {})
+        # Whole bytes of bitmap per block
+        self.block_rows = max(8, block_rows - block_rows % 8)
+
+    def _check(self, columns):
+        needed = {c for r in self.rules for c in r.columns} | set(self.null_budgets)
+        missing = sorted(needed - set(columns))
+        if missing:
+            raise KeyError('columns to validate are missing: {}'.format(', '.join(missing)))
+
+    def validate(self, df):
+        """Check an in-memory frame."""
+        return self.validate_chunks([df])
+
+    def validate_chunks(self, chunks):
+        """Check an iterable of frames, as if they were concatenated."""
+        violations = np.zeros(len(self.rules), dtype = np.int64)
+        packed, carry = [], np.zeros((len(self.rules), 0), dtype = bool)
+        nulls, rows = None, 0
+        for chunk in chunks:
+            if nulls is None:
+                self._check(chunk.columns)
+                nulls = pd.Series(0, index = chunk.columns, dtype = np.int64)
+            for start in range(0, len(chunk), self.block_rows):
+                block = Block(chunk.iloc[start:start + self.block_rows])
+                n = len(block.frame)
+                bad = np.empty((len(self.rules), n), dtype = bool)
+                for i, rule in enumerate(self.rules):
+                    bad[i] = rule.violations(block)
+                violations += bad.sum(axis = 1)
+                # By name: chunks may list their columns in another order
+                nulls = nulls.add(block.frame.isna().sum(), fill_value = 0).astype(np.int64)
+                rows += n
+                # Pack whole bytes, carrying the remainder over to the next block
+                bits = np.concatenate([carry, bad], axis = 1)
+                whole = bits.shape[1] - bits.shape[1] % 8
+                packed.append(np.packbits(bits[:, :whole], axis = 1))
+                carry = bits[:, whole:]
+        if carry.shape[1]:
+            packed.append(np.packbits(carry, axis = 1))
+        bitmaps = np.concatenate(packed, axis = 1) if packed else np.zeros((len(self.rules), 0), dtype = np.uint8)
+        if nulls is None:
+            nulls = pd.Series(dtype = np.int64)
+        return ValidationReport(self.rules, rows, violations, bitmaps, nulls, self.null_budgets)
+
+
+# Checks of the raw export
+PROSPER_RULES = [
+    Range('BorrowerAPR', 0, 1),
+    Range('BorrowerRate', 0, 1),
+    Range('LenderYield', -1, 1),
+    Range('StatedMonthlyIncome', 0, 100000, inclusive = 'right'),
+    Range('DebtToIncomeRatio', 0, 10, inclusive = 'right'),
+    Range('LoanOriginalAmount', 1000, 35000),
+    Range('CreditScoreRangeLower', 300, 900),
+    Range('CreditScoreRangeUpper', 300, 900),
+    Range('ProsperRating (numeric)', 1, 7),
+    Range('ProsperScore', 1, 11),
+    Range('ListingCategory (numeric)', 0, len(LISTING_CATEGORY) - 1),
+    Range('EmploymentStatusDuration', 0),
+    # Over-funded listings reach about 1.0125
+    Range('PercentFunded', 0, 1.05),
+    AllowedValues('Term', [12, 36, 60]),
+    AllowedValues('ProsperRating (Alpha)', RATE_ORDER),
+    AllowedValues('CreditGrade', CREDIT_GRADE_ORDER),
+    AllowedValues('LoanStatus', LOAN_STATUSES),
+    AllowedValues('EmploymentStatus', EMPLOYMENT_STATUSES),
+    AllowedValues('IncomeRange', INCOME_RANGES),
+    AllowedValues('BorrowerState', US_STATES),
+    Compare('CreditScoreRangeLower', '<=', 'CreditScoreRangeUpper'),
+    Compare('LoanOriginationDate', '>=', 'ListingCreationDate', unit = 'D'),
+    Compare('ClosedDate', '>=', 'LoanOriginationDate', unit = 'D'),
+]
+
+# Largest acceptable share of missing values
+NULL_BUDGETS = {'ListingKey': 0.0, 'Term': 0.0, 'LoanStatus': 0.0, 'LoanOriginalAmount': 0.0,
+                'LoanOriginationDate': 0.0, 'ListingCreationDate': 0.0, 'BorrowerAPR': 0.001,
+                'StatedMonthlyIncome': 0.0, 'CreditScoreRangeLower': 0.01, 'CreditScoreRangeUpper': 0.01,
+                'DebtToIncomeRatio': 0.1, 'EmploymentStatus': 0.05, 'Occupation': 0.05,
+                'BorrowerState': 0.06, 'ProsperRating (Alpha)': 0.3}
@@ -0,0 +1,392 @@
+"""Watch mode: rebuild the slides when the notebook, template or data change.
+
+Iterating on the deck means editing ``slide_deck_template.ipynb``, running
+it again from the top (reloading and cleaning the CSV) and exporting it by
+hand. :class:`DeckWatcher` keeps one kernel running with the notebook's
+variables (the cleaned ``df_copy`` included) and polls the notebook, the
+template and the CSV for changes:
+
+- notebook saved: the code cells whose source changed are run again, and so
+  is every later cell that reads a name one of them assigns. A cell that
+  rebinds or modifies a name it reads (``df_copy = df_copy[...]``) is run from
+  the first cell assigning that name, so it sees the same value as in a
+  fresh run. Other cells keep their outputs and the kernel keeps their
+  variables;
+- CSV changed: the cells that mention the file name (the load cell) are run
+  again, with the cells that depend on them;
+- template changed: nothing is run, the slides are only exported again.
+
+A notebook caught half-saved is read again on the next poll. If the kernel
+dies, a new one is started and the whole notebook is run again.
+
+After every change the executed notebook is exported with
+:func:`prosper.export.export` and served; the page reloads itself when the
+file is rewritten::
+
+    python -m prosper.watch slide_deck_template.ipynb --template output_toggle
+
+Dependencies are found by name from the cell source (assignments, imports,
+``df['x'] = ...``, ``del``). A cell that cannot be parsed is treated as
+reading everything assigned before it. Cells that export the notebook
+themselves are never run. Needs nbclient and ipykernel.
+"""
+import argparse
+import ast
+import os
+import re
+import time
+from contextlib import ExitStack
+
+from .export import export
+
+# IPython magics and shell escapes are not Python
+_MAGIC = re.compile(r'^\s*[%!]')
+EXPORT_MARKERS = ('nbconvert', 'prosper.export')
+
+# Polled by the served page; reloads it when Last-Modified changes
+RELOAD_SCRIPT = '''<script>
+(function () {
+  var seen = null;
+  setInterval(function () {
+    fetch(location.href, {method: 'HEAD', cache: 'no-store'}).then(function (r) {
+      var stamp = r.headers.get('Last-Modified');
+      if (seen !== null && stamp !== seen) { location.reload(); }
+      seen = stamp;
+    }).catch(function () {});
+  }, 1000);
+})();
+</script>
+'''
+
+
+class _Names(ast.NodeVisitor):
+    # Names assigned by a cell and names it reads before assigning them, in evaluation order
+
+    def __init__(self):
+        self.assigned, self.read = set(), set()
+
+    def load(self, name):
+        if name not in self.assigned:
+            self.read.add(name)
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self.load(node.id)
+        else:
+            self.assigned.add(node.id)
+
+    def _target(self, node):
+        # df['x'] = ... and df.x = ... read and change df
+        self.generic_visit(node)
+        if not isinstance(node.ctx, ast.Load):
+            base = node.value
+            while isinstance(base, (ast.Subscript, ast.Attribute)):
+                base = base.value
+            if isinstance(base, ast.Name):
+                self.assigned.add(base.id)
+
+    visit_Subscript = visit_Attribute = _target
+
+    def visit_Assign(self, node):
+        self.visit(node.value)
+        for target in node.targets:
+            self.visit(target)
+
+    def visit_AnnAssign(self, node):
+        if node.value is not None:
+            self.visit(node.value)
+        self.visit(node.target)
+
+    def visit_AugAssign(self, node):
+        self.visit(node.value)
+        if isinstance(node.target, ast.Name):
+            self.load(node.target.id)
+        self.visit(node.target)
+
+    def visit_For(self, node):
+        self.visit(node.iter)
+        self.visit(node.target)
+        for child in node.body + node.orelse:
+            self.visit(child)
+
+    visit_AsyncFor = visit_For
+
+    def visit_comprehension(self, node):
+        self.visit(node.iter)
+        self.visit(node.target)
+        for test in node.ifs:
+            self.visit(test)
+
+    def _comprehension(self, node):
+        for generator in node.generators:
+            self.visit(generator)
+        for field in ('elt', 'key', 'value'):
+            if hasattr(node, field):
+                self.visit(getattr(node, field))
+
+    visit_ListComp = visit_SetComp = visit_GeneratorExp = visit_DictComp = _comprehension
+
+    def _definition(self, node):
+        self.generic_visit(node)
+        self.assigned.add(node.name)
+
+    visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = _definition
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.assigned.add((alias.asname or alias.name).split('.')[0])
+
+    visit_ImportFrom = visit_Import
+
+
+def cell_names(source):
+    """``(assigned, read)`` name sets of a code cell; None if it cannot be parsed.
+
+    ``read`` holds the names the cell reads before assigning them itself,
+    i.e. what it takes from the cells run before it.
+    """
+    code = '\n'.join(line for line in source.splitlines() if not _MAGIC.match(line))
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    names = _Names()
+    names.visit(tree)
+    return names.assigned, names.read
+
+
+def _propagate(names, changed):
+    # The changed cells and every later cell reading a name assigned by a cell already picked
+    dirty, everything, run = set(), False, []
+    for i, entry in enumerate(names):
+        if i in changed or ((everything or entry is None) and run) or (entry is not None and entry[1] & dirty):
+            run.append(i)
+            if entry is None:
+                everything = True
+            else:
+                dirty |= entry[0]
+    return run
+
+
+def affected_cells(names, changed):
+    """Positions of the cells to run again when the cells ``changed`` changed, in order.
+
+    ``names`` holds :func:`cell_names` per cell. A cell is affected if it
+    changed or reads a name assigned by an affected cell before it. A cell
+    that reads a name and assigns it again (``df = df[...]``, ``df['x'] = ...``)
+    needs that name as it was before it first ran, so the run starts over
+    from the first cell assigning it.
+    """
+    changed = set(changed)
+    while True:
+        run = _propagate(names, changed)
+        restart = set()
+        for i in run:
+            if names[i] is None:
+                continue
+            for name in names[i][0] & names[i][1]:
+                first = next((j for j in range(i) if names[j] is not None and name in names[j][0]), None)
+                if first is not None and first not in changed:
+                    restart.add(first)
+        if not restart:
+            return run
+        changed |= restart
+
+
+def _is_export(source):
+    return any(marker in source for marker in EXPORT_MARKERS)
+
+
+class DeckWatcher:
+    """Warm kernel running ``notebook``; re-runs the affected cells and re-exports on every change."""
+
+    def __init__(self, notebook = 'slide_deck_template.ipynb', template = 'output_toggle', data = None,
+                 to = 'slides', port = 8000, interval = 1.0, kernel_name = 'python3', timeout = 600):
+        self.notebook = os.path.abspath(notebook)
+        self.directory = os.path.dirname(self.notebook)
+        self.template = template
+        self.to = to
+        self.port = port
+        self.interval = interval
+        self.kernel_name = kernel_name
+        self.timeout = timeout
+        self.data = os.path.join(self.directory, 'prosperLoanData.csv') if data is None else os.path.abspath(data)
+        self.client = None
+        self._kernel = ExitStack()
+        self.nb = None
+        self.sources = []
+        self.names = []
+        self.url = None
+        self.runs = 0
+        self._stamps = {}
+
+    def _paths(self):
+        paths = {'notebook': self.notebook, 'data': self.data}
+        if self.template is not None:
+            template = self.template if os.path.splitext(self.template)[1] else self.template + '.tpl'
+            paths['template'] = os.path.join(self.directory, template)
+        return paths
+
+    def _stamp(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self):
+        import nbformat
+
+        self.nb = nbformat.read(self.notebook, as_version = 4)
+        self.sources = [cell.source if cell.cell_type == 'code' else None for cell in self.nb.cells]
+        self.names = [(set(), set()) if s is None or _is_export(s) else cell_names(s) for s in self.sources]
+
+    def start(self):
+        """Start the kernel, run the notebook once and export it; returns the URL of the slides."""
+        try:
+            from nbclient import NotebookClient
+        except ImportError:
+            raise ImportError('watch mode requires nbclient and ipykernel (pip install nbclient ipykernel)')
+
+        self._read()
+        self.client = NotebookClient(self.nb, kernel_name = self.kernel_name, timeout = self.timeout,
+                                     allow_errors = True, resources = {'metadata': {'path': self.directory}})
+        self._start_kernel()
+        self._stamps = {key: self._stamp(path) for key, path in self._paths().items()}
+        self._run(self._code_cells())
+        return self._export()
+
+    def _start_kernel(self):
+        # The kernel lives until close(), which leaves the client's setup_kernel() context
+        self._kernel.close()
+        self._kernel = ExitStack()
+        self._kernel.enter_context(self.client.setup_kernel())
+
+    def _code_cells(self):
+        return [i for i, s in enumerate(self.sources) if s is not None]
+
+    def _run(self, cells, restarted = False):
+        # Execute code cells in order, skipping the ones exporting the notebook
+        from nbclient.exceptions import DeadKernelError
+
+        ran = []
+        for i in cells:
+            cell = self.nb.cells[i]
+            if cell.cell_type != 'code' or _is_export(cell.source):
+                continue
+            try:
+                self.client.execute_cell(cell, i)
+            except DeadKernelError:
+                # Every variable is gone with the kernel: start a new one and run the whole notebook again
+                self._start_kernel()
+                if not restarted:
+                    print('kernel died, restarted it; running all cells')
+                    return self._run(self._code_cells(), restarted = True)
+                print('kernel died again in cell {}, restarted it; fix the cell and save'.format(i))
+                break
+            ran.append(i)
+        self.runs += 1
+        return ran
+
+    def _export(self):
+        name = os.path.splitext(os.path.basename(self.notebook))[0]
+        output = os.path.join(self.directory, name + ('.slides.html' if self.to == 'slides' else '.html'))
+        self.url = export(self.nb, to = self.to, template = self._paths().get('template'), output = output,
+                          serve = True, port = self.port)
+        with open(output, encoding = 'utf-8') as f:
+            body = f.read()
+        at = body.rfind('</body>')
+        body = body[:at] + RELOAD_SCRIPT + body[at:] if at >= 0 else body + RELOAD_SCRIPT
+        with open(output, 'w', encoding = 'utf-8') as f:
+            f.write(body)
+        return self.url
+
+    def changes(self):
+        """Which of ``'notebook'``, ``'template'`` and ``'data'`` changed since the last check."""
+        changed = []
+        for key, path in self._paths().items():
+            stamp = self._stamp(path)
+            if stamp != self._stamps.get(key):
+                self._stamps[key] = stamp
+                changed.append(key)
+        return changed
+
+    def refresh(self, changed):
+        """Run what ``changed`` affects and export again; returns the positions of the cells run."""
+        cells = set()
+        if 'notebook' in changed:
+            old = {}
+            for cell in self.nb.cells:
+                if cell.cell_type == 'code':
+                    old.setdefault(cell.source, []).append(cell)
+            try:
+                self._read()
+            except (OSError, ValueError):
+                # Saved only in part (not JSON yet) or being replaced: read it again on the next poll
+                self._stamps['notebook'] = None
+                changed = [c for c in changed if c != 'notebook']
+                if not changed:
+                    return []
+        if 'notebook' in changed:
+            # Unchanged cells (matched by source, so inserting a cell moves nothing) keep their outputs
+            for i, cell in enumerate(self.nb.cells):
+                if cell.cell_type != 'code':
+                    continue
+                if old.get(cell.source):
+                    kept = old[cell.source].pop(0)
+                    cell.outputs, cell.execution_count = kept.outputs, kept.execution_count
+                else:
+                    cells.add(i)
+            self.client.nb = self.nb
+        if 'data' in changed:
+            data = os.path.basename(self.data)
+            cells.update(i for i, s in enumerate(self.sources) if s is not None and data in s)
+        ran = self._run(affected_cells(self.names, cells)) if cells else []
+        self._export()
+        return ran
+
+    def watch(self):
+        """Poll for changes until interrupted, then shut the kernel down."""
+        if self.client is None:
+            print('Serving {}'.format(self.start()))
+        try:
+            while True:
+                time.sleep(self.interval)
+                changed = self.changes()
+                if changed:
+                    started = time.perf_counter()
+                    ran = self.refresh(changed)
+                    print('{} changed: ran {} cell(s), exported in {:.2f}s'.format(
+                        ', '.join(changed), len(ran), time.perf_counter() - started))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        """Shut the kernel down."""
+        self._kernel.close()
+        self.client = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('notebook', nargs = '?', default = 'slide_deck_template.ipynb')
+    parser.add_argument('--template', default = 'output_toggle')
+    parser.add_argument('--csv', default = None)
+    parser.add_argument('--to', default = 'slides', choices = ['slides', 'html'])
+    parser.add_argument('--port', type = int, default = 8000)
+    parser.add_argument('--interval', type = float, default = 1.0)
+    args = parser.parse_args(argv)
+
+    DeckWatcher(args.notebook, args.template, args.csv, args.to, args.port, args.interval).watch()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""Load and clean the Prosper loan data.
+
+The functions below are the wrangling cells of ``exploration_template`` and
+``slide_deck_template`` lifted out of the notebooks, so that the cleaned
+``df_copy`` can be rebuilt outside of a Jupyter session.
+"""
+import numpy as np
+import pandas as pd
+
+from .compressed import read_csv
+from .dedup import DedupReport, dedup_chunks, dedup_frame
+from .features import FEATURES
+from .outliers import SLIDE_DECK_RULES, OutlierFilter
+
+# Features of interest (slide deck)
+FOCUS_COLUMNS = ['LoanOriginalAmount', 'BorrowerAPR', 'StatedMonthlyIncome', 'Term', 'ProsperRating (Alpha)']
+
+# Category orders used throughout the exploration
+RATE_ORDER = ['AA', 'A', 'B', 'C', 'D', 'E', 'HR']
+CREDIT_GRADE_ORDER = ['AA', 'A', 'B', 'C', 'D', 'E', 'HR', 'NC']
+HOMEOWNER_ORDER = ['Yes', 'No']
+
+# Occupation filled in when no row has one to take the most frequent from
+OCCUPATION_FALLBACK = 'Other'
+
+# Listing Category (string) values for the Listing Codes (numeric)
+LISTING_CATEGORY = ['Not Available', 'Debt Consolidation', 'Home Improvement', 'Business',
+                    'Personal Loan', 'Student Use', 'Auto', 'Other', 'Baby&Adoption',
+                    'Boat', 'Cosmetic Procedure', 'Engagement Ring', 'Green Loans', 'Household Expenses',
+                    'Large Purchases', 'Medical/Dental', 'Motorcycle', 'RV', 'Taxes',
+                    'Vacation', 'Wedding Loans']
+
+
+def load_loans(path = 'prosperLoanData.csv', dedup = 'first', chunksize = None, **kwargs):
+    """Read the Prosper export into a DataFrame; extra arguments go to ``pd.read_csv``.
+
+    Listings repeated with the same ``ListingKey`` are dropped according to
+    ``dedup`` (``'first'``, ``'last'``, ``'complete'`` or ``None`` to keep them)
+    and the :class:`~prosper.dedup.DedupReport` is left in ``df.attrs['dedup']``.
+    With ``chunksize`` the file is read and deduplicated chunk by chunk.
+    gzip, bz2, xz and zstd exports are decompressed on the fly in a background
+    thread (see :mod:`prosper.compressed`).
+    """
+    if dedup is None:
+        if chunksize is None:
+            return read_csv(path, **kwargs)
+        return pd.concat(read_csv(path, chunksize = chunksize, **kwargs))
+
+    if chunksize is None:
+        df, report = dedup_frame(read_csv(path, **kwargs), keep = dedup)
+    else:
+        report = DedupReport(dedup)
+        chunks = dedup_chunks(lambda: read_csv(path, chunksize = chunksize, **kwargs),
+                              keep = dedup, report = report)
+        df = pd.concat(list(chunks))
+    df.attrs['dedup'] = report
+    return df
+
+
+def clean_focus(df):
+    """Slide deck wrangling: keep the focus columns, drop missing APR and income outliers."""
+    df_copy = df[FOCUS_COLUMNS]
+
+    # Remove loans with missing BorrowerAPR
+    df_copy = df_copy[~df_copy.BorrowerAPR.isna()]
+
+    # Remove loans with StatedMonthlyIncome > 30k, these are outliers
+    outliers = OutlierFilter(SLIDE_DECK_RULES)
+    df_copy = outliers.fit(df_copy).apply(df_copy).copy()
+
+    # Convert ProsperRating into an ordered categorical type
+    ordered_var = pd.api.types.CategoricalDtype(ordered = True, categories = RATE_ORDER)
+    df_copy['ProsperRating (Alpha)'] = df_copy['ProsperRating (Alpha)'].astype(ordered_var)
+    return df_copy
+
+
+def convert_ratings(df_copy):
+    """Ordered ProsperRating (Alpha) and CreditGrade; loans before July 2009 are dropped."""
+    rating = df_copy['ProsperRating (Alpha)'].astype(object).fillna('preJul09')
+    df_copy = df_copy[rating != 'preJul09'].copy()
+    df_copy['ProsperRating (Alpha)'] = pd.Categorical(df_copy['ProsperRating (Alpha)'], categories = RATE_ORDER, ordered = True)
+    df_copy['CreditGrade'] = pd.Categorical(df_copy['CreditGrade'], categories = CREDIT_GRADE_ORDER, ordered = True)
+    return df_copy
+
+
+def convert_occupation(df_copy, fill_value = None):
+    """Fill missing Occupation with the most frequent value (``OCCUPATION_FALLBACK`` if none) as a category."""
+    if fill_value is None:
+        counts = df_copy.Occupation.value_counts()
+        fill_value = counts.index[0] if len(counts) else OCCUPATION_FALLBACK
+    df_copy['Occupation'] = df_copy['Occupation'].fillna(fill_value).astype('category')
+    return df_copy
+
+
+def convert_employment(df_copy):
+    """Categorical EmploymentStatus with 'Employed' and 'Full-time' combined."""
+    status = df_copy['EmploymentStatus'].astype(object).replace({'Employed': 'Employed / Full-time',
+                                                  'Full-time': 'Employed / Full-time'})
+    df_copy['EmploymentStatus'] = status.astype('category')
+    return df_copy
+
+
+def convert_homeowner(df_copy):
+    """IsBorrowerHomeowner as an ordered Yes/No categorical."""
+    homeowner = df_copy['IsBorrowerHomeowner'].map({True: 'Yes', False: 'No'})
+    df_copy['IsBorrowerHomeowner'] = pd.Categorical(homeowner, categories = HOMEOWNER_ORDER, ordered = True)
+    return df_copy
+
+
+def convert_dates(df_copy):
+    """Parse ListingCreationDate and LoanOriginationDate."""
+    df_copy['ListingCreationDate'] = pd.to_datetime(df_copy['ListingCreationDate'])
+    df_copy['LoanOriginationDate'] = pd.to_datetime(df_copy['LoanOriginationDate'])
+    return df_copy
+
+
+def convert_listing_category(df_copy):
+    """Add 'ListingCategory (Alpha)' from the numeric codes, with 'Not Available' folded into 'Other'."""
+    listing_category = np.array(LISTING_CATEGORY, dtype = object)
+    listing_category[0] = 'Other'
+    categories = [c for c in LISTING_CATEGORY if c != 'Not Available']
+    alpha = listing_category[df_copy['ListingCategory (numeric)'].to_numpy()]
+    df_copy['ListingCategory (Alpha)'] = pd.Categorical(alpha, categories = categories)
+    return df_copy
+
+
+def drop_missing(df_copy):
+    """Remove the rows the univariate exploration drops: NA APR/rate/DTI/credit scores and zero DTI."""
+    keep = (df_copy.BorrowerAPR.notna() & df_copy.BorrowerRate.notna()
+            & df_copy.DebtToIncomeRatio.notna() & (df_copy.DebtToIncomeRatio > 0)
+            & df_copy.CreditScoreRangeLower.notna() & df_copy.CreditScoreRangeUpper.notna())
+    return df_copy[keep].copy()
+
+
+def add_log_columns(df_copy):
+    """Store log values of DebtToIncomeRatio and StatedMonthlyIncome (NaN for zero incomes)."""
+    for name in ['DebtToIncomeRatio_ln', 'StatedMonthlyIncome_ln']:
+        df_copy[name] = FEATURES[name].compute(df_copy)
+    return df_copy
+
+
+# Columns wrangle() converts or adds; every other column keeps the raw values of the rows it keeps
+WRANGLED_COLUMNS = ['ProsperRating (Alpha)', 'CreditGrade', 'Occupation', 'EmploymentStatus',
+                    'IsBorrowerHomeowner', 'BorrowerState', 'ListingCreationDate', 'LoanOriginationDate',
+                    'ListingCategory (Alpha)', 'DebtToIncomeRatio_ln', 'StatedMonthlyIncome_ln']
+
+
+def wrangle(df, occupation_fill = None):
+    """Exploration wrangling: returns the cleaned ``df_copy`` of ``exploration_template``.
+
+    ``occupation_fill`` replaces missing Occupation values; by default it is the
+    most frequent Occupation of ``df`` itself.
+    """
+    df_copy = convert_ratings(df.copy())
+    df_copy = convert_occupation(df_copy, occupation_fill)
+    df_copy = convert_employment(df_copy)
+    df_copy = convert_homeowner(df_copy)
+    df_copy['BorrowerState'] = df_copy['BorrowerState'].astype('category')
+    df_copy = convert_dates(df_copy)
+    df_copy = convert_listing_category(df_copy)
+    df_copy = drop_missing(df_copy)
+    return add_log_columns(df_copy)
+
+
+def concat_frames(frames):
+    """Concatenate cleaned frames, unifying the categories of their categorical columns.
+
+    ``pd.concat`` falls back to object columns when the categories differ, so
+    every categorical column is first given the union of the categories seen
+    in ``frames``: sorted for unordered columns, as ``astype('category')``
+    would give, and in order of first appearance for ordered ones.
+    """
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        return pd.DataFrame()
+    frames = [f.copy(deep = False) for f in frames]
+    for column in frames[0].columns:
+        dtypes = [f[column].dtype for f in frames]
+        if not all(isinstance(d, pd.CategoricalDtype) for d in dtypes):
+            continue
+        if all(d == dtypes[0] for d in dtypes[1:]):
+            continue
+        categories = list(dtypes[0].categories)
+        seen = set(categories)
+        for d in dtypes[1:]:
+            new = [c for c in d.categories if c not in seen]
+            categories.extend(new)
+            seen.update(new)
+        if not dtypes[0].ordered:
+            categories = sorted(categories)
+        dtype = pd.CategoricalDtype(categories, ordered = dtypes[0].ordered)
+        for f in frames:
+            if f[column].dtype != dtype:
+                f[column] = f[column].cat.set_categories(categories)
+    return pd.concat(frames)
@@ -39,10 +39,9 @@ warnings.simplefilter("ignore")
 # In[2]:
 
 
-# load in the dataset into a pandas dataframe
-df = pd.read_csv('prosperLoanData.csv')
-df_copy = df.copy()
-df_copy.head()
+# load in the dataset lazily: only the columns and rows kept below are read
+from prosper.lazy import scan_csv
+df_copy = scan_csv('prosperLoanData.csv')
 
 
 # In[3]:
@@ -58,6 +57,9 @@ df_copy = df_copy[~df_copy.BorrowerAPR.isna()]
 # Data Wrangling - Remove loans with StatedMonthlyIncome > 30k, these are outliers
 df_copy = df_copy[df_copy.StatedMonthlyIncome <= 30000]
 
+# Read the selected columns of the remaining rows
+df_copy = df_copy.collect()
+
 # Convert ProsperRating and Employment status into ordered categorical types
 rate_order = ['AA','A','B','C','D','E', 'HR']
 ordered_var = pd.api.types.CategoricalDtype(ordered = True, categories = rate_order)
@@ -176,7 +178,8 @@ for i in np.arange(g.axes.shape[0]):
 # In[ ]:
 
 
-get_ipython().system(' jupyter nbconvert slide_deck_template.ipynb --to slides --post serve --template output_toggle')
+from prosper.export import export
+export('slide_deck_template.ipynb', to = 'slides', template = 'output_toggle', serve = True)
 
 
 # > Note: Running above creates the slide deck, but HTML is not rendering. This is because I am using Udacity's workspace to run my code.